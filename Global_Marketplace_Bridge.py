@@ -10,23 +10,46 @@ Notes:
 
 import os
 import json
+import asyncio
+import random
 import time
 import logging
+import logging.handlers
+import multiprocessing
 import threading
 import requests
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from functools import wraps
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from cryptography.fernet import Fernet
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
 import csv
+import heapq
+import math
+import queue
 import re
 import difflib
+import atexit
+import contextvars
+import gzip
+import hashlib
+import itertools
+import shutil
+import weakref
 import schedule
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 import matplotlib.pyplot as plt
+import numpy as np
+try:
+    import redis
+except ImportError:  # the Tk app runs fine without Redis; rate limits are then per-process
+    redis = None
 
 # -------------------------- Paths & Logging -------------------------------
 APP_DIR = os.path.dirname(__file__) or '.'
@@ -34,10 +57,173 @@ KEY_FILE = os.path.join(APP_DIR, 'secret.key')
 CONFIG_FILE = os.path.join(APP_DIR, 'config.enc')
 DB_FILE = os.path.join(APP_DIR, 'dropship.db')
 LOG_FILE = os.path.join(APP_DIR, 'dropship.log')
+LOG_INDEX_FILE = os.path.join(APP_DIR, 'dropship_logs.db')
 
-logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger('dropship')
 
+# sku/stage for structured records; set per thread (or per task) with log_context()
+_LOG_CONTEXT = contextvars.ContextVar('dropship_log_context', default={})
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields such as `sku` and `stage` to every record logged inside the block."""
+    token = _LOG_CONTEXT.set({**_LOG_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        _LOG_CONTEXT.reset(token)
+
+
+class LogContextFilter(logging.Filter):
+    """Copies log_context() fields onto the record unless passed explicitly via `extra`."""
+
+    FIELDS = ('sku', 'stage')
+
+    def filter(self, record):
+        ctx = _LOG_CONTEXT.get()
+        for name in self.FIELDS:
+            if not hasattr(record, name):
+                setattr(record, name, ctx.get(name))
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps one in every 1/`rate` DEBUG records per call site (message template);
+    INFO and above always pass. The first occurrence of each template is kept."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, float(rate)))
+        self.every = round(1 / self.rate) if self.rate else 0
+        self._counters = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        if not self.every:
+            return False
+        key = (record.name, record.msg)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        return next(counter) % self.every == 0
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line. `ts` uses the text format's timestamp so both sort and filter alike."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for name in LogContextFilter.FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that also rolls over every `interval` seconds and
+    gzips rotated files (dropship.log.1.gz, .2.gz, ...)."""
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, interval=0, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding, delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else None
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._gzip
+
+    @staticmethod
+    def _gzip(source, dest):
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+
+_LOG_HANDLERS = []
+_LOG_LISTENER = None
+_LOG_LOCK = threading.Lock()
+
+
+def configure_logging(settings=None, log_file=None):
+    """(Re)configure the root logger from the `app` config section.
+
+    With `log_queue` on, callers only enqueue records; a listener thread does
+    the formatting and file I/O. `log_format` is 'text' or 'json';
+    `log_max_bytes` / `log_rotate_seconds` trigger rotation (0 disables either)
+    and `log_debug_sample_rate` thins DEBUG records.
+    """
+    global _LOG_LISTENER
+    settings = settings or {}
+    log_file = log_file or LOG_FILE
+    with _LOG_LOCK:
+        root = logging.getLogger()
+        if _LOG_LISTENER is not None:
+            _LOG_LISTENER.stop()
+            _LOG_LISTENER = None
+        for h in _LOG_HANDLERS:
+            root.removeHandler(h)
+            h.close()
+        _LOG_HANDLERS.clear()
+
+        file_handler = CompressingRotatingFileHandler(
+            log_file,
+            max_bytes=int(settings.get('log_max_bytes', 10 * 1024 * 1024)),
+            backup_count=int(settings.get('log_backup_count', 5)),
+            interval=float(settings.get('log_rotate_seconds', 0)))
+        if settings.get('log_format', 'text') == 'json':
+            file_handler.setFormatter(JsonLogFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+
+        if settings.get('log_queue', True):
+            front = logging.handlers.QueueHandler(queue.SimpleQueue())
+            _LOG_LISTENER = logging.handlers.QueueListener(front.queue, file_handler)
+            _LOG_LISTENER.start()
+        else:
+            front = file_handler
+        # filters run on the calling thread, before the record is queued
+        front.addFilter(LogContextFilter())
+        front.addFilter(DebugSamplingFilter(settings.get('log_debug_sample_rate', 1.0)))
+        root.addHandler(front)
+        _LOG_HANDLERS.append(front)
+        if front is not file_handler:
+            _LOG_HANDLERS.append(file_handler)
+        root.setLevel(str(settings.get('log_level', 'INFO')).upper())
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread."""
+    global _LOG_LISTENER
+    with _LOG_LOCK:
+        if _LOG_LISTENER is not None:
+            _LOG_LISTENER.stop()
+            _LOG_LISTENER = None
+
+
+configure_logging()
+atexit.register(shutdown_logging)
+
 
 # -------------------------- Defaults & Mappings --------------------------
 DEFAULTS = {
@@ -50,13 +236,15 @@ DEFAULTS = {
             "client_id": "",
             "client_secret": "",
             "token": "",
-            "token_expires": 0
+            "token_expires": 0,
+            "token_scope": ""
         },
         "prod": {
             "client_id": "",
             "client_secret": "",
             "token": "",
-            "token_expires": 0
+            "token_expires": 0,
+            "token_scope": ""
         },
         "use_sandbox": True,
         "user_tokens": {
@@ -68,10 +256,43 @@ DEFAULTS = {
         "markup_percent": 30.0,
         "sync_interval_hours": 6,
         "max_retries": 3,
-        "retry_backoff_seconds": 2
+        "retry_backoff_seconds": 2,
+        "import_fetch_workers": 8,
+        "import_normalize_workers": 2,
+        "import_list_workers": 4,
+        "import_queue_size": 64,
+        "sync_call_budget": 0,
+        "product_cache_ttl": 900,
+        "ali_fetch_workers": 4,
+        "sync_product_max_age": 60,
+        "import_idempotency_ttl": 600,
+        "log_level": "INFO",
+        "log_format": "text",
+        "log_queue": True,
+        "log_max_bytes": 10485760,
+        "log_backup_count": 5,
+        "log_rotate_seconds": 0,
+        "log_debug_sample_rate": 1.0,
+        "image_cache_max_mb": 512,
+        "image_download_workers": 8,
+        "image_process_workers": 0,
+        "repricing": {
+            "tiers": [],
+            "category_markup": {},
+            "fee_percent": 0.0,
+            "fee_fixed": 0.0,
+            "shipping": 0.0,
+            "min_profit": 0.0,
+            "price_ending": None
+        }
     }
 }
 
+# Inventory API bulk_update_price_quantity accepts at most 25 SKUs per call
+EBAY_BULK_MAX = 25
+# Affiliate productdetail.get accepts a comma-separated product_ids list of at most 50
+ALI_PRODUCT_BATCH_MAX = 50
+
 ALI_TO_EBAY = {
     'Phones & Telecommunications': '15032',
     'Computer & Office': '58058',
@@ -106,6 +327,10 @@ def decrypt_config(blob: bytes):
 
 
 import copy
+import tempfile
+from collections import OrderedDict, deque
+
+import config_service
 
 def deep_merge_dicts(a, b):
     """Recursively merge dict b into dict a (a is the default, b is loaded)."""
@@ -116,117 +341,1021 @@ def deep_merge_dicts(a, b):
             a[k] = v
     return a
 
+
+CONFIG = config_service.ConfigService(CONFIG_FILE, DEFAULTS, encrypt_config, decrypt_config,
+                                      merge=deep_merge_dicts)
+
+
 def save_config(cfg: dict):
-    with open(CONFIG_FILE, 'wb') as f:
-        f.write(encrypt_config(cfg))
-    logger.info('Config saved (encrypted)')
+    CONFIG.save(cfg)
 
 def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        save_config(copy.deepcopy(DEFAULTS))
-        return copy.deepcopy(DEFAULTS)
-    try:
-        with open(CONFIG_FILE, 'rb') as f:
-            blob = f.read()
-        cfg = decrypt_config(blob)
-        merged = copy.deepcopy(DEFAULTS)
-        deep_merge_dicts(merged, cfg)
-        return merged
-    except Exception as e:
-        logger.exception('Failed to load config: %s', e)
-        save_config(copy.deepcopy(DEFAULTS))
-        return copy.deepcopy(DEFAULTS)
+    """Mutable copy of the current config."""
+    return CONFIG.load()
+
+def config_snapshot():
+    """Shared read-only view of the current config; cheap to call often."""
+    return CONFIG.snapshot()
+
+def update_config(fn):
+    return CONFIG.update(fn)
 
 # -------------------------- Database -------------------------------------
 
+class _ConnectionGuard:
+    """Lives in a thread's local storage; its finalizer closes that thread's connection."""
+
+    __slots__ = ('__weakref__',)
+
+
+class Storage:
+    """Thin SQLite layer: one persistent connection per thread, WAL journal.
+
+    Connections are opened lazily on first use in each thread and reused for the
+    life of the thread, so the per-call connect/close overhead goes away and
+    the sqlite3 statement cache (`cached_statements`) keeps prepared statements
+    hot. A connection is closed when its thread exits, so the short-lived
+    threads the GUI and import pipeline start don't leave connections behind.
+    WAL lets GUI reads proceed while the sync thread is writing.
+    """
+
+    PRAGMAS = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', 5000),
+        ('temp_store', 'MEMORY'),
+        ('cache_size', -20000),
+        ('foreign_keys', 'ON'),
+        # REPLACE only fires delete triggers with this on; the aggregates depend on it
+        ('recursive_triggers', 'ON'),
+    )
+
+    def __init__(self, path, statement_cache=256):
+        self.path = path
+        self.statement_cache = statement_cache
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns = []
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   cached_statements=self.statement_cache)
+            for name, value in self.PRAGMAS:
+                conn.execute(f'PRAGMA {name}={value}')
+            self._local.conn = conn
+            self._local.depth = 0
+            # the thread-local is dropped when the thread ends, taking this guard with it
+            guard = self._local.guard = _ConnectionGuard()
+            weakref.finalize(guard, self._release, conn)
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            if conn in self._conns:
+                self._conns.remove(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT on this thread's connection. Nested calls join the outer transaction."""
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self._local.depth = 0
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql, rows):
+        """Run `sql` for every row in one transaction."""
+        with self.transaction() as conn:
+            return conn.executemany(sql, rows)
+
+    def query(self, sql, params=(), row_factory=None):
+        cur = self.connection().execute(sql, params)
+        if row_factory is not None:
+            cur.row_factory = row_factory
+        return cur.fetchall()
+
+    def query_one(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def close_all(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+_STORAGES = {}
+_STORAGES_LOCK = threading.Lock()
+
+
+def get_storage(path=None):
+    """Return the shared Storage for `path` (defaults to DB_FILE)."""
+    path = path or DB_FILE
+    with _STORAGES_LOCK:
+        store = _STORAGES.get(path)
+        if store is None:
+            store = _STORAGES[path] = Storage(path)
+        return store
+
+
+# Rollup marker in product_aggregates: ('*', '*') is the whole catalog,
+# (marketplace, '*') and ('*', category) the per-marketplace/per-category totals.
+AGG_ALL = '*'
+
+
+def _aggregate_delta_sql(row, sign):
+    # Adds (sign=+1) or removes (sign=-1) one products row (NEW/OLD) from all four rollups.
+    m = f"COALESCE({row}.marketplace, '')"
+    c = f"COALESCE({row}.category, '')"
+    return f'''
+        INSERT INTO product_aggregates (marketplace, category, count, total_value, total_qty)
+        SELECT k.m, k.c, {sign}, {sign} * COALESCE({row}.price, 0), {sign} * COALESCE({row}.qty, 0)
+        FROM (SELECT {m} AS m, {c} AS c UNION ALL SELECT {m}, '{AGG_ALL}'
+              UNION ALL SELECT '{AGG_ALL}', {c} UNION ALL SELECT '{AGG_ALL}', '{AGG_ALL}') AS k
+        WHERE 1
+        ON CONFLICT(marketplace, category) DO UPDATE SET
+            count = count + excluded.count,
+            total_value = total_value + excluded.total_value,
+            total_qty = total_qty + excluded.total_qty;
+    '''
+
+
+def rebuild_product_aggregates(conn):
+    """Recompute product_aggregates from scratch (first run after upgrade, or repair)."""
+    conn.execute('DELETE FROM product_aggregates')
+    for m, c in (("COALESCE(marketplace, '')", "COALESCE(category, '')"),
+                 ("COALESCE(marketplace, '')", f"'{AGG_ALL}'"),
+                 (f"'{AGG_ALL}'", "COALESCE(category, '')"),
+                 (f"'{AGG_ALL}'", f"'{AGG_ALL}'")):
+        conn.execute(f'''
+            INSERT INTO product_aggregates (marketplace, category, count, total_value, total_qty)
+            SELECT {m}, {c}, COUNT(*), COALESCE(SUM(price), 0), COALESCE(SUM(qty), 0)
+            FROM products GROUP BY 1, 2
+        ''')
+
+
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ali_product_id TEXT UNIQUE,
-            title TEXT,
-            ebay_item_id TEXT,
-            price REAL,
-            qty INTEGER,
-            last_sync TIMESTAMP,
-            raw TEXT
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS prices (
-            sku TEXT PRIMARY KEY,
-            price REAL
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    db = get_storage()
+    with db.transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ali_product_id TEXT UNIQUE,
+                title TEXT,
+                ebay_item_id TEXT,
+                price REAL,
+                qty INTEGER,
+                last_sync TIMESTAMP,
+                raw TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS prices (
+                sku TEXT PRIMARY KEY,
+                price REAL
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sku_stats (
+                ali_product_id TEXT PRIMARY KEY,
+                checks INTEGER DEFAULT 0,
+                changes INTEGER DEFAULT 0,
+                change_weight REAL DEFAULT 0,
+                hours_weight REAL DEFAULT 0,
+                qty_volatility REAL DEFAULT 0,
+                price_volatility REAL DEFAULT 0,
+                last_checked REAL,
+                last_changed REAL,
+                last_sold REAL
+            )
+        ''')
+        columns = {r[1] for r in conn.execute('PRAGMA table_info(products)')}
+        for name, kind in (('marketplace', 'TEXT'), ('category', 'TEXT'), ('cost', 'REAL')):
+            if name not in columns:
+                conn.execute(f'ALTER TABLE products ADD COLUMN {name} {kind}')
+                if name == 'cost':
+                    # supplier price lives in the stored product JSON until now
+                    conn.execute("UPDATE products SET cost = json_extract(raw, '$.price') WHERE json_valid(raw)")
+        fresh = not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='product_aggregates'").fetchone()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS product_aggregates (
+                marketplace TEXT NOT NULL,
+                category TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                total_value REAL NOT NULL DEFAULT 0,
+                total_qty INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (marketplace, category)
+            )
+        ''')
+        # Triggers keep the rollups in the writer's transaction, whatever path writes products.
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_agg_insert AFTER INSERT ON products BEGIN
+                {_aggregate_delta_sql('NEW', 1)}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_agg_delete AFTER DELETE ON products BEGIN
+                {_aggregate_delta_sql('OLD', -1)}
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS products_agg_update
+            AFTER UPDATE OF price, qty, marketplace, category ON products BEGIN
+                {_aggregate_delta_sql('OLD', -1)}
+                {_aggregate_delta_sql('NEW', 1)}
+            END
+        ''')
+        if fresh:
+            rebuild_product_aggregates(conn)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS history_skus (
+                id INTEGER PRIMARY KEY,
+                ali_product_id TEXT UNIQUE NOT NULL,
+                category TEXT
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS price_history (
+                sku_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                price_cents INTEGER NOT NULL,
+                cost_cents INTEGER NOT NULL,
+                qty INTEGER NOT NULL,
+                sold INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (sku_id, ts)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ebay_categories (
+                marketplace TEXT NOT NULL,
+                category_id TEXT NOT NULL,
+                parent_id TEXT,
+                name TEXT NOT NULL,
+                path TEXT NOT NULL,
+                leaf INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (marketplace, category_id)
+            ) WITHOUT ROWID
+        ''')
 
 init_db()
 
 # -------------------------- Retry decorator ------------------------------
 
-def retry(max_retries=3, backoff=2):
+# HTTP statuses worth retrying; every other 4xx is a request problem that will fail again.
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+# eBay errorIds that signal a transient server-side fault even on a 4xx/5xx body:
+# 2003 = internal error (REST APIs), 25001 = Inventory API system error.
+EBAY_RETRYABLE_ERROR_IDS = frozenset({2003, 25001})
+
+
+class ApiError(Exception):
+    """Marketplace API failure carrying what the retry engine needs to classify it."""
+
+    def __init__(self, message, status=None, error_ids=(), retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.error_ids = frozenset(error_ids)
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, resp, message=None):
+        error_ids = []
+        try:
+            for err in (resp.json() or {}).get('errors', []):
+                if err.get('errorId') is not None:
+                    error_ids.append(int(err['errorId']))
+        except Exception:
+            pass
+        retry_after = _parse_retry_after((getattr(resp, 'headers', None) or {}).get('Retry-After'))
+        message = message or 'API request failed'
+        return cls(f'{message}: {resp.status_code}', status=resp.status_code, error_ids=error_ids,
+                   retry_after=retry_after)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while an endpoint's circuit breaker is open."""
+
+
+def _parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def classify_error(exc):
+    """Return `(retryable, retry_after_seconds)` for an exception raised by an API call."""
+    if isinstance(exc, CircuitOpenError):
+        return False, None
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        exc = ApiError.from_response(exc.response)
+    if isinstance(exc, ApiError):
+        if exc.error_ids & EBAY_RETRYABLE_ERROR_IDS:
+            return True, exc.retry_after
+        if exc.status is None:
+            return False, None
+        if exc.status in RETRYABLE_STATUS or exc.status >= 500:
+            return True, exc.retry_after
+        return False, None
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True, None
+    return False, None
+
+
+class RetryBudget:
+    """Process-wide cap on retries so an outage can't multiply traffic.
+
+    Every call deposits `ratio` tokens and the bucket also refills at
+    `min_per_second`; each retry spends one token. Once empty, failures are
+    raised straight away instead of being retried.
+    """
+
+    def __init__(self, ratio=0.2, min_per_second=1.0, capacity=50.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.min_per_second)
+        self._stamp = now
+
+    def record_call(self):
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """Per-endpoint breaker: opens after `failure_threshold` consecutive
+    transient failures, fails fast for `reset_timeout` seconds, then lets a
+    single trial call through (half-open) to decide whether to close again."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                self._trial = False
+            if self.state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half-open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.error('Circuit opened after %s failures', self._failures)
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+
+RETRY_BUDGET = RetryBudget()
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(endpoint):
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(endpoint)
+        if breaker is None:
+            breaker = _BREAKERS[endpoint] = CircuitBreaker()
+        return breaker
+
+
+def _retry_delay(name, exc, attempt, max_retries, backoff, max_delay, breaker):
+    """Seconds to wait before the next attempt, or None to give up and re-raise."""
+    retryable, retry_after = classify_error(exc)
+    if not retryable:
+        # The API answered, it just refused this request; that says nothing bad about its health.
+        breaker.record_success()
+        logger.warning('Not retrying %s: %s', name, exc)
+        return None
+    breaker.record_failure()
+    if attempt >= max_retries:
+        logger.exception('Max retries reached for %s', name)
+        return None
+    if retry_after is not None and retry_after > max_delay:
+        logger.warning('%s asked to retry after %.0fs (> %ss); giving up', name, retry_after, max_delay)
+        return None
+    if not RETRY_BUDGET.try_spend():
+        logger.warning('Retry budget exhausted; not retrying %s: %s', name, exc)
+        return None
+    # Full jitter: uniform over [0, capped exponential], but never sooner than Retry-After.
+    delay = random.uniform(0, min(max_delay, backoff * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    logger.warning('Attempt %s failed for %s: %s; retrying in %.2fs', attempt, name, exc, delay)
+    return delay
+
+
+def retry(max_retries=3, backoff=2, max_delay=30, endpoint=None):
+    """Retry transient API failures with full-jitter exponential backoff.
+
+    Non-retryable errors (validation 4xx, programming errors) are raised on the
+    first attempt. Retries honour Retry-After, draw from the global
+    RETRY_BUDGET, and are short-circuited by the endpoint's CircuitBreaker
+    (keyed by `endpoint`, default the function's qualified name). Works on
+    both plain functions and coroutine functions; the latter sleep with
+    `asyncio.sleep`.
+    """
     def deco(func):
+        name = endpoint or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                breaker = get_breaker(name)
+                RETRY_BUDGET.record_call()
+                attempt = 0
+                while True:
+                    if not breaker.allow():
+                        raise CircuitOpenError(f'{name}: circuit open, failing fast')
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        attempt += 1
+                        delay = _retry_delay(name, e, attempt, max_retries, backoff, max_delay, breaker)
+                        if delay is None:
+                            raise
+                        await asyncio.sleep(delay)
+                    else:
+                        breaker.record_success()
+                        return result
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
+            breaker = get_breaker(name)
+            RETRY_BUDGET.record_call()
             attempt = 0
             while True:
+                if not breaker.allow():
+                    raise CircuitOpenError(f'{name}: circuit open, failing fast')
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
                     attempt += 1
-                    logger.warning('Attempt %s failed for %s: %s', attempt, func.__name__, e)
-                    if attempt >= max_retries:
-                        logger.exception('Max retries reached for %s', func.__name__)
+                    delay = _retry_delay(name, e, attempt, max_retries, backoff, max_delay, breaker)
+                    if delay is None:
                         raise
-                    time.sleep(backoff * attempt)
+                    time.sleep(delay)
+                else:
+                    breaker.record_success()
+                    return result
         return wrapper
     return deco
 
+# -------------------------- Rate limiting --------------------------------
+
+# Token buckets per API method family: (tokens per second, burst). Rates are the
+# daily call quotas spread over 24h; the burst lets quota left unused during
+# quiet hours absorb daytime peaks. Override with app.rate_limits in config.
+DEFAULT_RATE_LIMITS = {
+    'ebay:inventory': (23.0, 500),     # Inventory API, ~2M calls/day
+    'ebay:fulfillment': (1.1, 100),    # Fulfillment API, ~100k calls/day
+    'ebay:identity': (0.05, 20),       # OAuth token mints
+    'ebay:taxonomy': (0.05, 10),       # Taxonomy API, ~5k calls/day
+    'ali:product': (5.0, 50),          # affiliate productdetail.get
+}
+
+# Atomic token-bucket reservation. Uses Redis server time so every process sees
+# the same clock. Returns the milliseconds the caller must wait (0 = go now),
+# or -1 if that wait would exceed ARGV[4] (nothing is reserved then).
+_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local n = tonumber(ARGV[3])
+local max_wait_ms = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+local wait_ms = 0
+if tokens < n then
+  wait_ms = math.ceil((n - tokens) * 1000 / rate)
+  if max_wait_ms >= 0 and wait_ms > max_wait_ms then
+    return -1
+  end
+end
+tokens = tokens - n
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 60000)
+return wait_ms
+"""
+
+
+class RateLimitTimeout(Exception):
+    """The limiter could not grant a call within the caller's timeout."""
+
+
+class RateLimiter:
+    """Token-bucket limiter per API method family.
+
+    Buckets live in Redis (when `redis_url` is set and reachable) so the GUI,
+    the core API and RQ workers draw from the same quota; otherwise, or while
+    Redis is down, an in-process bucket is used. Callers reserve their token
+    up front and sleep until it is due, so waiters are served in order and a
+    burst is smoothed instead of rejected. Families with no configured limit
+    are not limited.
+    """
+
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, limits=None, redis_url=None, prefix='gmb:ratelimit:'):
+        self.limits = {k: (float(v[0]), float(v[1])) for k, v in (limits or {}).items()}
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._local = {}  # family -> [tokens, monotonic ts]
+        self._redis = None
+        self._script = None
+        self._redis_down_until = 0.0
+
+    def _redis_script(self):
+        if not self.redis_url or redis is None or time.monotonic() < self._redis_down_until:
+            return None
+        if self._script is None:
+            self._redis = redis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            self._script = self._redis.register_script(_BUCKET_LUA)
+        return self._script
+
+    def _reserve_local(self, family, rate, burst, n, max_wait):
+        with self._lock:
+            now = time.monotonic()
+            tokens, ts = self._local.get(family, (burst, now))
+            tokens = min(burst, tokens + (now - ts) * rate)
+            wait = max(0.0, (n - tokens) / rate)
+            if max_wait is not None and wait > max_wait:
+                self._local[family] = (tokens, now)
+                return None
+            self._local[family] = (tokens - n, now)
+            return wait
+
+    def _reserve(self, family, rate, burst, n, max_wait):
+        script = self._redis_script()
+        if script is not None:
+            try:
+                max_wait_ms = -1 if max_wait is None else int(max_wait * 1000)
+                wait_ms = script(keys=[self.prefix + family], args=[rate, burst, n, max_wait_ms])
+                return None if wait_ms < 0 else wait_ms / 1000.0
+            except Exception as e:
+                logger.warning('Rate limiter: Redis unavailable (%s); using in-process buckets for %ss',
+                               e, self.REDIS_RETRY_SECONDS)
+                self._redis_down_until = time.monotonic() + self.REDIS_RETRY_SECONDS
+        return self._reserve_local(family, rate, burst, n, max_wait)
+
+    def acquire(self, family, n=1, timeout=None):
+        """Block until `n` calls of `family` may be sent; returns the seconds waited."""
+        limit = self.limits.get(family)
+        if limit is None:
+            return 0.0
+        wait = self._reserve(family, limit[0], limit[1], n, timeout)
+        if wait is None:
+            raise RateLimitTimeout(f'{family}: no capacity within {timeout}s')
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def configure(self, limits):
+        with self._lock:
+            self.limits.update({k: (float(v[0]), float(v[1])) for k, v in limits.items()})
+
+
+RATE_LIMITER = RateLimiter(DEFAULT_RATE_LIMITS, os.getenv('REDIS_URL'))
+
+# -------------------------- Response cache -------------------------------
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL, bounded by entry count and bytes.
+
+    Values are stored JSON-encoded: that gives an honest size for the byte
+    bound and means callers always get their own copy, so mutating a returned
+    value can't poison the cache.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=900):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (stored_at, expires_at, blob)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, max_age=None):
+        """Return the cached value, or None if missing, expired or older than `max_age` seconds."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, expires_at, blob = entry
+            if now >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if max_age is not None and now - stored_at > max_age:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return json.loads(blob)
+
+    def put(self, key, value, ttl=None):
+        blob = json.dumps(value)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            self._store(key, blob, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Store `value` only if `key` has no live entry (like Redis SETNX).
+
+        Returns None when stored, otherwise the value already cached. Check
+        and store happen under one lock, so of several concurrent callers
+        exactly one gets None.
+        """
+        blob = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and now < entry[1]:
+                existing = entry[2]
+            else:
+                existing = None
+                self._store(key, blob, ttl)
+        return None if existing is None else json.loads(existing)
+
+    def _store(self, key, blob, ttl):
+        now = time.time()
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (now, now + (self.ttl if ttl is None else ttl), blob)
+        self._bytes += len(blob)
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        self._bytes -= len(self._data.pop(key)[2])
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+
+PRODUCT_CACHE = TTLCache()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls by key: the first caller runs `fn`, and callers
+    arriving while it runs wait for it and get the same result (or exception).
+
+    Only overlapping calls are merged; once a run finishes its key is
+    forgotten and the next call runs `fn` again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> {'done': Event, 'result': ..., 'error': ...}
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = {'done': threading.Event()}
+            else:
+                self.shared += 1
+        if leader:
+            self._run(key, fn, flight)
+        else:
+            flight['done'].wait()
+        if flight.get('error') is not None:
+            raise flight['error']
+        return flight['result']
+
+    def start(self, key, fn, name=None):
+        """Run `fn` in a daemon thread unless a call for `key` is already in
+        flight; returns whether a run was started. Callers of `do` arriving
+        meanwhile wait for it."""
+        with self._lock:
+            if key in self._inflight:
+                return False
+            flight = self._inflight[key] = {'done': threading.Event()}
+        threading.Thread(target=self._run, args=(key, fn, flight), name=name, daemon=True).start()
+        return True
+
+    def _run(self, key, fn, flight):
+        try:
+            flight['result'] = fn()
+        except Exception as e:
+            flight['error'] = e
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight['done'].set()
+
+
+# Imports in progress per (marketplace, ali_id), and finished ones per client idempotency key
+IMPORT_FLIGHTS = SingleFlight()
+IMPORT_RESULTS = TTLCache(max_entries=10000, max_bytes=8 * 1024 * 1024, ttl=600)
+
 # -------------------------- AliExpress API (skeleton) --------------------
 
+def normalize_ali_item(p):
+    """Flatten one product entry of a productdetail response into our product dict."""
+    return {
+        'id': p.get('product_id'),
+        'title': p.get('subject'),
+        'description': p.get('description'),
+        'price': float(p.get('target_sale_price') or 0),
+        'qty': int(p.get('total_avaliable_stock') or 0),
+        'images': p.get('image_urls', '').split(';') if p.get('image_urls') else [],
+        'variants': p.get('sku_infos', []),
+        'category': p.get('first_level_category_name')
+    }
+
+
+def _productdetail_response(products):
+    return {
+        'aliexpress_affiliate_productdetail_get_response': {
+            'resp_result': {
+                'result': {
+                    'products': products
+                }
+            }
+        }
+    }
+
+
 class AliExpressAPI:
     def __init__(self, cfg):
         self.key = cfg.get('ali_app_key')
         self.secret = cfg.get('ali_app_secret')
         self.base = 'http://gw.api.taobao.com/router/rest'  # affiliate endpoint used as example
+        self.cache = PRODUCT_CACHE
+        self.cache_ttl = cfg.get('app', {}).get('product_cache_ttl', 900)
+        self.fetch_workers = cfg.get('app', {}).get('ali_fetch_workers', 4)
+
+    def fetch_product(self, ali_id: str, max_age=None):
+        """Read-through cached fetch. `max_age` (seconds) rejects older cache entries; 0 forces a supplier call."""
+        cached = self.cache.get(ali_id, max_age=max_age)
+        if cached is not None:
+            return cached
+        raw = self._fetch_product_batch([ali_id])
+        self.cache.put(ali_id, raw, ttl=self.cache_ttl)
+        return raw
+
+    def fetch_products(self, ali_ids, max_age=None, raw=False):
+        """Fetch many products with as few supplier calls as possible.
+
+        Cache misses are sent in chunks of ALI_PRODUCT_BATCH_MAX, with the chunks
+        run concurrently. Returns `{ali_id: (product, error)}` where exactly one
+        of the pair is None. Products are normalized unless `raw` is set, in
+        which case each is a single-product productdetail response (the same
+        shape `fetch_product` returns).
+        """
+        results = {}
+        missing = []
+        for ali_id in dict.fromkeys(ali_ids):
+            cached = self.cache.get(ali_id, max_age=max_age)
+            if cached is None:
+                missing.append(ali_id)
+            else:
+                results[ali_id] = (cached, None)
+        chunks = [missing[i:i + ALI_PRODUCT_BATCH_MAX] for i in range(0, len(missing), ALI_PRODUCT_BATCH_MAX)]
+        if len(chunks) == 1:
+            results.update(self._fetch_chunk(chunks[0]))
+        elif chunks:
+            with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(chunks))) as pool:
+                for found in pool.map(self._fetch_chunk, chunks):
+                    results.update(found)
+        if raw:
+            return results
+        normalized = {}
+        for ali_id, (resp, err) in results.items():
+            if err is None:
+                try:
+                    products = resp['aliexpress_affiliate_productdetail_get_response']['resp_result']['result']['products']
+                    resp = normalize_ali_item(products[0])
+                except Exception as e:
+                    resp, err = None, ValueError(f'Unexpected AliExpress response: {e}')
+            normalized[ali_id] = (resp, err)
+        return normalized
+
+    def _fetch_chunk(self, ali_ids):
+        try:
+            resp = self._fetch_product_batch(ali_ids)
+            products = resp['aliexpress_affiliate_productdetail_get_response']['resp_result']['result']['products']
+        except Exception as e:
+            logger.error('AliExpress batch fetch failed for %s products: %s', len(ali_ids), e)
+            return {ali_id: (None, e) for ali_id in ali_ids}
+        found = {}
+        for p in products:
+            single = _productdetail_response([p])
+            ali_id = str(p.get('product_id'))
+            self.cache.put(ali_id, single, ttl=self.cache_ttl)
+            found[ali_id] = (single, None)
+        for ali_id in ali_ids:
+            found.setdefault(ali_id, (None, LookupError(f'AliExpress product {ali_id} not returned')))
+        return found
 
     @retry(max_retries=3, backoff=2)
-    def fetch_product(self, ali_id: str):
-        """Fetch product data. This is a placeholder-simulated response; replace with real parsing."""
-        logger.info('Fetching AliExpress product %s', ali_id)
+    def _fetch_product_batch(self, ali_ids):
+        """One productdetail.get call for up to ALI_PRODUCT_BATCH_MAX comma-separated ids.
+        This is a placeholder-simulated response; replace with real parsing."""
+        if len(ali_ids) > ALI_PRODUCT_BATCH_MAX:
+            raise ValueError(f'productdetail.get accepts at most {ALI_PRODUCT_BATCH_MAX} ids')
+        RATE_LIMITER.acquire('ali:product')
+        logger.info('Fetching AliExpress products %s', ','.join(ali_ids))
         # Simulated response structure similar to Ali affiliate SDK
-        simulated = {
-            'aliexpress_affiliate_productdetail_get_response': {
-                'resp_result': {
-                    'result': {
-                        'products': [
-                            {
-                                'product_id': ali_id,
-                                'subject': 'Sample Product ' + str(ali_id),
-                                'description': 'Auto-generated sample description',
-                                'target_sale_price': '9.99',
-                                'total_avaliable_stock': '120',
-                                'image_urls': 'https://via.placeholder.com/600;https://via.placeholder.com/800',
-                                'first_level_category_name': 'Phones & Telecommunications',
-                                'brand_name': 'DemoBrand',
-                                'sku_infos': [
-                                    {'sku_id': '1', 'color': 'Black', 'size': 'M'},
-                                    {'sku_id': '2', 'color': 'White', 'size': 'L'},
-                                ],
-                                'specs_module': {'Weight': '200g', 'Dimensions': '10x5x2 cm'},
-                                'upc': None,
-                                'ean': None,
-                                'mpn': None
-                            }
-                        ]
-                    }
-                }
+        return _productdetail_response([
+            {
+                'product_id': ali_id,
+                'subject': 'Sample Product ' + str(ali_id),
+                'description': 'Auto-generated sample description',
+                'target_sale_price': '9.99',
+                'total_avaliable_stock': '120',
+                'image_urls': 'https://via.placeholder.com/600;https://via.placeholder.com/800',
+                'first_level_category_name': 'Phones & Telecommunications',
+                'brand_name': 'DemoBrand',
+                'sku_infos': [
+                    {'sku_id': '1', 'color': 'Black', 'size': 'M'},
+                    {'sku_id': '2', 'color': 'White', 'size': 'L'},
+                ],
+                'specs_module': {'Weight': '200g', 'Dimensions': '10x5x2 cm'},
+                'upc': None,
+                'ean': None,
+                'mpn': None
             }
-        }
-        return simulated
+            for ali_id in ali_ids
+        ])
+
+# -------------------------- OAuth token cache ----------------------------
+
+EBAY_APP_SCOPES = [
+    'https://api.ebay.com/oauth/api_scope https://api.ebay.com/oauth/api_scope/sell.inventory',
+    'https://api.ebay.com/oauth/api_scope'
+]
+
+
+class TokenManager:
+    """Process-wide OAuth token cache with single-flight refresh.
+
+    Tokens are keyed by (environment, scope set, seller account). When a token
+    is missing or expired, the first caller fetches it while every other caller
+    for the same key waits for that result instead of issuing its own request.
+    Inside `refresh_margin` seconds of expiry the current token is still
+    handed out and a single background refresh replaces it.
+    """
+
+    def __init__(self, refresh_margin=300):
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._tokens = {}  # key -> (token, expires_at)
+        self._flights = SingleFlight()
+
+    def seed(self, key, token, expires):
+        """Adopt a token loaded from config if nothing newer is cached."""
+        if not token or time.time() >= expires:
+            return
+        with self._lock:
+            current = self._tokens.get(key)
+            if current is None or current[1] < expires:
+                self._tokens[key] = (token, expires)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def cached(self, key):
+        """The unexpired `(token, expires_at)` for `key`, or None; never fetches."""
+        with self._lock:
+            cached = self._tokens.get(key)
+        return cached if cached and time.time() < cached[1] else None
+
+    def get(self, key, fetch, on_refresh=None):
+        """Return `(token, expires_at)` for `key`, calling `fetch()` at most once concurrently."""
+        now = time.time()
+        with self._lock:
+            cached = self._tokens.get(key)
+        refresh = lambda: self._refresh(key, fetch, on_refresh)
+        if cached and now < cached[1]:
+            if now >= cached[1] - self.refresh_margin:
+                self._flights.start(key, refresh, name='token-refresh')
+            return cached
+        return self._flights.do(key, refresh)
+
+    def _refresh(self, key, fetch, on_refresh):
+        with self._lock:
+            cached = self._tokens.get(key)
+        # a flight that finished after our cache check may already have refreshed it
+        if cached and time.time() < cached[1] - self.refresh_margin:
+            return cached
+        try:
+            token, expires = fetch()
+        except Exception as e:
+            logger.warning('Token refresh failed for %s: %s', key[0], e)
+            raise
+        with self._lock:
+            self._tokens[key] = (token, expires)
+        if on_refresh:
+            try:
+                on_refresh(token, expires)
+            except Exception:
+                logger.exception('Failed to persist refreshed token for %s', key[0])
+        return token, expires
+
+
+TOKENS = TokenManager()
 
 # -------------------------- eBay API (skeleton) --------------------------
 
@@ -241,6 +1370,7 @@ class EbayAPI:
         self.client_secret = creds.get('client_secret')
         self.token = creds.get('token')
         self.token_expires = creds.get('token_expires', 0)
+        self.token_scope = creds.get('token_scope', '')
         self.base = 'https://api.sandbox.ebay.com' if self.env == 'sandbox' else 'https://api.ebay.com'
         self.marketplace = cfg.get('ebay', {}).get('marketplace_id', 'EBAY-AU')
         self.user_tokens = cfg.get('ebay', {}).get('user_tokens', {})
@@ -249,58 +1379,98 @@ class EbayAPI:
         self.token = token
 
     def needs_token(self):
-        return not self.token or time.time() > (self.token_expires - 60)
+        return not self.token or time.time() > (self.token_expires - TOKENS.refresh_margin)
+
+    def token_key(self, scope, account=None):
+        return (self.env, scope, account)
 
     def obtain_app_token(self):
-        # OAuth2 client_credentials flow
-        import requests
-        import time as _time
-        if not self.client_id or not self.client_secret:
+        """Get the app token from the process-wide TokenManager, fetching it at most once across threads.
+
+        Tokens are cached under the scope eBay granted, so a fallback to the
+        base scope is never handed out as an inventory-scope token. A cached
+        token for any of EBAY_APP_SCOPES is preferred over a new fetch.
+        """
+        if self.token_scope:
+            TOKENS.seed(self.token_key(self.token_scope), self.token, self.token_expires)
+        scopes = sorted(EBAY_APP_SCOPES, key=lambda scope: TOKENS.cached(self.token_key(scope)) is None)
+        if not TOKENS.cached(self.token_key(scopes[0])) and not (self.client_id and self.client_secret):
             logger.error('eBay client_id or client_secret missing for %s', self.env)
             raise Exception('eBay credentials missing')
-        url = f"{self.base}/identity/v1/oauth2/token"
-        auth = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
-        headers = {
-            'Authorization': f'Basic {auth}',
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        # Try both scopes, fallback to base if needed
-        scopes = [
-            'https://api.ebay.com/oauth/api_scope https://api.ebay.com/oauth/api_scope/sell.inventory',
-            'https://api.ebay.com/oauth/api_scope'
-        ]
         last_exc = None
         for scope in scopes:
-            data = {
-                'grant_type': 'client_credentials',
-                'scope': scope
-            }
             try:
-                resp = requests.post(url, headers=headers, data=data, timeout=15)
-                if resp.status_code != 200:
-                    logger.error('eBay token fetch failed: %s %s', resp.status_code, resp.text)
-                    last_exc = Exception(f"eBay token fetch failed: {resp.status_code}")
-                    continue
-                tok = resp.json()
-                self.token = tok['access_token']
-                self.token_expires = int(_time.time()) + int(tok['expires_in'])
-                # Persist to config
-                self.cfg['ebay'][self.env]['token'] = self.token
-                self.cfg['ebay'][self.env]['token_expires'] = self.token_expires
-                save_config(self.cfg)
-                logger.info('Obtained eBay app token for %s, expires in %ss, scope: %s', self.env, tok['expires_in'], scope)
-                return
+                self.token, self.token_expires = TOKENS.get(
+                    self.token_key(scope), lambda scope=scope: self._fetch_app_token(scope),
+                    on_refresh=lambda token, expires, scope=scope: self._persist_app_token(token, expires, scope))
             except Exception as e:
                 logger.exception('Failed to obtain eBay app token: %s', e)
                 last_exc = e
-        if last_exc:
-            raise last_exc
+                continue
+            self.token_scope = scope
+            return self.token
+        raise last_exc
+
+    def obtain_user_token(self, account: str):
+        """Access token for a seller account in `user_tokens` (refresh_token grant), shared process-wide."""
+        refresh_token = self.user_tokens.get(account)
+        if not refresh_token:
+            raise Exception(f'No eBay user token configured for {account}')
+        scope = EBAY_APP_SCOPES[0]
+
+        def fetch():
+            token, expires, granted = self._fetch_token({
+                'grant_type': 'refresh_token',
+                'refresh_token': refresh_token,
+                'scope': scope,
+            })
+            if granted != scope:
+                raise Exception(f'eBay granted {granted!r} instead of {scope!r} for {account}')
+            return token, expires
+
+        token, _ = TOKENS.get(self.token_key(scope, account), fetch)
+        return token
+
+    def _fetch_app_token(self, scope):
+        token, expires, granted = self._fetch_token({'grant_type': 'client_credentials', 'scope': scope})
+        if granted != scope:
+            raise Exception(f'eBay granted {granted!r} instead of {scope!r}')
+        return token, expires
+
+    def _fetch_token(self, data):
+        # OAuth2 token endpoint; returns (access_token, expires_at, granted scope)
+        url = f"{self.base}/identity/v1/oauth2/token"
+        auth = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+        headers = {
+            'Authorization': f'Basic {auth}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        RATE_LIMITER.acquire('ebay:identity')
+        resp = requests.post(url, headers=headers, data=data, timeout=15)
+        if resp.status_code != 200:
+            logger.error('eBay token fetch failed: %s %s', resp.status_code, resp.text)
+            raise ApiError.from_response(resp, 'eBay token fetch failed')
+        tok = resp.json()
+        # the response normally omits `scope`, meaning the requested one was granted
+        scope = tok.get('scope') or data.get('scope')
+        logger.info('Obtained eBay %s token for %s, expires in %ss, scope: %s',
+                    data['grant_type'], self.env, tok['expires_in'], scope)
+        return tok['access_token'], int(time.time()) + int(tok['expires_in']), scope
+
+    def _persist_app_token(self, token, expires, scope):
+        # Runs once per refresh (in the refreshing thread), not once per caller.
+        def apply(cfg):
+            cfg['ebay'][self.env]['token'] = token
+            cfg['ebay'][self.env]['token_expires'] = expires
+            cfg['ebay'][self.env]['token_scope'] = scope
+        update_config(apply)
 
     @retry(max_retries=3, backoff=2)
     def create_inventory_item(self, sku: str, payload: dict):
         if self.needs_token():
             self.obtain_app_token()
         # Placeholder: in production call Inventory API
+        RATE_LIMITER.acquire('ebay:inventory')
         logger.info('Simulated create inventory item %s', sku)
         return {'sku': sku}
 
@@ -308,6 +1478,7 @@ class EbayAPI:
     def create_offer(self, payload: dict):
         if self.needs_token():
             self.obtain_app_token()
+        RATE_LIMITER.acquire('ebay:inventory')
         logger.info('Simulated create offer')
         return {'offerId': 'SIM-OFFER-' + str(int(time.time()))}
 
@@ -315,6 +1486,7 @@ class EbayAPI:
     def publish_offer(self, offer_id: str):
         if self.needs_token():
             self.obtain_app_token()
+        RATE_LIMITER.acquire('ebay:inventory')
         logger.info('Simulated publish offer %s', offer_id)
         return {'status': 'PUBLISHED', 'offerId': offer_id}
 
@@ -322,37 +1494,339 @@ class EbayAPI:
     def update_inventory_quantity(self, sku: str, qty: int):
         if self.needs_token():
             self.obtain_app_token()
+        RATE_LIMITER.acquire('ebay:inventory')
         logger.info('Simulated update qty for %s -> %s', sku, qty)
         return True
 
+    @retry(max_retries=3, backoff=2)
+    def bulk_update_price_quantity(self, requests_: list):
+        """Push up to EBAY_BULK_MAX price/quantity updates in one call.
+
+        Each request is `{'sku', 'shipToLocationAvailability', 'offers'}` as in the
+        Inventory API; the response carries one entry per SKU/offer with its own
+        statusCode so partial failures can be mapped back.
+        """
+        if len(requests_) > EBAY_BULK_MAX:
+            raise ValueError(f'bulk_update_price_quantity accepts at most {EBAY_BULK_MAX} requests')
+        if self.needs_token():
+            self.obtain_app_token()
+        RATE_LIMITER.acquire('ebay:inventory')
+        logger.info('Simulated bulk price/quantity update for %s SKUs', len(requests_))
+        responses = []
+        for req in requests_:
+            for offer in req.get('offers') or [{}]:
+                responses.append({'sku': req['sku'], 'offerId': offer.get('offerId'), 'statusCode': 200})
+        return {'responses': responses}
+
     @retry(max_retries=3, backoff=2)
     def get_orders(self):
         if self.needs_token():
             self.obtain_app_token()
+        RATE_LIMITER.acquire('ebay:fulfillment')
         logger.info('Simulated get orders')
         return []
 
+    @retry(max_retries=3, backoff=2)
+    def get_category_tree(self, marketplace=None):
+        """Full category tree for `marketplace` from the Taxonomy API (getCategoryTree response)."""
+        if self.needs_token():
+            self.obtain_app_token()
+        headers = {'Authorization': f'Bearer {self.token}', 'Accept-Encoding': 'gzip'}
+        RATE_LIMITER.acquire('ebay:taxonomy')
+        resp = requests.get(f'{self.base}/commerce/taxonomy/v1/get_default_category_tree_id', headers=headers,
+                            params={'marketplace_id': _marketplace_key(marketplace or self.marketplace)}, timeout=15)
+        if resp.status_code != 200:
+            raise ApiError.from_response(resp, 'eBay category tree id lookup failed')
+        tree_id = resp.json()['categoryTreeId']
+        RATE_LIMITER.acquire('ebay:taxonomy')
+        resp = requests.get(f'{self.base}/commerce/taxonomy/v1/category_tree/{tree_id}', headers=headers, timeout=120)
+        if resp.status_code != 200:
+            raise ApiError.from_response(resp, 'eBay category tree fetch failed')
+        return resp.json()
+
+# -------------------------- Category matching ----------------------------
+
+_CATEGORY_TOKEN_RE = re.compile(r'[a-z0-9]+')
+# connectives that are all over category names ("Cases, Covers & Skins", "Parts for ...")
+_CATEGORY_STOPWORDS = frozenset({'a', 'and', 'for', 'in', 'of', 'the', 'with'})
+
+
+def category_tokens(text):
+    """Lowercase word tokens with a crude plural strip, so 'Phones' meets 'phone'."""
+    out = []
+    for tok in _CATEGORY_TOKEN_RE.findall((text or '').lower()):
+        if tok in _CATEGORY_STOPWORDS:
+            continue
+        if len(tok) > 3 and tok.endswith('s') and not tok.endswith('ss'):
+            tok = tok[:-1]
+        out.append(tok)
+    return out
+
+
+def _trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _marketplace_key(marketplace):
+    # config uses the legacy 'EBAY-AU' spelling, the Taxonomy API 'EBAY_AU'
+    return (marketplace or DEFAULTS['ebay']['marketplace_id']).upper().replace('-', '_')
+
+
+class CategoryIndex:
+    """Fuzzy matcher over one marketplace's leaf categories.
+
+    Two inverted indexes narrow the search before any string comparison:
+    word -> leaves whose path contains it, and character trigram -> words,
+    which maps a query word the tree doesn't use verbatim ('earphone',
+    'sunglases') onto the closest tree words. Leaves are ranked by the
+    IDF-weighted words they share with the query (words in the leaf's own
+    name count double), and only the top `shortlist` are compared with
+    difflib. Results are memoized per query string.
+    """
+
+    LEAF_WEIGHT = 2.0
+    MEMO_MAX = 100000
+
+    def __init__(self, categories, shortlist=20, min_score=0.45, min_token_similarity=0.6):
+        self.shortlist = shortlist
+        self.min_score = min_score
+        self.min_token_similarity = min_token_similarity
+        self.ids, self.paths, self.names = [], [], []
+        postings = {}
+        for cid, path in categories:
+            leaf = len(self.ids)
+            parts = [p.strip() for p in str(path).split('>')]
+            self.ids.append(str(cid))
+            self.paths.append(' > '.join(parts))
+            self.names.append(' '.join(category_tokens(parts[-1])))
+            weights = {}
+            for depth, part in enumerate(parts):
+                w = self.LEAF_WEIGHT if depth == len(parts) - 1 else 1.0
+                for tok in category_tokens(part):
+                    weights[tok] = max(weights.get(tok, 0.0), w)
+            for tok, w in weights.items():
+                postings.setdefault(tok, ([], []))
+                postings[tok][0].append(leaf)
+                postings[tok][1].append(w)
+        n = max(1, len(self.ids))
+        self.postings = {}
+        self.idf = {}
+        self.grams = {}
+        self.gram_counts = {}
+        for tok, (leaves, weights) in postings.items():
+            self.postings[tok] = (np.array(leaves, dtype=np.int32), np.array(weights))
+            self.idf[tok] = math.log(1.0 + n / len(leaves))
+            grams = _trigrams(tok)
+            self.gram_counts[tok] = len(grams)
+            for g in grams:
+                self.grams.setdefault(g, []).append(tok)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def similar_tokens(self, token, limit=3):
+        """Tree words sharing enough trigrams with `token`: [(word, jaccard)], best first."""
+        if token in self.postings:
+            return [(token, 1.0)]
+        grams = _trigrams(token)
+        shared = {}
+        for g in grams:
+            for tok in self.grams.get(g, ()):
+                shared[tok] = shared.get(tok, 0) + 1
+        out = []
+        for tok, k in shared.items():
+            sim = k / (len(grams) + self.gram_counts[tok] - k)
+            if sim >= self.min_token_similarity:
+                out.append((tok, sim))
+        return heapq.nlargest(limit, out, key=lambda x: x[1])
+
+    def match(self, query):
+        """Best leaf for an Ali category path ('A > B > C') or a title: `(category_id, path, score)` or None."""
+        key = (query or '').strip().lower()
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        result = self._match(key)
+        with self._lock:
+            if len(self._memo) >= self.MEMO_MAX:
+                self._memo.clear()
+            self._memo[key] = result
+        return result
+
+    def _match(self, query):
+        parts = [p for p in query.split('>') if p.strip()]
+        if not parts or not self.ids:
+            return None
+        # the most specific segment of an Ali path says the most about the leaf
+        wanted = {}
+        for depth, part in enumerate(parts):
+            w = 1.0 if depth == len(parts) - 1 else 0.5
+            for tok in category_tokens(part):
+                wanted[tok] = max(wanted.get(tok, 0.0), w)
+        if not wanted:
+            return None
+        scores = np.zeros(len(self.ids))
+        possible = 0.0
+        matched = 0
+        for tok, w in wanted.items():
+            similar = self.similar_tokens(tok)
+            if not similar:
+                continue
+            matched += 1
+            possible += w * self.idf[similar[0][0]] * self.LEAF_WEIGHT
+            for word, sim in similar:
+                leaves, weights = self.postings[word]
+                np.add.at(scores, leaves, weights * (w * sim * self.idf[word]))
+        hit = np.flatnonzero(scores)
+        if not len(hit):
+            return None
+        # titles carry words no category uses ('1.7L', 'new'); they dilute the match, but only gently
+        possible /= math.sqrt(matched / len(wanted))
+        top = hit[np.argsort(-scores[hit], kind='stable')[:self.shortlist]]
+        text = ' '.join(category_tokens(parts[-1]))
+        best = None
+        for leaf in top:
+            coverage = min(1.0, scores[leaf] / possible)
+            ratio = difflib.SequenceMatcher(None, text, self.names[leaf]).ratio()
+            score = 0.7 * coverage + 0.3 * ratio
+            if best is None or score > best[2]:
+                best = (self.ids[leaf], self.paths[leaf], round(float(score), 3))
+        return best if best[2] >= self.min_score else None
+
+
+def flatten_category_tree(tree):
+    """Rows `(category_id, parent_id, name, path, leaf)` from a Taxonomy API getCategoryTree response."""
+    rows = []
+    root = tree.get('rootCategoryNode') or {}
+    stack = [(child, None, ()) for child in root.get('childCategoryTreeNodes') or []]
+    while stack:
+        node, parent, trail = stack.pop()
+        cat = node.get('category') or {}
+        cid = str(cat.get('categoryId'))
+        trail = trail + ((cat.get('categoryName') or '').strip(),)
+        children = node.get('childCategoryTreeNodes') or []
+        leaf = bool(node.get('leafCategoryTreeNode', not children))
+        rows.append((cid, parent, trail[-1], ' > '.join(trail), int(leaf)))
+        stack.extend((child, cid, trail) for child in children)
+    return rows
+
+
+def save_category_tree(marketplace, tree, storage=None):
+    """Replace the stored category tree for `marketplace`; returns the number of leaf categories."""
+    key = _marketplace_key(marketplace)
+    rows = flatten_category_tree(tree)
+    store = storage or get_storage()
+    with store.transaction() as conn:
+        conn.execute('DELETE FROM ebay_categories WHERE marketplace=?', (key,))
+        conn.executemany('INSERT OR REPLACE INTO ebay_categories (marketplace, category_id, parent_id, name, '
+                         'path, leaf) VALUES (?, ?, ?, ?, ?, ?)', [(key,) + r for r in rows])
+    with _STORAGES_LOCK:
+        _CATEGORY_INDEXES.pop((store.path, key), None)
+    leaves = sum(r[4] for r in rows)
+    logger.info('Saved %s eBay categories (%s leaves) for %s', len(rows), leaves, key)
+    return leaves
+
+
+_CATEGORY_INDEXES = {}
+
+
+def get_category_index(marketplace=None, path=None):
+    """Shared CategoryIndex for the stored tree of `marketplace`, or None if none has been saved."""
+    store = get_storage(path)
+    key = _marketplace_key(marketplace)
+    with _STORAGES_LOCK:
+        if (store.path, key) in _CATEGORY_INDEXES:
+            return _CATEGORY_INDEXES[(store.path, key)]
+    rows = store.query('SELECT category_id, path FROM ebay_categories WHERE marketplace=? AND leaf=1', (key,))
+    index = CategoryIndex(rows) if rows else None
+    with _STORAGES_LOCK:
+        return _CATEGORY_INDEXES.setdefault((store.path, key), index)
+
 # -------------------------- Business logic --------------------------------
 
-def map_category(ali_category: str):
-    if not ali_category:
-        return None
-    return ALI_TO_EBAY.get(ali_category)
+def map_category(ali_category: str, title: str = None, marketplace: str = None):
+    """eBay category id for an Ali category path, falling back to the product title.
+
+    An exact ALI_TO_EBAY alias wins; otherwise the stored category tree for
+    `marketplace` (DropshipWorker.refresh_category_tree) is matched against
+    the category path, then the title.
+    """
+    if ali_category in ALI_TO_EBAY:
+        return ALI_TO_EBAY[ali_category]
+    index = get_category_index(marketplace) if ali_category or title else None
+    if index is not None:
+        for query in (ali_category, title):
+            hit = index.match(query) if query else None
+            if hit:
+                return hit[0]
+    return None
 
 class DropshipWorker:
     def __init__(self, cfg):
         self.cfg = cfg
+        if cfg.get('app', {}).get('rate_limits'):
+            RATE_LIMITER.configure(cfg['app']['rate_limits'])
         self.ali = AliExpressAPI(cfg)
         self.ebay = EbayAPI(cfg)
         self._stop_event = threading.Event()
         self.sync_interval = int(cfg.get('sync_interval_hours', 6)) * 3600
+        self.prioritizer = SyncPrioritizer()
+        self.repricer = Repricer.from_cfg(cfg)
+
+    def import_single(self, ali_id: str, markup_percent: float = None, idempotency_key: str = None):
+        """List one Ali product; returns the offer id.
+
+        Concurrent calls for the same product, marketplace and markup share
+        one fetch/create/publish run. A repeated `idempotency_key` returns the
+        first call's offer id for `app.import_idempotency_ttl` seconds instead
+        of listing again; the key is reserved before the run starts, so a
+        concurrent reuse for another product is refused too.
+        """
+        flight = self._import_flight(ali_id, markup_percent)
+        if not idempotency_key:
+            return IMPORT_FLIGHTS.do(flight, lambda: self._import_single(ali_id, markup_percent))
+        key = ('import', idempotency_key)
+        request = list(flight)
+        ttl = self.cfg.get('app', {}).get('import_idempotency_ttl', DEFAULTS['app']['import_idempotency_ttl'])
+        done = IMPORT_RESULTS.add(key, {'request': request, 'offer_id': None}, ttl=ttl)
+        if done is not None and done['request'] != request:
+            raise ValueError(f'Idempotency key {idempotency_key} was already used for another import')
+        if done is not None and done['offer_id'] is not None:
+            logger.info('Import of %s already done under key %s', ali_id, idempotency_key,
+                        extra={'sku': f'ALI-{ali_id}'})
+            return done['offer_id']
+
+        def run():
+            # an earlier call with this key may have finished since we looked
+            done = IMPORT_RESULTS.get(key)
+            if done is not None and done['offer_id'] is not None:
+                return done['offer_id']
+            offer_id = self._import_single(ali_id, markup_percent)
+            IMPORT_RESULTS.put(key, {'request': request, 'offer_id': offer_id}, ttl=ttl)
+            return offer_id
 
-    def import_single(self, ali_id: str, markup_percent: float = None):
+        try:
+            offer_id = IMPORT_FLIGHTS.do(flight, run)
+        except Exception:
+            # failures are not remembered, so a retry with the same key runs again
+            done = IMPORT_RESULTS.get(key)
+            if done is not None and done['offer_id'] is None:
+                IMPORT_RESULTS.invalidate(key)
+            raise
+        IMPORT_RESULTS.put(key, {'request': request, 'offer_id': offer_id}, ttl=ttl)
+        return offer_id
+
+    def _import_flight(self, ali_id, markup_percent):
+        # imports priced differently are different listings, so they must not share a run
+        return self.ebay.marketplace, str(ali_id), self._repricer_for(markup_percent).markup_percent
+
+    def _import_single(self, ali_id, markup_percent):
         product = self.ali.fetch_product(ali_id)
         # convert to normalized product dict
         prod = self._normalize_ali_product(product)
-        if markup_percent is None:
-            markup_percent = self.cfg.get('markup_percent', 30.0)
         ebay_item_id = self._create_ebay_listing(prod, markup_percent)
         return ebay_item_id
 
@@ -362,22 +1836,19 @@ class DropshipWorker:
             p = raw['aliexpress_affiliate_productdetail_get_response']['resp_result']['result']['products'][0]
         except Exception:
             raise ValueError('Unexpected AliExpress response')
-        prod = {
-            'id': p.get('product_id'),
-            'title': p.get('subject'),
-            'description': p.get('description'),
-            'price': float(p.get('target_sale_price') or 0),
-            'qty': int(p.get('total_avaliable_stock') or 0),
-            'images': p.get('image_urls', '').split(';') if p.get('image_urls') else [],
-            'variants': p.get('sku_infos', []),
-            'category': p.get('first_level_category_name')
-        }
-        return prod
+        return normalize_ali_item(p)
+
+    def _repricer_for(self, markup_percent):
+        # an explicit markup (GUI field, pipeline argument) replaces only the base markup of the rules
+        if markup_percent is None or float(markup_percent) == self.repricer.markup_percent:
+            return self.repricer
+        return Repricer.from_cfg(self.cfg, markup_percent=markup_percent)
 
-    def _create_ebay_listing(self, product: dict, markup_percent: float):
-        # Build inventory payload
+    def _create_ebay_listing(self, product: dict, markup_percent: float = None):
+        # Build inventory payload; priced by the same rules the sync and repricing paths use
         title = (product.get('title') or '')[:80]
-        price = round(product.get('price', 0) * (1 + markup_percent / 100.0), 2)
+        price = float(self._repricer_for(markup_percent).price_for([product.get('price', 0)],
+                                                                   [product.get('category')])[0])
         qty = min(product.get('qty', 0), 999)
         sku = f"ALI-{product.get('id')}"
 
@@ -406,60 +1877,195 @@ class DropshipWorker:
             'availableQuantity': qty,
             'pricingSummary': {'price': {'value': str(price), 'currency': 'USD'}}
         }
+        category_id = map_category(product.get('category'), title, self.ebay.marketplace)
+        if category_id:
+            offer_payload['categoryId'] = category_id
         offer = self.ebay.create_offer(offer_payload)
         offer_id = offer.get('offerId')
         pub = self.ebay.publish_offer(offer_id)
 
         # Save to DB
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('INSERT OR REPLACE INTO products (ali_product_id, title, ebay_item_id, price, qty, last_sync, raw) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                  (product.get('id'), title, offer_id, price, qty, datetime.utcnow().isoformat(), json.dumps(product)))
-        conn.commit()
-        conn.close()
-        logger.info('Created eBay listing %s for Ali %s', offer_id, product.get('id'))
+        get_storage().execute('INSERT OR REPLACE INTO products (ali_product_id, title, ebay_item_id, price, qty, last_sync, raw, marketplace, category, cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              (product.get('id'), title, offer_id, price, qty, datetime.utcnow().isoformat(), json.dumps(product),
+                               self.ebay.marketplace, product.get('category'), product.get('price', 0)))
+        get_history_store().record([(product.get('id'), price, product.get('price', 0), qty, product.get('category'))])
+        logger.info('Created eBay listing %s for Ali %s', offer_id, product.get('id'),
+                    extra={'sku': f"ALI-{product.get('id')}"})
         return offer_id
 
     def import_bulk_csv(self, csv_path: str):
-        results = []
+        return list(self.iter_bulk_csv(csv_path))
+
+    def iter_bulk_csv(self, csv_path: str):
+        """Stream a supplier CSV through the import pipeline, yielding rows in input order."""
+        app_cfg = self.cfg.get('app', {})
+        pipeline = ImportPipeline(
+            self,
+            fetch_workers=app_cfg.get('import_fetch_workers', 8),
+            normalize_workers=app_cfg.get('import_normalize_workers', 2),
+            list_workers=app_cfg.get('import_list_workers', 4),
+            queue_size=app_cfg.get('import_queue_size', 64),
+        )
         with open(csv_path, newline='', encoding='utf-8') as fh:
             reader = csv.DictReader(fh)
-            for row in reader:
-                ali_id = row.get('ali_id') or row.get('product_id')
-                if not ali_id:
-                    continue
-                try:
-                    res = self.import_single(ali_id)
-                    results.append((ali_id, res, 'ok'))
-                except Exception as e:
-                    logger.exception('Bulk import failed for %s', ali_id)
-                    results.append((ali_id, None, str(e)))
-        return results
-
-    def sync_stocks_now(self):
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('SELECT ali_product_id, raw, ebay_item_id FROM products')
-        rows = c.fetchall()
-        conn.close()
-        for ali_id, raw, ebay_item_id in rows:
+            ali_ids = (row.get('ali_id') or row.get('product_id') for row in reader)
+            yield from pipeline.run(ali_id for ali_id in ali_ids if ali_id)
+
+    def sync_stocks_now(self, budget=None):
+        """Refresh supplier stock/price and push changes to eBay.
+
+        With no `budget` every product is checked. With a budget only the
+        `budget` SKUs that SyncPrioritizer rates most likely to have changed are
+        fetched (a SKU count, not calls: they are fetched ALI_PRODUCT_BATCH_MAX
+        per supplier call). Either way the per-SKU change statistics are updated.
+        """
+        rows = get_storage().query('''
+            SELECT p.ali_product_id, p.raw, p.ebay_item_id, p.last_sync,
+                   s.checks, s.changes, s.change_weight, s.hours_weight, s.qty_volatility,
+                   s.price_volatility, s.last_checked, s.last_changed, s.last_sold
+            FROM products p LEFT JOIN sku_stats s ON s.ali_product_id = p.ali_product_id
+        ''', row_factory=sqlite3.Row)
+        now = time.time()
+        if budget:
+            rows = self.prioritizer.select(rows, budget, now)
+        max_age = self.cfg.get('app', {}).get('sync_product_max_age', 60)
+        stats = {'checked': 0, 'changed': 0, 'updated': 0, 'failed': 0}
+        batch = []
+        observed = []
+        chunk = ALI_PRODUCT_BATCH_MAX * self.ali.fetch_workers
+        fetched = {}
+        for n, row in enumerate(rows):
+            if n % chunk == 0:
+                fetched = self.ali.fetch_products([r['ali_product_id'] for r in rows[n:n + chunk]],
+                                                  max_age=max_age)
+            ali_id, raw, ebay_item_id = row['ali_product_id'], row['raw'], row['ebay_item_id']
+            stats['checked'] += 1
+            fresh_norm, err = fetched[ali_id]
             try:
+                if err is not None:
+                    raise err
                 prod = json.loads(raw)
-                fresh = self.ali.fetch_product(ali_id)
-                fresh_norm = self._normalize_ali_product(fresh)
-                new_qty = fresh_norm.get('qty', 0)
-                if new_qty != prod.get('qty'):
-                    ok = self.ebay.update_inventory_quantity(f'ALI-{ali_id}', new_qty)
-                    if ok:
-                        logger.info('Stock updated for %s -> %s', ali_id, new_qty)
-                        conn = sqlite3.connect(DB_FILE)
-                        c = conn.cursor()
-                        c.execute('UPDATE products SET qty=?, last_sync=?, raw=? WHERE ali_product_id=?',
-                                  (new_qty, datetime.utcnow().isoformat(), json.dumps(fresh_norm), ali_id))
-                        conn.commit()
-                        conn.close()
             except Exception as e:
-                logger.exception('Failed sync for %s: %s', ali_id, e)
+                logger.error('Failed sync for %s: %s', ali_id, e, extra={'sku': f'ALI-{ali_id}', 'stage': 'sync'})
+                stats['failed'] += 1
+                continue
+            observed.append(self.prioritizer.observe(row, prod, fresh_norm, now))
+            new_qty = fresh_norm.get('qty', 0)
+            if new_qty == prod.get('qty') and fresh_norm.get('price') == prod.get('price'):
+                continue
+            stats['changed'] += 1
+            batch.append((ali_id, ebay_item_id, fresh_norm))
+            if len(batch) >= EBAY_BULK_MAX:
+                self._push_stock_batch(batch, stats)
+                batch = []
+        if batch:
+            self._push_stock_batch(batch, stats)
+        if observed:
+            self.prioritizer.save(observed)
+        logger.info('Stock sync: %s', stats)
+        return stats
+
+    def _push_stock_batch(self, batch, stats):
+        """Send one bulk price/quantity call and commit the successful SKUs in one transaction."""
+        prices = self.repricer.price_for([f.get('price', 0) for _, _, f in batch],
+                                         [f.get('category') for _, _, f in batch])
+        by_sku = {}
+        for (ali_id, offer_id, fresh_norm), price in zip(batch, prices):
+            qty = min(fresh_norm.get('qty', 0), 999)
+            by_sku[f'ALI-{ali_id}'] = (ali_id, offer_id, fresh_norm, qty, float(price))
+        failed = self._send_bulk_updates({sku: (v[1], v[3], v[4]) for sku, v in by_sku.items()}, 'sync')
+        if failed is None:
+            stats['failed'] += len(batch)
+            return
+
+        now = datetime.utcnow().isoformat()
+        updates = [(qty, price, fresh_norm.get('price', 0), now, json.dumps(fresh_norm), ali_id)
+                   for sku, (ali_id, _, fresh_norm, qty, price) in by_sku.items() if sku not in failed]
+        if updates:
+            get_storage().executemany('UPDATE products SET qty=?, price=?, cost=?, last_sync=?, raw=? WHERE ali_product_id=?',
+                                      updates)
+            logger.info('Stock updated for %s SKUs', len(updates))
+            get_history_store().record([(ali_id, price, fresh_norm.get('price', 0), qty, fresh_norm.get('category'))
+                                        for sku, (ali_id, _, fresh_norm, qty, price) in by_sku.items()
+                                        if sku not in failed])
+        stats['updated'] += len(updates)
+        stats['failed'] += len(failed)
+
+    def _send_bulk_updates(self, entries, stage):
+        """Push `{sku: (offer_id, qty, price)}` in one bulk call.
+
+        Returns `{sku: error}` for the SKUs eBay rejected (a SKU counts as
+        updated only if every response entry for it succeeded), or None if the
+        call itself failed.
+        """
+        requests_ = []
+        for sku, (offer_id, qty, price) in entries.items():
+            req = {'sku': sku, 'shipToLocationAvailability': {'quantity': qty}}
+            if offer_id:
+                req['offers'] = [{
+                    'offerId': offer_id,
+                    'availableQuantity': qty,
+                    'price': {'value': str(price), 'currency': 'USD'},
+                }]
+            requests_.append(req)
+        try:
+            resp = self.ebay.bulk_update_price_quantity(requests_)
+        except Exception as e:
+            logger.exception('Bulk price/quantity update failed for %s SKUs: %s', len(entries), e)
+            return None
+
+        failed = {}
+        seen = set()
+        by_offer = {v[0]: sku for sku, v in entries.items() if v[0]}
+        for pos, r in enumerate(resp.get('responses', [])):
+            sku = r.get('sku') or by_offer.get(r.get('offerId'))
+            if sku is None and pos < len(requests_):
+                sku = requests_[pos]['sku']
+            if sku not in entries:
+                continue
+            seen.add(sku)
+            if not 200 <= int(r.get('statusCode', 500)) < 300:
+                failed[sku] = r.get('errors') or r.get('statusCode')
+        for sku in entries:
+            if sku not in seen:
+                failed.setdefault(sku, 'no response')
+        for sku, err in failed.items():
+            logger.warning('Price/quantity update rejected for %s: %s', sku, err, extra={'sku': sku, 'stage': stage})
+        return failed
+
+    def reprice_catalog(self, dry_run=False):
+        """Re-evaluate every listing's price under the current rules and push only the ones that moved."""
+        checked, changes = self.repricer.plan()
+        stats = {'checked': checked, 'changed': len(changes), 'updated': 0, 'failed': 0}
+        if dry_run:
+            stats['changes'] = changes
+            return stats
+        for i in range(0, len(changes), EBAY_BULK_MAX):
+            chunk = changes[i:i + EBAY_BULK_MAX]
+            entries = {f'ALI-{ali_id}': (offer_id, min(qty or 0, 999), new) for ali_id, offer_id, qty, _, new in chunk}
+            failed = self._send_bulk_updates(entries, 'reprice')
+            if failed is None:
+                stats['failed'] += len(chunk)
+                continue
+            ok = [(ali_id, new) for ali_id, _, _, _, new in chunk if f'ALI-{ali_id}' not in failed]
+            if ok:
+                with get_storage().transaction() as conn:
+                    conn.executemany('UPDATE products SET price=? WHERE ali_product_id=?',
+                                     [(new, ali_id) for ali_id, new in ok])
+                    conn.executemany('INSERT OR REPLACE INTO prices (sku, price) VALUES (?, ?)',
+                                     [(f'ALI-{ali_id}', new) for ali_id, new in ok])
+            stats['updated'] += len(ok)
+            stats['failed'] += len(failed)
+        if stats['updated']:
+            rows = get_storage().query('SELECT ali_product_id, price, cost, qty, category FROM products '
+                                       'WHERE cost IS NOT NULL')
+            get_history_store().record(rows)
+        logger.info('Repricing: %s', {k: v for k, v in stats.items() if k != 'changes'})
+        return stats
+
+    def refresh_category_tree(self):
+        """Download the marketplace's eBay category tree and store it for map_category; returns the leaf count."""
+        return save_category_tree(self.ebay.marketplace, self.ebay.get_category_tree())
 
     def start_auto_sync(self):
         logger.info('Starting auto-sync every %s seconds', self.sync_interval)
@@ -473,46 +2079,1226 @@ class DropshipWorker:
     def _auto_sync_loop(self):
         while not self._stop_event.is_set():
             try:
-                self.sync_stocks_now()
+                # sync_call_budget is in supplier calls; each call fetches ALI_PRODUCT_BATCH_MAX SKUs
+                calls = self.cfg.get('app', {}).get('sync_call_budget')
+                self.sync_stocks_now(budget=calls * ALI_PRODUCT_BATCH_MAX if calls else None)
             except Exception:
                 logger.exception('Auto-sync iteration failed')
             self._stop_event.wait(self.sync_interval)
 
+# -------------------------- Sync prioritization --------------------------
+
+class SyncPrioritizer:
+    """Ranks SKUs by how likely they are to have changed since their last check.
+
+    Each SKU's change rate is a decayed Poisson estimate (changes seen per hour
+    observed, with older observations fading after `half_life_hours`) smoothed
+    by a prior of one change per `prior_hours`. The probability of at least one
+    change since the last check is then weighted by how large past stock/price
+    moves were and by how recently the SKU sold, so fast movers and
+    near-sell-outs are refreshed first. Rarely changing SKUs still age into
+    the sweep because the probability grows with elapsed time.
+
+    Rows are mappings with the products/sku_stats columns selected in
+    DropshipWorker.sync_stocks_now (sqlite3.Row there).
+    """
+
+    def __init__(self, half_life_hours=24 * 7, prior_hours=48.0, smoothing=0.3):
+        self.half_life_hours = half_life_hours
+        self.prior_hours = prior_hours
+        self.smoothing = smoothing
+
+    @staticmethod
+    def _last_checked(row):
+        if row['last_checked'] is not None:
+            return row['last_checked']
+        try:
+            return datetime.fromisoformat(row['last_sync']).replace(tzinfo=timezone.utc).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+
+    def score(self, row, now):
+        change_weight, hours_weight, qty_vol, price_vol = (
+            row[k] or 0.0 for k in ('change_weight', 'hours_weight', 'qty_volatility', 'price_volatility'))
+        last_sold = row['last_sold']
+        rate = (change_weight + 1.0) / (hours_weight + self.prior_hours)
+        elapsed = max(0.0, now - self._last_checked(row)) / 3600.0
+        p_changed = 1.0 - math.exp(-rate * elapsed)
+        impact = 1.0 + qty_vol + price_vol
+        if last_sold:
+            impact *= 1.0 + math.exp(-max(0.0, now - last_sold) / 86400.0)
+        return p_changed * impact
+
+    def select(self, rows, budget, now):
+        return heapq.nlargest(int(budget), rows, key=lambda row: self.score(row, now))
+
+    def observe(self, row, old, new, now):
+        """Fold one check into the SKU's statistics; returns the sku_stats row to store."""
+        ali_id = row['ali_product_id']
+        checks, changes, change_weight, hours_weight, qty_vol, price_vol = (
+            row[k] or 0 for k in ('checks', 'changes', 'change_weight', 'hours_weight', 'qty_volatility',
+                                  'price_volatility'))
+        last_changed, last_sold = row['last_changed'], row['last_sold']
+        hours = max(0.0, now - self._last_checked(row)) / 3600.0 if row['last_checked'] is not None else 0.0
+        decay = 0.5 ** (hours / self.half_life_hours)
+        old_qty, new_qty = old.get('qty') or 0, new.get('qty') or 0
+        old_price, new_price = old.get('price') or 0.0, new.get('price') or 0.0
+        changed = old_qty != new_qty or old_price != new_price
+        a = self.smoothing
+        qty_vol = (1 - a) * qty_vol + a * abs(new_qty - old_qty) / max(old_qty, 1)
+        price_vol = (1 - a) * price_vol + a * abs(new_price - old_price) / max(old_price, 0.01)
+        if changed:
+            last_changed = now
+        if new_qty < old_qty:
+            last_sold = now
+        return (ali_id, checks + 1, changes + int(changed), change_weight * decay + int(changed),
+                hours_weight * decay + hours, qty_vol, price_vol, now, last_changed, last_sold)
+
+    def save(self, observed):
+        get_storage().executemany('''
+            INSERT OR REPLACE INTO sku_stats (ali_product_id, checks, changes, change_weight, hours_weight,
+                qty_volatility, price_volatility, last_checked, last_changed, last_sold)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', observed)
+
+# -------------------------- Repricing ------------------------------------
+
+class Repricer:
+    """Prices the whole catalog in one vectorized pass.
+
+    price = (landed * (1 + markup%) + fee_fixed) / (1 - fee%), where
+    landed = supplier cost + shipping. The markup comes from the highest tier
+    whose landed-cost floor is <= landed, unless the category has its own
+    markup. The result is raised to at least `min_profit` over landed cost
+    plus fees, then rounded to cents, or up to the next `price_ending`
+    (e.g. 0.99) when one is set. With the default rules (no tiers, fees or
+    shipping) this is exactly the flat markup_percent formula the listing
+    code has always used.
+    """
+
+    def __init__(self, markup_percent=30.0, tiers=None, category_markup=None, fee_percent=0.0, fee_fixed=0.0,
+                 shipping=0.0, min_profit=0.0, price_ending=None):
+        self.markup_percent = float(markup_percent)
+        tiers = sorted((float(floor), float(markup)) for floor, markup in (tiers or []))
+        if not tiers or tiers[0][0] > 0:
+            tiers.insert(0, (0.0, float(markup_percent)))
+        self.tier_floors = np.array([t[0] for t in tiers])
+        self.tier_markups = np.array([t[1] for t in tiers])
+        self.category_markup = {k: float(v) for k, v in (category_markup or {}).items()}
+        self.fee_percent = float(fee_percent)
+        self.fee_fixed = float(fee_fixed)
+        self.shipping = float(shipping)
+        self.min_profit = float(min_profit)
+        self.price_ending = None if price_ending is None else float(price_ending)
+
+    @classmethod
+    def from_cfg(cls, cfg, markup_percent=None):
+        """Rules from `cfg`; `markup_percent` overrides the configured base markup."""
+        rules = dict(DEFAULTS['app']['repricing'])
+        rules.update(cfg.get('app', {}).get('repricing') or {})
+        if markup_percent is None:
+            markup_percent = cfg.get('markup_percent', cfg.get('app', {}).get('markup_percent', 30.0))
+        return cls(markup_percent=markup_percent, **rules)
+
+    def evaluate(self, cost, category_codes=None, categories=()):
+        """New prices for `cost` (array-like). `category_codes` index into `categories`."""
+        landed = np.asarray(cost, dtype=np.float64) + self.shipping
+        tier = np.searchsorted(self.tier_floors, landed, side='right') - 1
+        markup = self.tier_markups[np.clip(tier, 0, None)]
+        if self.category_markup and category_codes is not None and len(categories):
+            by_code = np.array([self.category_markup.get(c, np.nan) for c in categories])
+            override = by_code[np.asarray(category_codes)]
+            markup = np.where(np.isnan(override), markup, override)
+        keep = 1.0 - self.fee_percent / 100.0
+        price = (landed * (1.0 + markup / 100.0) + self.fee_fixed) / keep
+        if self.min_profit:
+            price = np.maximum(price, (landed + self.min_profit + self.fee_fixed) / keep)
+        if self.price_ending is not None:
+            # nudge off float noise so 12.99 stays 12.99 rather than jumping to 13.99
+            price = np.ceil(np.round(price - self.price_ending, 6)) + self.price_ending
+        return np.round(price, 2)
+
+    def price_for(self, costs, categories):
+        """evaluate() for a handful of products given as parallel lists."""
+        lookup = {}
+        codes = [lookup.setdefault(c or '', len(lookup)) for c in categories]
+        return self.evaluate(costs, codes, list(lookup))
+
+    def plan(self, storage=None):
+        """Reprice every listed product; returns `(checked, changes)` where changes are
+        `(ali_id, offer_id, qty, old_price, new_price)` for SKUs whose price moved by a cent or more."""
+        rows = (storage or get_storage()).query(
+            "SELECT ali_product_id, ebay_item_id, qty, price, cost, COALESCE(category, '') FROM products "
+            "WHERE cost IS NOT NULL")
+        if not rows:
+            return 0, []
+        ids, offers, qty, old, cost, cats = zip(*rows)
+        lookup = {}
+        codes = np.fromiter((lookup.setdefault(c, len(lookup)) for c in cats), dtype=np.int32, count=len(cats))
+        new = self.evaluate(np.array(cost, dtype=np.float64), codes, list(lookup))
+        old_arr = np.array(old, dtype=np.float64)  # None -> nan
+        changed = np.flatnonzero(np.isnan(old_arr) | (np.rint(new * 100) != np.rint(old_arr * 100)))
+        new = new.tolist()
+        return len(rows), [(ids[i], offers[i], qty[i], old[i], new[i]) for i in changed.tolist()]
+
+# -------------------------- Import pipeline ------------------------------
+
+_STOP = object()
+_DUPLICATE = object()
+
+
+class ImportPipeline:
+    """Runs fetch -> normalize -> list as separate stages, each with its own
+    thread pool, connected by bounded queues.
+
+    `run()` yields `(ali_id, offer_id, status)` tuples in input order as soon as
+    each row (and every row before it) has finished. At most `queue_size` rows
+    are in flight at once; beyond that only the outcome per distinct id is
+    kept, so a product listed twice in the input is published once and its
+    later rows repeat the first row's result.
+    """
+
+    def __init__(self, worker, fetch_workers=8, normalize_workers=2, list_workers=4, queue_size=64,
+                 markup_percent=None):
+        self.worker = worker
+        self.fetch_workers = max(1, int(fetch_workers))
+        self.normalize_workers = max(1, int(normalize_workers))
+        self.list_workers = max(1, int(list_workers))
+        self.queue_size = max(1, int(queue_size))
+        if markup_percent is None:
+            markup_percent = worker.cfg.get('markup_percent', 30.0)
+        self.markup_percent = markup_percent
+
+    def run(self, ali_ids):
+        cancel = threading.Event()
+        in_flight = threading.BoundedSemaphore(self.queue_size)
+        fetch_q = queue.Queue(self.queue_size)
+        normalize_q = queue.Queue(self.queue_size)
+        list_q = queue.Queue(self.queue_size)
+        done_q = queue.Queue()
+
+        def put(q, item):
+            while not cancel.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        feed_errors = []
+
+        def feed():
+            count = 0
+            seen = set()
+            try:
+                for ali_id in ali_ids:
+                    while not in_flight.acquire(timeout=0.1):
+                        if cancel.is_set():
+                            return
+                    if ali_id in seen:
+                        done_q.put((count, ali_id, None, _DUPLICATE))
+                    elif not put(fetch_q, (count, ali_id, None)):
+                        return
+                    else:
+                        seen.add(ali_id)
+                    count += 1
+            except Exception as e:
+                logger.exception('Import feed failed after %s rows', count)
+                feed_errors.append(e)
+            finally:
+                fetch_q.put(_STOP)
+                done_q.put((_STOP, count))
+
+        def fetch(ali_ids):
+            return self.worker.ali.fetch_products(ali_ids, raw=True)
+
+        def normalize(_, raw):
+            return self.worker._normalize_ali_product(raw)
+
+        def publish(_, prod):
+            # shares the run of a concurrent import_single of the same product
+            return IMPORT_FLIGHTS.do(self.worker._import_flight(prod.get('id'), self.markup_percent),
+                                     lambda: self.worker._create_ebay_listing(prod, self.markup_percent))
+
+        def stage(name, fn, inq, outq, n, batch=None):
+            # With `batch`, fn takes a list of ali_ids and returns {ali_id: (value, error)};
+            # workers take whatever is already queued, up to `batch` rows, per call.
+            remaining = [n]
+            lock = threading.Lock()
+
+            def close():
+                # Hand the marker on to sibling workers; the last one out
+                # closes the next stage.
+                inq.put(_STOP)
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and outq is not done_q:
+                    outq.put(_STOP)
+
+            def emit(idx, ali_id, value, error):
+                if error is not None:
+                    logger.error('Bulk import %s failed for %s: %s', name, ali_id, error,
+                                 extra={'sku': f'ALI-{ali_id}'})
+                    done_q.put((idx, ali_id, None, str(error)))
+                elif outq is done_q:
+                    done_q.put((idx, ali_id, value, 'ok'))
+                else:
+                    put(outq, (idx, ali_id, value))
+
+            def loop():
+                _LOG_CONTEXT.set({'stage': f'import-{name}'})
+                while True:
+                    item = inq.get()
+                    if item is _STOP:
+                        return close()
+                    if cancel.is_set():
+                        continue
+                    if batch is None:
+                        idx, ali_id, value = item
+                        try:
+                            value = fn(ali_id, value)
+                        except Exception as e:
+                            logger.exception('Bulk import %s failed for %s', name, ali_id,
+                                             extra={'sku': f'ALI-{ali_id}'})
+                            done_q.put((idx, ali_id, None, str(e)))
+                            continue
+                        emit(idx, ali_id, value, None)
+                        continue
+                    items = [item]
+                    stopped = False
+                    while len(items) < batch:
+                        try:
+                            nxt = inq.get_nowait()
+                        except queue.Empty:
+                            break
+                        if nxt is _STOP:
+                            stopped = True
+                            break
+                        items.append(nxt)
+                    try:
+                        results = fn([ali_id for _, ali_id, _ in items])
+                    except Exception as e:
+                        logger.exception('Bulk import %s failed for %s rows', name, len(items))
+                        results = {ali_id: (None, e) for _, ali_id, _ in items}
+                    for idx, ali_id, _ in items:
+                        emit(idx, ali_id, *results[ali_id])
+                    if stopped:
+                        return close()
+
+            for i in range(n):
+                threading.Thread(target=loop, name=f'import-{name}-{i}', daemon=True).start()
+
+        stage('fetch', fetch, fetch_q, normalize_q, self.fetch_workers, batch=ALI_PRODUCT_BATCH_MAX)
+        stage('normalize', normalize, normalize_q, list_q, self.normalize_workers)
+        stage('list', publish, list_q, done_q, self.list_workers)
+        feeder = threading.Thread(target=feed, name='import-feed', daemon=True)
+        feeder.start()
+
+        pending = {}
+        outcomes = {}  # ali_id -> (offer_id, status) of its first row
+        next_idx = 0
+        total = None
+        try:
+            while total is None or next_idx < total:
+                item = done_q.get()
+                if item[0] is _STOP:
+                    total = item[1]
+                    continue
+                idx, ali_id, offer_id, status = item
+                pending[idx] = (ali_id, offer_id, status)
+                while next_idx in pending:
+                    ali_id, offer_id, status = pending.pop(next_idx)
+                    if status is _DUPLICATE:
+                        offer_id, status = outcomes[ali_id]
+                    else:
+                        outcomes[ali_id] = (offer_id, status)
+                    yield ali_id, offer_id, status
+                    next_idx += 1
+                    in_flight.release()
+        finally:
+            cancel.set()
+            # the caller may close `ali_ids` (e.g. the CSV file) as soon as we return
+            feeder.join()
+        if feed_errors:
+            raise feed_errors[0]
+
 # -------------------------- Analytics ------------------------------------
 
 class Analytics:
+    """Dashboard numbers read from product_aggregates, which the products
+    triggers keep current, so reads cost the same for any catalog size."""
+
     def __init__(self):
         pass
 
+    @staticmethod
+    def _summary(row):
+        if not row:
+            return {'count': 0, 'total_value': 0.0, 'total_qty': 0}
+        return {'count': row[0], 'total_value': round(row[1], 2), 'total_qty': row[2]}
+
     def dashboard_summary(self):
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('SELECT COUNT(*), SUM(price), SUM(qty) FROM products')
-        row = c.fetchone()
-        conn.close()
-        return {'count': row[0] or 0, 'total_value': row[1] or 0.0, 'total_qty': row[2] or 0}
+        row = get_storage().query_one('SELECT count, total_value, total_qty FROM product_aggregates '
+                                      'WHERE marketplace=? AND category=?', (AGG_ALL, AGG_ALL))
+        return self._summary(row)
+
+    def breakdown(self, by='marketplace'):
+        """{marketplace or category: summary} for every group that still has products."""
+        if by == 'marketplace':
+            sql = ('SELECT marketplace, count, total_value, total_qty FROM product_aggregates '
+                   'WHERE category=? AND marketplace<>? AND count>0')
+        elif by == 'category':
+            sql = ('SELECT category, count, total_value, total_qty FROM product_aggregates '
+                   'WHERE marketplace=? AND category<>? AND count>0')
+        else:
+            raise ValueError(f'Unknown breakdown: {by}')
+        return {r[0]: self._summary(r[1:]) for r in get_storage().query(sql, (AGG_ALL, AGG_ALL))}
+
+# -------------------------- Price/stock history --------------------------
+
+class HistoryStore:
+    """Append-only per-SKU price/cost/quantity/sales history.
+
+    A row is written only when a SKU's listing price, supplier cost or
+    quantity differs from its previous row. Rows are persisted in
+    `price_history` (WITHOUT ROWID, integer cents and epoch seconds, about
+    20 bytes per change on disk). Writes only compare against each SKU's
+    latest row, looked up by primary key the first time the SKU is seen.
+    Queries run over an in-memory columnar copy sorted by (sku, ts) and are
+    NumPy-vectorized, so a dashboard query over 100k SKUs x a year is a
+    handful of array passes. That copy is only built by the first query, so
+    a process that just imports and syncs never holds the history in memory.
+
+    `sold` is the quantity decrease since the previous row. Supplier stock
+    stands in for sales the same way SyncPrioritizer already treats it.
+    """
+
+    COLUMNS = ('sku', 'ts', 'price', 'cost', 'qty', 'sold')
+    LAST_LOOKUP_CHUNK = 500
+    # rows appended after the columns were built; past this the copy is dropped and reloaded on the next query
+    PENDING_MAX = 100000
+    DTYPES = {'sku': np.int32, 'ts': np.int64, 'price': np.int32, 'cost': np.int32, 'qty': np.int32,
+              'sold': np.int32}
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        # drop the in-memory copy; the next call reloads it from the database
+        self._cols = None
+        self._pending = []
+        self._last = {}  # sku_id -> (price_cents, cost_cents, qty) of its latest row, None if it has none
+        self._skus_loaded = False
+        self._sku_ids = {}
+        self._categories = ['']
+        self._category_ids = {'': 0}
+        self._sku_category = np.zeros(1, dtype=np.int32)
+
+    @property
+    def db(self):
+        return get_storage(self.path)
+
+    # ---- writes -------------------------------------------------------
+
+    def _load_skus(self):
+        if self._skus_loaded:
+            return
+        for sku_id, ali_id, category in self.db.query('SELECT id, ali_product_id, category FROM history_skus'):
+            self._sku_ids[ali_id] = sku_id
+            self._set_category(sku_id, category)
+        self._skus_loaded = True
+
+    def _load(self):
+        # query path only: the full columnar copy
+        self._load_skus()
+        if self._cols is not None:
+            return
+        rows = self.db.query('SELECT sku_id, ts, price_cents, cost_cents, qty, sold FROM price_history '
+                             'ORDER BY sku_id, ts')
+        data = np.array(rows, dtype=np.int64).reshape(-1, len(self.COLUMNS))
+        self._cols = {name: data[:, i].astype(self.DTYPES[name]) for i, name in enumerate(self.COLUMNS)}
+        self._pending = []
+
+    def _fetch_last(self, conn, sku_ids):
+        for i in range(0, len(sku_ids), self.LAST_LOOKUP_CHUNK):
+            chunk = sku_ids[i:i + self.LAST_LOOKUP_CHUNK]
+            marks = ','.join('?' * len(chunk))
+            for sku_id, price, cost, qty in conn.execute(
+                    'SELECT h.sku_id, h.price_cents, h.cost_cents, h.qty FROM price_history h '
+                    f'JOIN (SELECT sku_id, MAX(ts) AS ts FROM price_history WHERE sku_id IN ({marks}) '
+                    'GROUP BY sku_id) latest ON latest.sku_id = h.sku_id AND latest.ts = h.ts', chunk):
+                self._last[sku_id] = (price, cost, qty)
+
+    def _set_category(self, sku_id, category):
+        category = category or ''
+        cat = self._category_ids.get(category)
+        if cat is None:
+            cat = self._category_ids[category] = len(self._categories)
+            self._categories.append(category)
+        if sku_id >= len(self._sku_category):
+            grown = np.zeros(max(sku_id + 1, 2 * len(self._sku_category)), dtype=np.int32)
+            grown[:len(self._sku_category)] = self._sku_category
+            self._sku_category = grown
+        self._sku_category[sku_id] = cat
+
+    def record(self, snapshots, ts=None):
+        """Append `(ali_id, price, cost, qty, category)` snapshots that changed; returns rows written."""
+        ts = int(ts if ts is not None else time.time())
+        with self._lock:
+            self._load_skus()
+            rows = []
+            try:
+                self._write(snapshots, ts, rows)
+            except BaseException:
+                self._reset()
+                raise
+            if self._cols is not None:
+                self._pending.extend(rows)
+                if len(self._pending) > self.PENDING_MAX:
+                    self._cols = None
+                    self._pending = []
+            return len(rows)
+
+    def _write(self, snapshots, ts, rows):
+        with self.db.transaction() as conn:
+            batch = []
+            for ali_id, price, cost, qty, category in snapshots:
+                ali_id = str(ali_id)
+                sku_id = self._sku_ids.get(ali_id)
+                if sku_id is None:
+                    sku_id = conn.execute('INSERT INTO history_skus (ali_product_id, category) '
+                                          'VALUES (?, ?)', (ali_id, category)).lastrowid
+                    self._sku_ids[ali_id] = sku_id
+                    self._set_category(sku_id, category)
+                    self._last[sku_id] = None
+                elif category and self._categories[self._sku_category[sku_id]] != category:
+                    conn.execute('UPDATE history_skus SET category=? WHERE id=?', (category, sku_id))
+                    self._set_category(sku_id, category)
+                batch.append((sku_id, (int(round((price or 0) * 100)), int(round((cost or 0) * 100)), int(qty or 0))))
+            unseen = list({sku_id for sku_id, _ in batch if sku_id not in self._last})
+            self._fetch_last(conn, unseen)
+            for sku_id, value in batch:
+                prev = self._last.get(sku_id)
+                if prev == value:
+                    continue
+                sold = max(0, prev[2] - value[2]) if prev else 0
+                self._last[sku_id] = value
+                rows.append((sku_id, ts) + value + (sold,))
+            if rows:
+                conn.executemany('INSERT OR REPLACE INTO price_history (sku_id, ts, price_cents, cost_cents, '
+                                 'qty, sold) VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def _frame(self):
+        # merge pending appends into the sorted columns; last write wins for a repeated (sku, ts)
+        with self._lock:
+            self._load()
+            if self._pending:
+                new = np.array(self._pending, dtype=np.int64)
+                self._pending = []
+                cols = {name: np.concatenate([self._cols[name], new[:, i].astype(self.DTYPES[name])])
+                        for i, name in enumerate(self.COLUMNS)}
+                order = np.lexsort((np.arange(len(cols['ts'])), cols['ts'], cols['sku']))
+                cols = {name: arr[order] for name, arr in cols.items()}
+                keep = np.r_[(cols['sku'][1:] != cols['sku'][:-1]) | (cols['ts'][1:] != cols['ts'][:-1]), True]
+                self._cols = {name: arr[keep] for name, arr in cols.items()}
+            return self._cols, self._sku_category, list(self._categories)
+
+    # ---- queries ------------------------------------------------------
+
+    @staticmethod
+    def _buckets(start, end, step):
+        end = int(end if end is not None else time.time())
+        step = int(step)
+        n = max(1, -(-(end - int(start)) // step))
+        return np.arange(n, dtype=np.int64) * step + int(start), n
+
+    def resample(self, field='qty', step=86400, start=None, end=None, by=None, skus=None):
+        """Value of `field` at the end of each `step`-second bucket (forward-filled).
+
+        Returns `(bucket_starts, values)`. `values` is the catalog total (1-D) by
+        default, one row per category with by='category' (plus the category
+        names), or one row per entry of `skus` (NaN before a SKU's first row).
+        Money fields come back in currency units, not cents.
+        """
+        cols, sku_cat, categories = self._frame()
+        if start is None:
+            start = int(cols['ts'].min()) if len(cols['ts']) else int(time.time())
+        edges, n = self._buckets(start, end, step)
+        ends = edges + int(step)
+        vals = cols[field].astype(np.float64)
+        scale = 100.0 if field in ('price', 'cost') else 1.0
+        if skus is not None:
+            if not len(vals):
+                return edges, np.full((len(skus), n), np.nan)
+            key = (cols['sku'].astype(np.int64) << 32) | cols['ts']
+            ids = np.array([self._sku_ids.get(str(s), -1) for s in skus], dtype=np.int64)
+            probe = (ids[:, None] << 32) | (ends[None, :] - 1)
+            pos = np.searchsorted(key, probe, side='right') - 1
+            ok = (pos >= 0) & (cols['sku'][np.clip(pos, 0, None)] == ids[:, None])
+            out = np.where(ok, vals[np.clip(pos, 0, None)], np.nan)
+            return edges, out / scale
+        # totals move by each row's change relative to the SKU's previous row
+        first = np.r_[True, cols['sku'][1:] != cols['sku'][:-1]] if len(vals) else np.zeros(0, bool)
+        delta = vals - np.where(first, 0.0, np.r_[0.0, vals[:-1]])
+        live = cols['ts'] < ends[-1]
+        b = np.clip((cols['ts'][live] - edges[0]) // int(step), 0, None)
+        if by == 'category':
+            cat = sku_cat[cols['sku'][live]]
+            grid = np.bincount(cat * n + b, weights=delta[live], minlength=len(categories) * n)
+            return edges, np.cumsum(grid.reshape(len(categories), n), axis=1) / scale, categories
+        return edges, np.cumsum(np.bincount(b, weights=delta[live], minlength=n)) / scale
+
+    def sales(self, step=86400, start=None, end=None, by=None):
+        """Units sold per bucket: `(bucket_starts, sold)`, per category with by='category'."""
+        cols, sku_cat, categories = self._frame()
+        if start is None:
+            start = int(cols['ts'].min()) if len(cols['ts']) else int(time.time())
+        edges, n = self._buckets(start, end, step)
+        live = (cols['ts'] >= edges[0]) & (cols['ts'] < edges[-1] + int(step))
+        b = (cols['ts'][live] - edges[0]) // int(step)
+        sold = cols['sold'][live].astype(np.float64)
+        if by == 'category':
+            cat = sku_cat[cols['sku'][live]]
+            grid = np.bincount(cat * n + b, weights=sold, minlength=len(categories) * n)
+            return edges, grid.reshape(len(categories), n), categories
+        return edges, np.bincount(b, weights=sold, minlength=n)
+
+    def sell_through(self, window=30, step=86400, start=None, end=None, by=None):
+        """Rolling sell-through per bucket: units sold over the last `window`
+        buckets / (those units + stock on hand at the bucket end). NaN where
+        there was nothing to sell."""
+        end = int(end if end is not None else time.time())
+        if start is None:
+            start = end - 30 * int(step)
+        lead = (int(window) - 1) * int(step)
+        sold_out = self.sales(step, start - lead, end, by=by)
+        stock_out = self.resample('qty', step, start, end, by=by)
+        sold, stock = sold_out[1], stock_out[1]
+        cs = np.concatenate([np.zeros(sold.shape[:-1] + (1,)), np.cumsum(sold, axis=-1)], axis=-1)
+        rolled = cs[..., int(window):] - cs[..., :-int(window)]
+        rolled = rolled[..., :stock.shape[-1]]
+        denom = rolled + stock
+        rate = np.divide(rolled, denom, out=np.full(denom.shape, np.nan), where=denom > 0)
+        if by == 'category':
+            return stock_out[0], rate, stock_out[2]
+        return stock_out[0], rate
+
+    def margin_by_category(self, at=None):
+        """{category: {'skus', 'margin', 'avg_margin', 'margin_pct'}} from each SKU's latest row at `at`."""
+        cols, sku_cat, categories = self._frame()
+        mask = cols['ts'] <= int(at if at is not None else time.time())
+        sku = cols['sku'][mask]
+        if not len(sku):
+            return {}
+        last = np.flatnonzero(np.r_[sku[1:] != sku[:-1], True])
+        price = cols['price'][mask][last].astype(np.float64) / 100.0
+        cost = cols['cost'][mask][last].astype(np.float64) / 100.0
+        cat = sku_cat[sku[last]]
+        k = len(categories)
+        count = np.bincount(cat, minlength=k)
+        margin = np.bincount(cat, weights=price - cost, minlength=k)
+        revenue = np.bincount(cat, weights=price, minlength=k)
+        out = {}
+        for i in np.flatnonzero(count):
+            out[categories[i]] = {
+                'skus': int(count[i]),
+                'margin': round(float(margin[i]), 2),
+                'avg_margin': round(float(margin[i] / count[i]), 2),
+                'margin_pct': round(float(100.0 * margin[i] / revenue[i]), 2) if revenue[i] else None,
+            }
+        return out
+
+
+_HISTORY_STORES = {}
+
+
+def get_history_store(path=None):
+    """Shared HistoryStore for `path` (defaults to DB_FILE)."""
+    path = path or DB_FILE
+    with _STORAGES_LOCK:
+        store = _HISTORY_STORES.get(path)
+        if store is None:
+            store = _HISTORY_STORES[path] = HistoryStore(path)
+        return store
 
 # -------------------------- Image helpers --------------------------------
 
-def watermark_image_unique(image_url, sku):
-    try:
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        img = Image.open(BytesIO(response.content)).convert('RGB')
-        draw = ImageDraw.Draw(img)
-        font = ImageFont.load_default()
-        draw.text((10, 10), '© Circle Group', fill='white', font=font)
-        out = f'watermarked_{sku}_{int(time.time())}.jpg'
-        img.save(out)
-        logger.info('Saved watermark %s', out)
-        return out
-    except Exception as e:
-        logger.warning('Watermark failed: %s', e)
+WATERMARK_TEXT = '© Circle Group'
+IMAGE_CACHE_DIR = os.path.join(APP_DIR, 'image_cache')
+
+_WATERMARK_FONT = None
+
+
+def render_watermark(data: bytes, text=WATERMARK_TEXT, max_side=1600, quality=85) -> bytes:
+    """Decode, downscale to `max_side`, stamp `text` and re-encode as JPEG.
+
+    Module-level so it can run in a process pool. JPEG sources are decoded
+    with draft() at the nearest scale >= the target, which skips most of the
+    IDCT work for large supplier photos.
+    """
+    global _WATERMARK_FONT
+    if _WATERMARK_FONT is None:
+        _WATERMARK_FONT = ImageFont.load_default()
+    img = Image.open(BytesIO(data))
+    img.draft('RGB', (max_side, max_side))
+    img = img.convert('RGB')
+    img.thumbnail((max_side, max_side))
+    ImageDraw.Draw(img).text((10, 10), text, fill='white', font=_WATERMARK_FONT)
+    out = BytesIO()
+    img.save(out, 'JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+
+class ImageCache:
+    """Content-addressed JPEG cache on disk, bounded by total size.
+
+    Files are named by key and sharded by its first two characters. Reads
+    bump the mtime, and eviction removes the least recently used files until
+    the cache is back under `max_bytes`.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.jpg')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.jpg'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._files())
+
+    def _evict(self):
+        # evict down to 90% so we don't walk the directory on every put
+        target = self.max_bytes * 0.9
+        files = sorted(self._files())
+        size = sum(f[1] for f in files)
+        for _, fsize, path in files:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                size -= fsize
+            except OSError:
+                pass
+        self._size = size
+
+
+class ProcessedImage:
+    """Result for one source URL: watermarked JPEG bytes, or None to fall back to `source_url`."""
+
+    __slots__ = ('source_url', 'data', 'key', 'cached', 'error')
+
+    def __init__(self, source_url, data=None, key=None, cached=False, error=None):
+        self.source_url = source_url
+        self.data = data
+        self.key = key
+        self.cached = cached
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.data is not None
+
+
+class ImagePipeline:
+    """Watermarks batches of supplier images.
+
+    Downloads run on a thread pool and decode/resize/watermark on a process
+    pool (`process_workers=0` keeps it in-thread). Output is cached under
+    sha256(source bytes + watermark parameters), so relisting the same photo
+    is a cache hit. Any failure yields a result without data, and the caller
+    falls back to the source URL. If a worker process dies, the pool is
+    dropped (the next batch starts a fresh one) and the batch's remaining
+    renders run in-thread.
+    """
+
+    def __init__(self, cache=None, download_workers=8, process_workers=None, max_side=1600, quality=85,
+                 text=WATERMARK_TEXT, timeout=10):
+        self.cache = cache or ImageCache()
+        self.download_workers = max(1, int(download_workers))
+        self.process_workers = (os.cpu_count() or 1) if process_workers is None else int(process_workers)
+        self.params = {'text': text, 'max_side': int(max_side), 'quality': int(quality)}
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.download_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._downloads = ThreadPoolExecutor(self.download_workers, thread_name_prefix='image-dl')
+        self._processes = None
+        self._lock = threading.Lock()
+        self._params_tag = json.dumps(self.params, sort_keys=True).encode('utf-8')
+
+    def cache_key(self, data: bytes):
+        return hashlib.sha256(data + b'\0' + self._params_tag).hexdigest()
+
+    def _pool(self):
+        with self._lock:
+            if self._processes is None and self.process_workers > 0:
+                self._processes = ProcessPoolExecutor(self.process_workers)
+            return self._processes
+
+    def _download(self, url):
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.content
+
+    def process(self, urls):
+        """Watermark every URL; returns ProcessedImage results in input order."""
+        urls = list(urls)
+        results = [None] * len(urls)
+        downloads = {self._downloads.submit(self._download, url): i for i, url in enumerate(urls)}
+        renders = {}
+        pool = self._pool()
+        for fut in as_completed(downloads):
+            i = downloads[fut]
+            url = urls[i]
+            try:
+                data = fut.result()
+            except Exception as e:
+                logger.warning('Image download failed for %s: %s', url, e)
+                results[i] = ProcessedImage(url, error=e)
+                continue
+            key = self.cache_key(data)
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[i] = ProcessedImage(url, cached, key, cached=True)
+            else:
+                if pool is not None:
+                    try:
+                        renders[pool.submit(render_watermark, data, **self.params)] = (i, key, data)
+                        continue
+                    except BrokenProcessPool:
+                        self._drop_pool(pool)
+                        pool = None
+                results[i] = self._finish(url, key, lambda: render_watermark(data, **self.params))
+        for fut, (i, key, data) in renders.items():
+            results[i] = self._finish(urls[i], key, lambda: self._collect(fut, data))
+        return results
+
+    def _collect(self, fut, data):
+        try:
+            return fut.result()
+        except BrokenProcessPool:
+            self._drop_pool(self._processes)
+            return render_watermark(data, **self.params)
+
+    def _drop_pool(self, pool):
+        with self._lock:
+            if pool is None or self._processes is not pool:
+                return
+            self._processes = None
+        logger.warning('Image process pool broke; rendering in-thread until the next batch')
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, url, key, render):
+        try:
+            out = render()
+        except Exception as e:
+            logger.warning('Watermark failed for %s: %s', url, e)
+            return ProcessedImage(url, key=key, error=e)
+        try:
+            self.cache.put(key, out)
+        except OSError as e:
+            logger.warning('Image cache write failed for %s: %s', url, e)
+        return ProcessedImage(url, out, key)
+
+    def close(self):
+        self._downloads.shutdown(wait=False)
+        with self._lock:
+            if self._processes is not None:
+                self._processes.shutdown(wait=False, cancel_futures=True)
+                self._processes = None
+        self.session.close()
+
+
+_IMAGE_PIPELINE = None
+_IMAGE_PIPELINE_LOCK = threading.Lock()
+
+
+def get_image_pipeline(settings=None):
+    """Shared ImagePipeline built on first use from `settings` (the `app` config
+    section; read from the current config when omitted).
+
+    image_process_workers: 0 renders in-thread, None one process per CPU.
+    """
+    global _IMAGE_PIPELINE
+    with _IMAGE_PIPELINE_LOCK:
+        if _IMAGE_PIPELINE is None:
+            if settings is None:
+                settings = config_snapshot().get('app') or {}
+            settings = {**DEFAULTS['app'], **settings}
+            _IMAGE_PIPELINE = ImagePipeline(
+                ImageCache(max_bytes=int(settings['image_cache_max_mb']) * 1024 * 1024),
+                download_workers=settings['image_download_workers'],
+                process_workers=settings['image_process_workers'])
+        return _IMAGE_PIPELINE
+
+
+def watermark_image_unique(image_url, sku, settings=None):
+    """Watermark one image; returns the cached JPEG path, or `image_url` on failure."""
+    pipeline = get_image_pipeline(settings)
+    result = pipeline.process([image_url])[0]
+    if not result.ok:
         return image_url
+    logger.info('Watermarked image for %s: %s', sku, result.key)
+    return pipeline.cache.path(result.key)
+
+# -------------------------- Log tailing ----------------------------------
+
+class LogTailer:
+    """Follows a log file by byte offset, returning only lines appended since
+    the last poll.
+
+    Truncation (file shorter than our offset) and rotation (a different file
+    now at `path`) restart from the top of the new file. A backlog larger than
+    `max_backlog` bytes is skipped down to its tail rather than read, and the
+    last `max_lines` complete lines are kept in `lines`.
+    """
+
+    def __init__(self, path, max_lines=2000, max_backlog=256 * 1024):
+        self.path = path
+        self.max_backlog = max_backlog
+        self.lines = deque(maxlen=max_lines)
+        self._offset = 0
+        self._identity = None
+        self._partial = b''
+
+    def poll(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        identity = (st.st_dev, st.st_ino)
+        if identity != self._identity or st.st_size < self._offset:
+            self._identity = identity
+            self._offset = 0
+            self._partial = b''
+        if st.st_size == self._offset:
+            return []
+        start = self._offset
+        skip_partial = False
+        if st.st_size - start > self.max_backlog:
+            start = st.st_size - self.max_backlog
+            self._partial = b''
+            skip_partial = start > 0
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(st.st_size - start)
+        self._offset = start + len(data)
+        data = self._partial + data
+        if skip_partial:
+            # we landed mid-line; drop the fragment
+            data = data[data.find(b'\n') + 1:] if b'\n' in data else b''
+        complete, sep, self._partial = data.rpartition(b'\n')
+        if not sep:
+            return []
+        new = [ln + '\n' for ln in complete.decode('utf-8', errors='replace').split('\n')]
+        self.lines.extend(new)
+        return new
+
+# -------------------------- Log search index -----------------------------
+
+_LOG_LINE_RE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) ([A-Z]+) ')
+_LOG_ID_RE = re.compile(r'\b(?:ALI-(\d+)|SIM-OFFER-\d+|\d{8,})\b')
+
+
+def extract_log_ids(text):
+    """SKUs, offer ids and bare product ids mentioned in a log line.
+
+    `ALI-<n>` SKUs are also keyed by the bare AliExpress id so either form finds them.
+    """
+    ids = set()
+    for m in _LOG_ID_RE.finditer(text):
+        ids.add(m.group(0).upper())
+        if m.group(1):
+            ids.add(m.group(1))
+    return ids
+
+
+class LogIndex:
+    """SQLite index over the log file for the Logs tab search.
+
+    `refresh()` indexes only the bytes appended since the last call (offset and
+    file identity are persisted, so a restart picks up where it left off; a
+    rotated or truncated log is indexed from the top while older entries stay
+    searchable). On rotation, entries older than the oldest rotated file still
+    on disk are pruned, so the index is bounded like the logs themselves
+    (`log_backup_count`). Text search goes through an FTS5 trigram table, which keeps
+    the old case-insensitive substring semantics; a query that is exactly a
+    SKU/offer id uses the `log_ids` table instead. Results are newest first and
+    paged by entry id.
+    """
+
+    CHUNK_BYTES = 1 << 20
+
+    def __init__(self, db_path, log_path):
+        self.db_path = db_path
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._ready = False
+
+    @property
+    def db(self):
+        return get_storage(self.db_path)
+
+    def _ensure_schema(self):
+        if self._ready:
+            return
+        with self.db.transaction() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS log_entries (
+                    id INTEGER PRIMARY KEY,
+                    ts TEXT,
+                    level TEXT,
+                    line TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_log_entries_ts ON log_entries(ts)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_log_entries_level_ts ON log_entries(level, ts)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS log_ids (
+                    ident TEXT,
+                    entry_id INTEGER,
+                    PRIMARY KEY (ident, entry_id)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS log_fts USING fts5("
+                         "line, content='log_entries', content_rowid='id', tokenize='trigram')")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS log_index_state (
+                    path TEXT PRIMARY KEY,
+                    dev INTEGER,
+                    ino INTEGER,
+                    offset INTEGER
+                )
+            ''')
+        self._ready = True
+
+    def refresh(self):
+        """Index whatever was appended to the log since the last refresh; returns the number of new entries."""
+        with self._lock:
+            self._ensure_schema()
+            try:
+                st = os.stat(self.log_path)
+            except FileNotFoundError:
+                return 0
+            path = os.path.abspath(self.log_path)
+            row = self.db.query_one('SELECT dev, ino, offset FROM log_index_state WHERE path=?', (path,))
+            offset = 0
+            if row and (row[0], row[1]) == (st.st_dev, st.st_ino) and row[2] <= st.st_size:
+                offset = row[2]
+            elif row:
+                self._prune()
+            last = self.db.query_one('SELECT ts, level FROM log_entries ORDER BY id DESC LIMIT 1')
+            ts, level = last if last else (None, None)
+            added = 0
+            with open(self.log_path, 'rb') as f:
+                f.seek(offset)
+                while True:
+                    data = f.read(self.CHUNK_BYTES)
+                    cut = data.rfind(b'\n') + 1
+                    if not cut:
+                        if len(data) < self.CHUNK_BYTES:
+                            break  # only a partial line so far
+                        cut = len(data)  # a single line longer than a chunk: index it in pieces
+                    offset += cut
+                    f.seek(offset)
+                    entries = []
+                    for line in data[:cut].decode('utf-8', errors='replace').splitlines():
+                        if line.startswith('{'):
+                            parsed = self._parse_json_line(line)
+                            if parsed:
+                                entries.append(parsed)
+                                ts, level = parsed[0], parsed[1]
+                                continue
+                        m = _LOG_LINE_RE.match(line)
+                        if m:
+                            ts, level = m.group(1), m.group(2)
+                        # continuation lines (tracebacks) inherit the previous header
+                        entries.append((ts, level, line))
+                    self._insert(entries, path, st, offset)
+                    added += len(entries)
+            return added
+
+    def prune(self):
+        """Drop entries older than the oldest log file still on disk; returns how many."""
+        with self._lock:
+            self._ensure_schema()
+            return self._prune()
+
+    def _prune(self):
+        cutoff = self._oldest_retained_ts()
+        if cutoff is None:
+            return 0
+        last_id = self.db.query_one('SELECT MAX(id) FROM log_entries WHERE ts < ?', (cutoff,))[0]
+        if last_id is None:
+            return 0
+        # ids grow with time, so this also takes the untimestamped lines that came before
+        with self.db.transaction() as conn:
+            conn.execute("INSERT INTO log_fts (log_fts, rowid, line) "
+                         "SELECT 'delete', id, line FROM log_entries WHERE id <= ?", (last_id,))
+            conn.execute('DELETE FROM log_ids WHERE entry_id <= ?', (last_id,))
+            removed = conn.execute('DELETE FROM log_entries WHERE id <= ?', (last_id,)).rowcount
+        logger.info('Log index: pruned %s entries older than %s', removed, cutoff)
+        return removed
+
+    def _oldest_retained_ts(self):
+        # rotated files are <log>.1[.gz] (newest) ... <log>.N[.gz]; the highest N still on disk is the oldest
+        directory, base = os.path.split(os.path.abspath(self.log_path))
+        pattern = re.compile(re.escape(base) + r'\.(\d+)(?:\.gz)?$')
+        backups = []
+        for name in os.listdir(directory):
+            m = pattern.match(name)
+            if m:
+                backups.append((int(m.group(1)), name))
+        path = os.path.join(directory, max(backups)[1]) if backups else self.log_path
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+                for line in itertools.islice(f, 1000):
+                    line = line.rstrip('\n')
+                    parsed = self._parse_json_line(line) if line.startswith('{') else None
+                    if parsed:
+                        return parsed[0]
+                    m = _LOG_LINE_RE.match(line)
+                    if m:
+                        return m.group(1)
+        except (OSError, EOFError):
+            pass
+        return None
+
+    @staticmethod
+    def _parse_json_line(line):
+        # records written with log_format=json; index them in the text layout
+        try:
+            rec = json.loads(line)
+            text = f"{rec['ts']} {rec['level']} {rec['msg']}"
+        except (ValueError, KeyError, TypeError):
+            return None
+        for name in ('sku', 'stage'):
+            if rec.get(name):
+                text += f' {name}={rec[name]}'
+        if rec.get('exc'):
+            text += '\n' + rec['exc']
+        return rec['ts'], rec['level'], text
+
+    def _insert(self, entries, path, st, offset):
+        with self.db.transaction() as conn:
+            for ts, level, line in entries:
+                entry_id = conn.execute('INSERT INTO log_entries (ts, level, line) VALUES (?, ?, ?)',
+                                        (ts, level, line)).lastrowid
+                conn.execute('INSERT INTO log_fts (rowid, line) VALUES (?, ?)', (entry_id, line))
+                ids = extract_log_ids(line)
+                if ids:
+                    conn.executemany('INSERT OR IGNORE INTO log_ids (ident, entry_id) VALUES (?, ?)',
+                                     [(i, entry_id) for i in ids])
+            conn.execute('INSERT OR REPLACE INTO log_index_state (path, dev, ino, offset) VALUES (?, ?, ?, ?)',
+                         (path, st.st_dev, st.st_ino, offset))
+
+    @staticmethod
+    def _ts(value):
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return value
+
+    def search(self, query='', levels=None, since=None, until=None, before=None, limit=200):
+        """Return `(rows, cursor)`: up to `limit` `(id, ts, level, line)` rows, newest first.
+
+        `levels` filters by level name; `since`/`until` (datetime or log-format
+        string, `until` exclusive) by timestamp. Pass the returned cursor as
+        `before` to fetch the next, older page; it is None on the last page.
+        """
+        self._ensure_schema()
+        query = (query or '').strip()
+        where, params = [], []
+        if not query:
+            source = 'log_entries e'
+        elif _LOG_ID_RE.fullmatch(query.upper()):
+            source = 'log_ids k JOIN log_entries e ON e.id = k.entry_id'
+            where.append('k.ident = ?')
+            params.append(query.upper())
+        elif len(query) >= 3:
+            source = 'log_fts JOIN log_entries e ON e.id = log_fts.rowid'
+            where.append('log_fts MATCH ?')
+            params.append('"' + query.replace('"', '""') + '"')
+        else:
+            # too short for trigrams
+            source = 'log_entries e'
+            where.append("e.line LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([\\%_])', r'\\\1', query) + '%')
+        if levels:
+            levels = [levels] if isinstance(levels, str) else list(levels)
+            where.append(f"e.level IN ({','.join('?' * len(levels))})")
+            params.extend(lv.upper() for lv in levels)
+        if since:
+            where.append('e.ts >= ?')
+            params.append(self._ts(since))
+        if until:
+            where.append('e.ts < ?')
+            params.append(self._ts(until))
+        if before is not None:
+            where.append('e.id < ?')
+            params.append(before)
+        sql = f'SELECT e.id, e.ts, e.level, e.line FROM {source}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY e.id DESC LIMIT ?'
+        rows = self.db.query(sql, params + [limit + 1])
+        cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return rows[:limit], cursor
+
+
+LOG_INDEX = LogIndex(LOG_INDEX_FILE, LOG_FILE)
 
 # -------------------------- GUI (Tkinter) --------------------------------
 
 class AppGUI(tk.Tk):
+    LOGBOX_MAX_LINES = 2000
+    LOG_SEARCH_PAGE = 500
+
     def __init__(self, cfg):
         super().__init__()
         self.cfg = cfg
@@ -520,6 +3306,9 @@ class AppGUI(tk.Tk):
         self.analytics = Analytics()
         self.title('Dropship Automator - Clean Full')
         self.geometry('900x650')
+        self.log_tailer = LogTailer(LOG_FILE, max_lines=self.LOGBOX_MAX_LINES)
+        self._log_search = None
+        self._log_indexing = threading.Lock()
         self._build()
         self._poll_logs()
 
@@ -549,6 +3338,7 @@ class AppGUI(tk.Tk):
         self.title_entry.grid(column=1, row=1, sticky='w')
         ttk.Button(imp, text='Import Single', command=self.import_single).grid(column=1, row=2, sticky='w', pady=8)
         ttk.Button(imp, text='Import CSV', command=self.import_csv).grid(column=1, row=2, sticky='e', pady=8)
+        ttk.Button(imp, text='Update Categories', command=self.update_categories).grid(column=1, row=3, sticky='w')
 
         # Sync
         sync = ttk.Frame(notebook)
@@ -556,6 +3346,7 @@ class AppGUI(tk.Tk):
         ttk.Button(sync, text='Sync Now', command=self.sync_now).grid(column=0, row=0, padx=8, pady=8)
         self.auto_sync_btn = ttk.Button(sync, text='Start Auto-Sync', command=self.toggle_auto_sync)
         self.auto_sync_btn.grid(column=1, row=0, padx=8, pady=8)
+        ttk.Button(sync, text='Reprice Catalog', command=self.reprice_now).grid(column=2, row=0, padx=8, pady=8)
 
         ttk.Label(sync, text='Synced products (DB):').grid(column=0, row=1, sticky='w', padx=8, pady=8)
         self.synced_list = tk.Listbox(sync, height=8)
@@ -579,7 +3370,18 @@ class AppGUI(tk.Tk):
         frame.pack(fill='x', padx=8)
         self.search_entry = ttk.Entry(frame, width=40)
         self.search_entry.pack(side='left')
+        self.search_level_var = tk.StringVar(value='ALL')
+        ttk.Combobox(frame, textvariable=self.search_level_var, width=9, state='readonly',
+                     values=('ALL', 'DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')).pack(side='left', padx=4)
+        ttk.Label(frame, text='From:').pack(side='left')
+        self.search_since_entry = ttk.Entry(frame, width=16)
+        self.search_since_entry.pack(side='left')
+        ttk.Label(frame, text='To:').pack(side='left')
+        self.search_until_entry = ttk.Entry(frame, width=16)
+        self.search_until_entry.pack(side='left')
         ttk.Button(frame, text='Search Logs', command=self.search_logs).pack(side='left', padx=6)
+        ttk.Button(frame, text='Older', command=self.search_logs_older).pack(side='left')
+        ttk.Button(frame, text='Newer', command=self.search_logs_newer).pack(side='left', padx=4)
 
     # GUI actions
     def save_cfg(self):
@@ -593,7 +3395,7 @@ class AppGUI(tk.Tk):
         if not ali:
             messagebox.showwarning('Empty', 'Enter AliExpress ID or URL')
             return
-        cfg = load_config()
+        cfg = config_snapshot()
         t = threading.Thread(target=self._import_single_bg, args=(ali, cfg), daemon=True)
         t.start()
 
@@ -606,7 +3408,7 @@ class AppGUI(tk.Tk):
             self._log_ui(f'Import error: {e}')
 
     def import_csv(self):
-        cfg = load_config()
+        cfg = config_snapshot()
         file = filedialog.askopenfilename(filetypes=[('CSV','*.csv')])
         if not file:
             return
@@ -618,8 +3420,20 @@ class AppGUI(tk.Tk):
         results = worker.import_bulk_csv(file)
         self._log_ui(f'CSV import results: {len(results)} rows')
 
+    def update_categories(self):
+        cfg = config_snapshot()
+        t = threading.Thread(target=self._update_categories_bg, args=(cfg,), daemon=True)
+        t.start()
+
+    def _update_categories_bg(self, cfg):
+        try:
+            leaves = DropshipWorker(cfg).refresh_category_tree()
+            self._log_ui(f'Category tree updated: {leaves} leaf categories')
+        except Exception as e:
+            self._log_ui(f'Category tree update failed: {e}')
+
     def sync_now(self):
-        cfg = load_config()
+        cfg = config_snapshot()
         t = threading.Thread(target=self._sync_now_bg, args=(cfg,), daemon=True)
         t.start()
 
@@ -628,8 +3442,17 @@ class AppGUI(tk.Tk):
         worker.sync_stocks_now()
         self._log_ui('Stock sync completed')
 
+    def reprice_now(self):
+        cfg = config_snapshot()
+        t = threading.Thread(target=self._reprice_now_bg, args=(cfg,), daemon=True)
+        t.start()
+
+    def _reprice_now_bg(self, cfg):
+        stats = DropshipWorker(cfg).reprice_catalog()
+        self._log_ui(f"Repricing completed: {stats['updated']} of {stats['checked']} listings repriced")
+
     def toggle_auto_sync(self):
-        cfg = load_config()
+        cfg = config_snapshot()
         if self.auto_sync_btn['text'].startswith('Start'):
             worker = DropshipWorker(cfg)
             worker.start_auto_sync()
@@ -642,10 +3465,25 @@ class AppGUI(tk.Tk):
 
     def plot_btn(self):
         try:
-            data = {'sales': [1, 3, 2, 5, 6, 4]}
-            plt.figure(figsize=(6,3))
-            plt.plot(data['sales'])
-            plt.title('Sales sample')
+            history = get_history_store()
+            now = int(time.time())
+            start = now - 30 * 86400
+            edges, sold = history.sales(step=86400, start=start, end=now)
+            _, sell_through = history.sell_through(window=7, step=86400, start=start, end=now)
+            margins = history.margin_by_category(at=now)
+            days = [datetime.fromtimestamp(t) for t in edges]
+            fig, (ax_sales, ax_margin) = plt.subplots(1, 2, figsize=(11, 3.5))
+            ax_sales.bar(days, sold, width=0.8, label='Units sold')
+            ax_sales.set_title('Last 30 days')
+            ax_rate = ax_sales.twinx()
+            ax_rate.plot(days, sell_through * 100, color='tab:orange', label='7-day sell-through %')
+            ax_rate.set_ylim(0, 100)
+            fig.legend(loc='upper left')
+            fig.autofmt_xdate()
+            names = sorted(margins, key=lambda c: margins[c]['margin'], reverse=True)[:10]
+            ax_margin.barh([n or '(uncategorised)' for n in names], [margins[n]['avg_margin'] for n in names])
+            ax_margin.set_title('Average margin per SKU by category')
+            fig.tight_layout()
             plt.show()
             self._log_ui('Displayed analytics chart')
         except Exception as e:
@@ -653,48 +3491,116 @@ class AppGUI(tk.Tk):
 
     def refresh_stats(self):
         s = self.analytics.dashboard_summary()
-        self.stats_label['text'] = f"Summary: products={s['count']} value={s['total_value']} qty={s['total_qty']}"
+        text = f"Summary: products={s['count']} value={s['total_value']} qty={s['total_qty']}"
+        for market, m in sorted(self.analytics.breakdown('marketplace').items()):
+            text += f"\n  {market or '(unknown)'}: products={m['count']} value={m['total_value']} qty={m['total_qty']}"
+        self.stats_label['text'] = text
 
     def _refresh_synced_list(self):
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('SELECT ali_product_id FROM products')
-        rows = c.fetchall()
-        conn.close()
+        rows = get_storage().query('SELECT ali_product_id FROM products')
         self.synced_list.delete(0, tk.END)
         for r in rows:
             self.synced_list.insert(tk.END, r[0])
 
     def search_logs(self):
-        q = self.search_entry.get().strip().lower()
+        q = self.search_entry.get().strip()
+        level = self.search_level_var.get()
+        since = self.search_since_entry.get().strip()
+        until = self.search_until_entry.get().strip()
+        if not (q or since or until) and level == 'ALL':
+            # empty search: go back to the live tail
+            self._log_search = None
+            self.logbox.delete('1.0', tk.END)
+            self.logbox.insert(tk.END, ''.join(self.log_tailer.lines))
+            self.logbox.see(tk.END)
+            return
+        self._log_search = {'query': q, 'levels': None if level == 'ALL' else [level],
+                            'since': since or None, 'until': until or None, 'pages': [None]}
+        self._run_log_search()
+        logger.info('Search logs for: %s', q)
+
+    def search_logs_older(self):
+        search = getattr(self, '_log_search', None)
+        if search and search.get('next') is not None:
+            search['pages'].append(search['next'])
+            self._run_log_search()
+
+    def search_logs_newer(self):
+        search = getattr(self, '_log_search', None)
+        if search and len(search['pages']) > 1:
+            search['pages'].pop()
+            self._run_log_search()
+
+    def _run_log_search(self):
+        search = self._log_search
+        t = threading.Thread(target=self._search_logs_bg, args=(search, search['pages'][-1]), daemon=True)
+        t.start()
+
+    def _search_logs_bg(self, search, before):
+        try:
+            LOG_INDEX.refresh()
+            rows, cursor = LOG_INDEX.search(search['query'], levels=search['levels'], since=search['since'],
+                                            until=search['until'], before=before, limit=self.LOG_SEARCH_PAGE)
+        except Exception as e:
+            logger.exception('Log search failed')
+            rows, cursor = [('', '', '', f'Log search failed: {e}')], None
+        self.after(0, self._show_log_results, search, rows, cursor)
+
+    def _show_log_results(self, search, rows, cursor):
+        if search is not self._log_search:
+            return  # a newer search replaced this one
+        search['next'] = cursor
+        page = len(search['pages'])
         self.logbox.delete('1.0', tk.END)
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r', encoding='utf-8', errors='ignore') as f:
-                for ln in f:
-                    if q in ln.lower():
-                        self.logbox.insert(tk.END, ln)
-        self._log_ui(f'Search logs for: {q}')
+        self.logbox.insert(tk.END, f'--- page {page}: {len(rows)} matches'
+                                   f'{" (more with Older)" if cursor is not None else ""} ---\n')
+        # pages come back newest first; show them in file order
+        self.logbox.insert(tk.END, ''.join(row[3] + '\n' for row in reversed(rows)))
+        self.logbox.see(tk.END)
+
+    def _index_logs_async(self):
+        # one indexing thread at a time; the next drain picks up anything it missed
+        if not self._log_indexing.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                LOG_INDEX.refresh()
+            except Exception:
+                logger.exception('Log indexing failed')
+            finally:
+                self._log_indexing.release()
+
+        threading.Thread(target=run, name='log-index', daemon=True).start()
 
     def _log_ui(self, msg):
-        timestamp = datetime.utcnow().isoformat()
+        # The message reaches the Logs tab through the file tail; just ask for an early drain.
+        logger.info(msg)
         try:
-            self.logbox.insert(tk.END, f'[{timestamp}] {msg}\n')
-            self.logbox.see(tk.END)
+            self.after_idle(self._drain_log_tail)
         except Exception:
             pass
-        logger.info(msg)
 
     def _poll_logs(self):
-        # periodically refresh from file tail
+        # periodically append whatever was written to the log since the last poll
+        self._drain_log_tail()
+        self.after(3000, self._poll_logs)
+
+    def _drain_log_tail(self):
         try:
-            if os.path.exists(LOG_FILE):
-                with open(LOG_FILE, 'r', encoding='utf-8', errors='ignore') as f:
-                    data = f.read()[-8000:]
-                self.logbox.delete('1.0', tk.END)
-                self.logbox.insert(tk.END, data)
+            lines = self.log_tailer.poll()
+            if not lines:
+                return
+            self._index_logs_async()
+            if self._log_search is not None:
+                return  # keep search results on screen; the tail ring buffer still fills
+            self.logbox.insert(tk.END, ''.join(lines))
+            excess = int(self.logbox.index('end-1c').split('.')[0]) - self.LOGBOX_MAX_LINES
+            if excess > 0:
+                self.logbox.delete('1.0', f'{excess + 1}.0')
+            self.logbox.see(tk.END)
         except Exception:
-            pass
-        self.after(3000, self._poll_logs)
+            logger.exception('Log tail refresh failed')
 
 # -------------------------- Small helpers --------------------------------
 
@@ -720,6 +3626,9 @@ def run_simulation(cfg):
 # -------------------------- Main ----------------------------------------
 
 if __name__ == '__main__':
+    # the frozen (PyInstaller) exe would otherwise relaunch the GUI in every image worker process
+    multiprocessing.freeze_support()
     cfg = load_config()
+    configure_logging(cfg.get('app'))
     app = AppGUI(cfg)
     app.mainloop()
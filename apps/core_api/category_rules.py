@@ -0,0 +1,225 @@
+"""Keyword/phrase -> eBay category rules compiled into an Aho-Corasick automaton.
+
+Rule file (CSV, `#` comments allowed):
+
+    phrase,category_id,weight
+    phone case,20349,1.2
+    laptop,177,0.9
+
+Phrases are matched on whole words after lowercasing, so "case" does not fire
+inside "showcase". Text is tokenized once, and the automaton walks the token
+stream in a single pass, so scoring cost depends on the text length, not on
+how many rules there are.
+"""
+
+import csv
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("core_api.category_rules")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# How much a match counts depending on where it was found
+FIELD_WEIGHTS = {"title": 1.0, "attrs": 0.8, "description": 0.3}
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+class Automaton:
+    """Token-level Aho-Corasick automaton over (phrase, category_id, weight) rules."""
+
+    def __init__(self, rules: Iterable[Tuple[str, str, float]]):
+        self.vocab: Dict[str, int] = {}
+        self.goto: List[Dict[int, int]] = [{}]
+        self.outputs: List[Tuple[int, ...]] = []
+        self.categories: List[str] = []
+        self.weights: List[float] = []
+        out: List[List[int]] = [[]]
+        for phrase, category_id, weight in rules:
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            state = 0
+            for tok in tokens:
+                tid = self.vocab.setdefault(tok, len(self.vocab))
+                nxt = self.goto[state].get(tid)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][tid] = nxt
+                    self.goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(len(self.categories))
+            self.categories.append(str(category_id))
+            self.weights.append(float(weight))
+
+        # Breadth-first failure links; outputs are merged along them at build time
+        # so matching never has to follow output chains.
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for tid, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and tid not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(tid, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                out[nxt].extend(out[self.fail[nxt]])
+                queue.append(nxt)
+        self.outputs = [tuple(o) for o in out]
+
+    def __len__(self):
+        return len(self.categories)
+
+    def find(self, tokens: Iterable[str]):
+        """Yield the rule index of every match in `tokens`."""
+        vocab, goto, fail, outputs = self.vocab, self.goto, self.fail, self.outputs
+        state = 0
+        for tok in tokens:
+            tid = vocab.get(tok)
+            if tid is None:
+                # no rule contains this word, so nothing can span it
+                state = 0
+                continue
+            while state and tid not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(tid, 0)
+            if outputs[state]:
+                yield from outputs[state]
+
+    def score(self, fields: Dict[str, str]) -> Dict[str, float]:
+        """Category -> summed weight. Each rule counts once, at its best field weight."""
+        best: Dict[int, float] = {}
+        for field, text in fields.items():
+            fw = FIELD_WEIGHTS.get(field, 0.5)
+            for rule in self.find(tokenize(text)):
+                if best.get(rule, 0.0) < fw:
+                    best[rule] = fw
+        scores: Dict[str, float] = {}
+        for rule, fw in best.items():
+            cat = self.categories[rule]
+            scores[cat] = scores.get(cat, 0.0) + self.weights[rule] * fw
+        return scores
+
+
+def load_rules(path: str) -> List[Tuple[str, str, float]]:
+    rules = []
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.reader(line for line in f if line.strip() and not line.lstrip().startswith("#"))
+        for n, row in enumerate(rows, 1):
+            if n == 1 and row and row[0].strip().lower() == "phrase":
+                continue
+            if len(row) < 2:
+                raise ValueError(f"{path}: rule {n} needs at least phrase,category_id")
+            weight = float(row[2]) if len(row) > 2 and row[2].strip() else 1.0
+            rules.append((row[0].strip(), row[1].strip(), weight))
+    return rules
+
+
+def _flatten_attrs(attrs: Optional[Dict[str, Any]]) -> str:
+    if not attrs:
+        return ""
+    parts = []
+    for key, value in attrs.items():
+        parts.append(str(key))
+        if isinstance(value, (list, tuple)):
+            parts.extend(str(v) for v in value)
+        elif value is not None:
+            parts.append(str(value))
+    return " ".join(parts)
+
+
+class CategoryEngine:
+    """Serves matches from the current automaton and swaps in a recompiled one
+    when the rule file changes.
+
+    Reload checks are throttled to one stat() per `check_interval` seconds.
+    Compilation runs on a background thread while requests keep using the old
+    automaton. A rule file that fails to load, or has gone missing, is logged
+    and the previous rules stay in service.
+    """
+
+    def __init__(self, path: str, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.automaton = Automaton([])
+        self._stamp = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._reloading = False
+        self.reload()
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload(self) -> bool:
+        """Recompile from the rule file now; returns False (keeping the old rules) on error."""
+        stamp = self._file_stamp()
+        if stamp is None:
+            # usually a deploy replacing the file non-atomically; don't drop every rule meanwhile
+            logger.error("Category rules %s missing, keeping previous rules", self.path)
+            self._stamp = stamp
+            return False
+        try:
+            automaton = Automaton(load_rules(self.path))
+        except (OSError, ValueError) as e:
+            logger.error("Category rules %s not loaded, keeping previous rules: %s", self.path, e)
+            self._stamp = stamp
+            return False
+        self.automaton = automaton
+        self._stamp = stamp
+        logger.info("Loaded %s category rules from %s", len(automaton), self.path)
+        return True
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        if self._file_stamp() == self._stamp:
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+
+        def run():
+            try:
+                self.reload()
+            finally:
+                self._reloading = False
+
+        threading.Thread(target=run, name="category-rules-reload", daemon=True).start()
+
+    def match(self, title: str, description: Optional[str] = None,
+              attrs: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Best category for the listing text, or None if no rule fired."""
+        self.maybe_reload()
+        scores = self.automaton.score({
+            "title": title or "",
+            "description": description or "",
+            "attrs": _flatten_attrs(attrs),
+        })
+        if not scores:
+            return None
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        top_id, top = ranked[0]
+        share = top / sum(scores.values())
+        return {
+            "categoryId": top_id,
+            "confidence": round(min(top, 0.99) * share, 2),
+            "candidates": [{"categoryId": c, "score": round(s, 3)} for c, s in ranked[:3]],
+        }
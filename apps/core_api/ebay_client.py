@@ -0,0 +1,227 @@
+"""Async eBay Sell Inventory client used by the live-mode `/import` endpoint.
+
+One `httpx.AsyncClient` (and so one keep-alive connection pool) is shared by
+every request the API worker serves, so concurrent imports interleave on the
+event loop instead of each holding a thread and opening its own connections.
+"""
+
+import asyncio
+import base64
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger("core_api.ebay_client")
+
+EBAY_BASE = {"sandbox": "https://api.sandbox.ebay.com", "prod": "https://api.ebay.com"}
+INVENTORY_SCOPE = "https://api.ebay.com/oauth/api_scope/sell.inventory"
+
+# Inventory API wants the listing language of the marketplace on every write
+CONTENT_LANGUAGE = {
+    "EBAY_AU": "en-AU", "EBAY_US": "en-US", "EBAY_GB": "en-GB", "EBAY_CA": "en-CA",
+    "EBAY_DE": "de-DE", "EBAY_FR": "fr-FR", "EBAY_IT": "it-IT", "EBAY_ES": "es-ES",
+}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# A POST may already have been applied after a 5xx or a dropped connection;
+# these are the only failures that prove it never reached eBay
+POST_RETRY_STATUSES = {429}
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# createOffer: an offer for this SKU and marketplace exists already
+OFFER_EXISTS = 25002
+
+
+def marketplace_key(marketplace: str) -> str:
+    # env/config use the legacy "EBAY-AU" spelling, the REST APIs "EBAY_AU"
+    return marketplace.upper().replace("-", "_")
+
+
+class EbayError(Exception):
+    """eBay rejected a call; `status` is the HTTP status (None for transport errors)."""
+
+    def __init__(self, message: str, status: Optional[int] = None, errors: Optional[list] = None):
+        super().__init__(message)
+        self.status = status
+        self.errors = errors or []
+
+    @classmethod
+    def from_response(cls, resp: httpx.Response, what: str) -> "EbayError":
+        try:
+            errors = resp.json().get("errors") or []
+        except ValueError:
+            errors = []
+        detail = "; ".join(e.get("message", "") for e in errors if e.get("message")) or resp.text[:200]
+        return cls(f"{what} failed ({resp.status_code}): {detail}", resp.status_code, errors)
+
+    def has_error(self, error_id: int) -> bool:
+        return any(e.get("errorId") == error_id for e in self.errors)
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class EbayClient:
+    """Inventory item -> offer -> publish over a pooled async HTTP client.
+
+    The access token is minted once and shared; concurrent imports that find
+    it expired wait on the same refresh. With a `refresh_token` (a seller's
+    consent, required by the Inventory API outside the sandbox) the user
+    token grant is used, otherwise client credentials. 429 and 5xx answers
+    are retried with backoff, honouring Retry-After; createOffer and
+    publishOffer are not idempotent, so they are only retried on 429 or when
+    the connection was never made. A 401 drops the cached token and the call
+    is repeated once with a fresh one. SKUs are deterministic, so a re-import
+    whose createOffer is refused because the offer exists publishes that
+    offer instead. Every attempt first
+    takes a token from `limiter` (an AsyncRateLimiter), so live imports stay
+    inside the quota shared with the desktop app.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, env: str = "sandbox", marketplace: str = "EBAY-AU",
+                 refresh_token: Optional[str] = None, max_connections: int = 100, timeout: float = 30.0,
+                 max_retries: int = 3, backoff: float = 0.5, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 limiter=None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_token = refresh_token
+        self.marketplace = marketplace_key(marketplace)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = limiter
+        self.http = httpx.AsyncClient(
+            base_url=EBAY_BASE.get(env, EBAY_BASE["sandbox"]),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            transport=transport,
+        )
+        self._token: Optional[str] = None
+        self._token_expires = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    # ---- auth ---------------------------------------------------------
+
+    async def token(self) -> str:
+        if self._token and time.time() < self._token_expires - 60:
+            return self._token
+        async with self._token_lock:
+            if self._token and time.time() < self._token_expires - 60:
+                return self._token
+            if not self.client_id or not self.client_secret:
+                raise EbayError("eBay credentials missing (EBAY_CLIENT_ID / EBAY_CLIENT_SECRET)")
+            if self.refresh_token:
+                data = {"grant_type": "refresh_token", "refresh_token": self.refresh_token, "scope": INVENTORY_SCOPE}
+            else:
+                data = {"grant_type": "client_credentials", "scope": INVENTORY_SCOPE}
+            auth = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
+            resp = await self._send("POST", "/identity/v1/oauth2/token", "Token request", "ebay:identity", data=data,
+                                    headers={"Authorization": f"Basic {auth}"})
+            body = resp.json()
+            self._token = body["access_token"]
+            self._token_expires = time.time() + int(body.get("expires_in", 7200))
+            logger.info("Obtained eBay %s token, expires in %ss", data["grant_type"], body.get("expires_in"))
+            return self._token
+
+    # ---- transport ----------------------------------------------------
+
+    def invalidate_token(self, token: str):
+        # only if nobody has refreshed it since `token` was handed out
+        if self._token == token:
+            self._token = None
+            self._token_expires = 0.0
+
+    async def _send(self, method: str, url: str, what: str, family: str, idempotent: bool = True,
+                    **kwargs) -> httpx.Response:
+        retry_statuses = RETRY_STATUSES if idempotent else POST_RETRY_STATUSES
+        retry_errors = httpx.TransportError if idempotent else UNSENT_ERRORS
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                await self.limiter.acquire(family)
+            try:
+                resp = await self.http.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if not isinstance(e, retry_errors) or attempt == self.max_retries:
+                    raise EbayError(f"{what} failed: {e}") from e
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+                continue
+            if resp.status_code < 400:
+                return resp
+            if resp.status_code not in retry_statuses or attempt == self.max_retries:
+                raise EbayError.from_response(resp, what)
+            wait = _retry_after(resp)
+            await asyncio.sleep(wait if wait is not None else self.backoff * 2 ** attempt)
+        raise AssertionError("unreachable")
+
+    async def _call(self, method: str, url: str, what: str, json: Optional[Dict[str, Any]] = None,
+                    idempotent: bool = True, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        for attempt in range(2):
+            token = await self.token()
+            headers = {
+                "Authorization": f"Bearer {token}",
+                "Content-Language": CONTENT_LANGUAGE.get(self.marketplace, "en-US"),
+            }
+            try:
+                return await self._send(method, url, what, "ebay:inventory", idempotent, json=json, params=params,
+                                        headers=headers)
+            except EbayError as e:
+                # revoked or expired early; a rejected call was never applied, so repeating it is safe
+                if e.status != 401 or attempt:
+                    raise
+                logger.info("%s got 401, refreshing the eBay token", what)
+                self.invalidate_token(token)
+        raise AssertionError("unreachable")
+
+    # ---- Inventory API ------------------------------------------------
+
+    async def create_or_replace_inventory_item(self, sku: str, payload: Dict[str, Any]):
+        await self._call("PUT", f"/sell/inventory/v1/inventory_item/{sku}", "createOrReplaceInventoryItem",
+                         json=payload)
+
+    async def create_offer(self, payload: Dict[str, Any]) -> str:
+        resp = await self._call("POST", "/sell/inventory/v1/offer", "createOffer", json=payload, idempotent=False)
+        return resp.json()["offerId"]
+
+    async def get_offer_id(self, sku: str) -> Optional[str]:
+        resp = await self._call("GET", "/sell/inventory/v1/offer", "getOffers",
+                                params={"sku": sku, "marketplace_id": self.marketplace})
+        for offer in resp.json().get("offers") or []:
+            if offer.get("marketplaceId", self.marketplace) == self.marketplace:
+                return offer["offerId"]
+        return None
+
+    async def publish_offer(self, offer_id: str) -> str:
+        resp = await self._call("POST", f"/sell/inventory/v1/offer/{offer_id}/publish", "publishOffer",
+                                idempotent=False)
+        return resp.json().get("listingId")
+
+    async def list_item(self, sku: str, inventory_item: Dict[str, Any], offer: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the three listing calls for one SKU; returns {"offerId", "listingId"}."""
+        await self.create_or_replace_inventory_item(sku, inventory_item)
+        try:
+            offer_id = await self.create_offer(dict(offer, sku=sku, marketplaceId=self.marketplace))
+        except EbayError as e:
+            if not e.has_error(OFFER_EXISTS):
+                raise
+            offer_id = await self.get_offer_id(sku)
+            if offer_id is None:
+                raise
+            logger.info("Offer for %s exists already as %s, publishing it", sku, offer_id)
+        listing_id = await self.publish_offer(offer_id)
+        logger.info("Published %s as offer %s / listing %s", sku, offer_id, listing_id)
+        return {"offerId": offer_id, "listingId": listing_id}
@@ -1,18 +1,49 @@
 import os
-from typing import Optional, Dict, Any
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Tuple
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import urllib.parse as urlparse
 
+try:
+    from .category_rules import CategoryEngine, tokenize
+    from .ebay_client import EbayClient, EbayError
+    from .rate_limit import AsyncRateLimiter, DEFAULT_RATE_LIMITS
+except ImportError:  # run from inside apps/core_api (Dockerfile: `uvicorn main:app`)
+    from category_rules import CategoryEngine, tokenize
+    from ebay_client import EbayClient, EbayError
+    from rate_limit import AsyncRateLimiter, DEFAULT_RATE_LIMITS
+
 load_dotenv()
 
-SIMULATION = os.getenv("SIMULATION", "true").lower() == "true"
+SIMULATION = os.getenv("SIMULATION", "true").lower() in ("1", "true", "yes")
 MARKUP_PERCENT = float(os.getenv("MARKUP_PERCENT", "30.0"))
 MARKETPLACE_ID = os.getenv("MARKETPLACE_ID", "EBAY-AU")
 AFFILIATE_ENABLED = os.getenv("AFFILIATE_ENABLED", "true").lower() == "true"
 ALI_AFF_TRACKING_ID = os.getenv("ALI_AFF_TRACKING_ID", "")
 ALI_AFF_SUB_ID = os.getenv("ALI_AFF_SUB_ID", "")
+EBAY_ENV = os.getenv("EBAY_ENV", "sandbox")
+EBAY_CLIENT_ID = os.getenv("EBAY_CLIENT_ID", "")
+EBAY_CLIENT_SECRET = os.getenv("EBAY_CLIENT_SECRET", "")
+EBAY_REFRESH_TOKEN = os.getenv("EBAY_REFRESH_TOKEN", "")
+EBAY_MAX_CONNECTIONS = int(os.getenv("EBAY_MAX_CONNECTIONS", "100"))
+# Business policies and inventory location the live offers are created with
+EBAY_FULFILLMENT_POLICY_ID = os.getenv("EBAY_FULFILLMENT_POLICY_ID", "")
+EBAY_PAYMENT_POLICY_ID = os.getenv("EBAY_PAYMENT_POLICY_ID", "")
+EBAY_RETURN_POLICY_ID = os.getenv("EBAY_RETURN_POLICY_ID", "")
+EBAY_MERCHANT_LOCATION_KEY = os.getenv("EBAY_MERCHANT_LOCATION_KEY", "")
+# How long a finished import is replayed for a repeated Idempotency-Key
+IMPORT_IDEMPOTENCY_TTL = float(os.getenv("IMPORT_IDEMPOTENCY_TTL", "600"))
+IMPORT_IDEMPOTENCY_MAX = 10000
+CATEGORY_RULES_FILE = os.getenv(
+    "CATEGORY_RULES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_rules.csv"))
 
 ALI_TO_EBAY = {
     "Phones & Telecommunications": "15032",
@@ -22,7 +53,34 @@ ALI_TO_EBAY = {
     "Home & Garden": "11700",
 }
 
-app = FastAPI(title="Dropship Core API", version="0.1.0")
+# Largest /map-category/batch request, and how many result lines go out per write
+MAP_BATCH_MAX_ITEMS = 100_000
+MAP_BATCH_CHUNK = 1000
+
+# Compiled once at startup; picks up edits to the rule file without a restart
+CATEGORY_ENGINE = CategoryEngine(CATEGORY_RULES_FILE)
+
+# Same Redis buckets as the desktop app, so both stay inside one marketplace quota
+RATE_LIMITER = AsyncRateLimiter(DEFAULT_RATE_LIMITS, os.getenv("REDIS_URL"))
+
+# Live mode only; created on first import so simulation never needs credentials
+EBAY_CLIENT: Optional[EbayClient] = None
+
+def get_ebay_client() -> EbayClient:
+    global EBAY_CLIENT
+    if EBAY_CLIENT is None:
+        EBAY_CLIENT = EbayClient(EBAY_CLIENT_ID, EBAY_CLIENT_SECRET, env=EBAY_ENV, marketplace=MARKETPLACE_ID,
+                                 refresh_token=EBAY_REFRESH_TOKEN or None, max_connections=EBAY_MAX_CONNECTIONS,
+                                 limiter=RATE_LIMITER)
+    return EBAY_CLIENT
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if EBAY_CLIENT is not None:
+        await EBAY_CLIENT.aclose()
+
+app = FastAPI(title="Dropship Core API", version="0.1.0", lifespan=lifespan)
 
 class ImportBody(BaseModel):
     ali_id: str
@@ -54,17 +112,15 @@ def affiliate_link(ali_id: str = Query(..., description="AliExpress product id")
     link = "https://s.click.aliexpress.com/deep_link?" + urlparse.urlencode(params)
     return {"ali_id": ali_id, "link": link, "affiliate": True}
 
-@app.post("/map-category")
-def map_category(body: MapBody):
-    # Minimal rule mapping: pick from attributes/title keywords; fallback to alias map
-    title = (body.title or "").lower()
-    attrs = body.attrs or {}
+def _map_category(title: str, description: Optional[str], attrs: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # Keyword rules over title/description/attrs first; fallback to alias map
+    attrs = attrs or {}
     hints = [attrs.get("category"), attrs.get("ali_first_level")]
 
-    if "case" in title or "phone" in title:
-        return {"categoryId": ALI_TO_EBAY["Phones & Telecommunications"], "confidence": 0.85, "source": "rule"}
-    if "laptop" in title or "keyboard" in title:
-        return {"categoryId": ALI_TO_EBAY["Computer & Office"], "confidence": 0.75, "source": "rule"}
+    match = CATEGORY_ENGINE.match(title, description, attrs)
+    if match:
+        return {"categoryId": match["categoryId"], "confidence": match["confidence"], "source": "rule",
+                "candidates": match["candidates"]}
     for h in hints:
         if not h:
             continue
@@ -74,9 +130,152 @@ def map_category(body: MapBody):
     # Fallback
     return {"categoryId": "99", "confidence": 0.2, "source": "fallback"}
 
+@app.post("/map-category")
+def map_category(body: MapBody):
+    return _map_category(body.title, body.description, body.attrs)
+
+def _parse_batch(raw: bytes):
+    # JSON array, or NDJSON (one MapBody per line); NDJSON lines that don't parse become per-item errors
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch body must be UTF-8")
+    if text.lstrip().startswith("["):
+        try:
+            items = json.loads(text)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON array: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+    else:
+        items = [line for line in text.splitlines() if line.strip()]
+    if len(items) > MAP_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAP_BATCH_MAX_ITEMS} items per batch")
+    return items
+
+def _map_batch_lines(items):
+    # Listings that tokenize the same (case, punctuation, spacing) map the same,
+    # so each distinct listing is scored once per batch
+    cache: Dict[Any, bytes] = {}
+    out = []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, str):
+                item = json.loads(item)
+            body = MapBody.model_validate(item)
+        except (ValueError, ValidationError) as e:
+            out.append(json.dumps({"index": index, "error": str(e).splitlines()[0]}))
+        else:
+            key = (" ".join(tokenize(body.title)), " ".join(tokenize(body.description)),
+                   json.dumps(body.attrs, sort_keys=True, default=str) if body.attrs else "")
+            line = cache.get(key)
+            if line is None:
+                line = cache[key] = json.dumps(_map_category(body.title, body.description, body.attrs))[1:]
+            out.append('{"index": %d, %s' % (index, line))
+        if len(out) >= MAP_BATCH_CHUNK:
+            yield ("\n".join(out) + "\n").encode("utf-8")
+            out = []
+    if out:
+        yield ("\n".join(out) + "\n").encode("utf-8")
+
+@app.post("/map-category/batch")
+async def map_category_batch(request: Request):
+    """Map up to MAP_BATCH_MAX_ITEMS MapBody items sent as NDJSON or a JSON array.
+
+    Results stream back as NDJSON in input order, one line per item:
+    the /map-category response plus "index", or {"index", "error"}.
+    """
+    items = await run_in_threadpool(_parse_batch, await request.body())
+    return StreamingResponse(_map_batch_lines(items), media_type="application/x-ndjson")
+
+def _listing_payloads(body: ImportBody):
+    # attrs carries the supplier data: price (cost), quantity, currency, description, images, categoryId
+    attrs = body.attrs or {}
+    try:
+        cost = float(attrs["price"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="attrs.price (supplier cost) is required in live mode")
+    title = (body.title or attrs.get("title") or "")[:80]
+    if not title:
+        raise HTTPException(status_code=422, detail="title is required in live mode")
+    qty = min(int(attrs.get("quantity") or 0), 999)
+    description = attrs.get("description") or title
+    images = attrs.get("images") or []
+    category_id = attrs.get("categoryId") or _map_category(title, attrs.get("description"), attrs)["categoryId"]
+    inventory_item = {
+        "product": {"title": title, "description": description, "imageUrls": images},
+        "condition": "NEW",
+        "availability": {"shipToLocationAvailability": {"quantity": qty}},
+    }
+    offer = {
+        "format": "FIXED_PRICE",
+        "availableQuantity": qty,
+        "categoryId": category_id,
+        "listingDescription": description,
+        "pricingSummary": {"price": {"value": f"{cost * (1 + MARKUP_PERCENT / 100.0):.2f}",
+                                     "currency": attrs.get("currency", "AUD")}},
+        "listingPolicies": {"fulfillmentPolicyId": EBAY_FULFILLMENT_POLICY_ID,
+                            "paymentPolicyId": EBAY_PAYMENT_POLICY_ID,
+                            "returnPolicyId": EBAY_RETURN_POLICY_ID},
+        "merchantLocationKey": EBAY_MERCHANT_LOCATION_KEY,
+    }
+    return inventory_item, offer
+
+# Imports running now per (marketplace, ali_id), and the run claimed by each Idempotency-Key
+_IMPORT_FLIGHTS: Dict[Tuple[str, str], "asyncio.Future"] = {}
+_IMPORT_RESULTS: "OrderedDict[str, Tuple[float, Tuple[str, str], asyncio.Future]]" = OrderedDict()
+
+def _remembered_import(idempotency_key: str, flight: Tuple[str, str]) -> Optional["asyncio.Future"]:
+    now = time.monotonic()
+    while _IMPORT_RESULTS:
+        oldest = next(iter(_IMPORT_RESULTS.values()))
+        if oldest[0] > now:
+            break
+        _IMPORT_RESULTS.popitem(last=False)
+    entry = _IMPORT_RESULTS.get(idempotency_key)
+    if entry is None:
+        return None
+    if entry[1] != flight:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different import")
+    return entry[2]
+
+def _remember_import(idempotency_key: str, flight: Tuple[str, str], task: "asyncio.Future"):
+    _IMPORT_RESULTS.pop(idempotency_key, None)
+    _IMPORT_RESULTS[idempotency_key] = (time.monotonic() + IMPORT_IDEMPOTENCY_TTL, flight, task)
+    while len(_IMPORT_RESULTS) > IMPORT_IDEMPOTENCY_MAX:
+        _IMPORT_RESULTS.popitem(last=False)
+    task.add_done_callback(lambda t: _forget_failed_import(idempotency_key, t))
+
+def _forget_failed_import(idempotency_key: str, task: "asyncio.Future"):
+    # failures are not remembered, so a retry with the same key runs again
+    entry = _IMPORT_RESULTS.get(idempotency_key)
+    if entry is not None and entry[2] is task and (task.cancelled() or task.exception() is not None):
+        del _IMPORT_RESULTS[idempotency_key]
+
+def _end_flight(flight: Tuple[str, str], task: "asyncio.Future"):
+    if _IMPORT_FLIGHTS.get(flight) is task:
+        del _IMPORT_FLIGHTS[flight]
+    if not task.cancelled():
+        task.exception()  # retrieved here in case every caller went away
+
 @app.post("/import")
-def import_product(body: ImportBody):
-    # Simulate listing pipeline (Inventory->Offer->Publish) and return an offer id
+async def import_product(body: ImportBody, idempotency_key: Optional[str] = Header(None)):
+    # Duplicate submissions of a product share one run; a repeated Idempotency-Key replays its result
+    flight = (MARKETPLACE_ID, body.ali_id)
+    task = _remembered_import(idempotency_key, flight) if idempotency_key else None
+    if task is None:
+        task = _IMPORT_FLIGHTS.get(flight)
+        if task is None:
+            task = _IMPORT_FLIGHTS[flight] = asyncio.ensure_future(_import(body))
+            task.add_done_callback(lambda t: _end_flight(flight, t))
+        if idempotency_key:
+            # claimed before the first await, so a concurrent reuse of the key already sees it
+            _remember_import(idempotency_key, flight, task)
+    # shield: a caller that disconnects must not cancel the run the others are waiting on
+    return await asyncio.shield(task)
+
+async def _import(body: ImportBody) -> Dict[str, Any]:
+    # Listing pipeline (Inventory->Offer->Publish); simulated unless SIMULATION is off
     if SIMULATION:
         offer_id = f"SIM-OFFER-{body.ali_id}"
         return {
@@ -85,4 +284,15 @@ def import_product(body: ImportBody):
             "marketplaceId": MARKETPLACE_ID,
             "markup_percent": MARKUP_PERCENT,
         }
-    raise HTTPException(status_code=501, detail="Live mode not yet implemented here")
+    inventory_item, offer = _listing_payloads(body)
+    try:
+        listing = await get_ebay_client().list_item(f"ALI-{body.ali_id}", inventory_item, offer)
+    except EbayError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return {
+        "ok": True,
+        "offerId": listing["offerId"],
+        "listingId": listing["listingId"],
+        "marketplaceId": MARKETPLACE_ID,
+        "markup_percent": MARKUP_PERCENT,
+    }
@@ -0,0 +1,110 @@
+"""Async token-bucket limiter sharing the desktop app's marketplace quotas.
+
+Buckets live in Redis under the same keys, with the same reservation script
+and the same default rates as `RateLimiter` in Global_Marketplace_Bridge.py,
+so the Tk app and every core_api worker draw from one quota. The RQ workers
+reach eBay only through core_api, so they are covered too. Keep `BUCKET_LUA`
+and `DEFAULT_RATE_LIMITS` identical to the desktop copies; a test compares them.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # limits are then per-process
+    aioredis = None
+
+logger = logging.getLogger("core_api.rate_limit")
+
+# (tokens per second, burst) per API method family
+DEFAULT_RATE_LIMITS = {
+    'ebay:inventory': (23.0, 500),     # Inventory API, ~2M calls/day
+    'ebay:fulfillment': (1.1, 100),    # Fulfillment API, ~100k calls/day
+    'ebay:identity': (0.05, 20),       # OAuth token mints
+    'ebay:taxonomy': (0.05, 10),       # Taxonomy API, ~5k calls/day
+    'ali:product': (5.0, 50),          # affiliate productdetail.get
+}
+
+BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local n = tonumber(ARGV[3])
+local max_wait_ms = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+local wait_ms = 0
+if tokens < n then
+  wait_ms = math.ceil((n - tokens) * 1000 / rate)
+  if max_wait_ms >= 0 and wait_ms > max_wait_ms then
+    return -1
+  end
+end
+tokens = tokens - n
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 60000)
+return wait_ms
+"""
+
+
+class AsyncRateLimiter:
+    """Reserve-then-sleep token buckets; waiting happens on the event loop.
+
+    Falls back to in-process buckets while Redis is unset or unreachable
+    (retrying Redis after REDIS_RETRY_SECONDS). Families without a limit are
+    not limited.
+    """
+
+    REDIS_RETRY_SECONDS = 30
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, float]]] = None, redis_url: Optional[str] = None,
+                 prefix: str = "gmb:ratelimit:"):
+        self.limits = {k: (float(v[0]), float(v[1])) for k, v in (limits or {}).items()}
+        self.redis_url = redis_url
+        self.prefix = prefix
+        self._local: Dict[str, Tuple[float, float]] = {}
+        self._script = None
+        self._redis_down_until = 0.0
+
+    def _redis_script(self):
+        if not self.redis_url or aioredis is None or time.monotonic() < self._redis_down_until:
+            return None
+        if self._script is None:
+            client = aioredis.Redis.from_url(self.redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+            self._script = client.register_script(BUCKET_LUA)
+        return self._script
+
+    def _reserve_local(self, family: str, rate: float, burst: float, n: int) -> float:
+        # no await in here, so the read-modify-write is atomic on the event loop
+        now = time.monotonic()
+        tokens, ts = self._local.get(family, (burst, now))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        self._local[family] = (tokens - n, now)
+        return max(0.0, (n - tokens) / rate)
+
+    async def acquire(self, family: str, n: int = 1) -> float:
+        """Wait until `n` calls of `family` may be sent; returns the seconds waited."""
+        limit = self.limits.get(family)
+        if limit is None:
+            return 0.0
+        wait = None
+        script = self._redis_script()
+        if script is not None:
+            try:
+                wait = await script(keys=[self.prefix + family], args=[limit[0], limit[1], n, -1]) / 1000.0
+            except Exception as e:
+                logger.warning("Rate limiter: Redis unavailable (%s); using in-process buckets for %ss",
+                               e, self.REDIS_RETRY_SECONDS)
+                self._redis_down_until = time.monotonic() + self.REDIS_RETRY_SECONDS
+                self._script = None
+        if wait is None:
+            wait = self._reserve_local(family, limit[0], limit[1], n)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
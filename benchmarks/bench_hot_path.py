@@ -0,0 +1,258 @@
+"""
+Microbenchmarks for the per-product hot path of Global_Marketplace_Bridge.py.
+
+The supplier and eBay clients are replaced by in-process fakes, so the numbers
+measure our own code (parsing, payload building, diffing, SQLite writes,
+Fernet) rather than network latency. Each case runs at every requested
+catalog size against a throwaway database.
+
+Usage:
+    python benchmarks/bench_hot_path.py                              # 1k, 10k, 100k
+    python benchmarks/bench_hot_path.py --sizes 1000,1000000         # up to 1M
+    python benchmarks/bench_hot_path.py --save benchmarks/baseline.json
+    python benchmarks/bench_hot_path.py --compare benchmarks/baseline.json --threshold 0.15
+
+With --compare the run exits non-zero if any case got slower per operation
+than the baseline by more than --threshold (a fraction, default 0.2).
+
+benchmarks/baseline.json is a reference run at --sizes 1000,10000. CI compares
+against it with --threshold 1.0, so only a doubling fails the build; runner
+noise alone moves the micro cases by up to ~1.6x. After an intentional change
+in speed, re-run with --save on the same sizes and commit the new file.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import Global_Marketplace_Bridge as gmb  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Distinct inputs are cycled rather than materialized per item, so a 1M run
+# doesn't need gigabytes of fixtures.
+FIXTURE_POOL = 1000
+
+
+def _ali_item(i, qty=120):
+    return {
+        'product_id': str(i),
+        'subject': f'Benchmark Product {i} with a reasonably long supplier title for realism',
+        'description': 'Auto-generated benchmark description ' * 4,
+        'target_sale_price': f'{5 + int(i) % 50}.99',
+        'total_avaliable_stock': str(qty),
+        'image_urls': 'https://example.com/a.jpg;https://example.com/b.jpg;https://example.com/c.jpg',
+        'first_level_category_name': 'Phones & Telecommunications',
+        'sku_infos': [{'sku_id': '1', 'color': 'Black', 'size': 'M'}, {'sku_id': '2', 'color': 'White', 'size': 'L'}],
+    }
+
+
+class FakeAliExpressAPI:
+    """Returns canned products; every 10th SKU has moved stock."""
+
+    fetch_workers = 4
+
+    def fetch_product(self, ali_id, max_age=None):
+        return gmb._productdetail_response([_ali_item(ali_id)])
+
+    def fetch_products(self, ali_ids, max_age=None, raw=False):
+        out = {}
+        for ali_id in ali_ids:
+            item = _ali_item(ali_id, qty=7 if int(ali_id) % 10 == 0 else 120)
+            out[ali_id] = (gmb._productdetail_response([item]) if raw else gmb.normalize_ali_item(item), None)
+        return out
+
+
+class FakeEbayAPI:
+    marketplace = 'EBAY-AU'
+
+    def create_inventory_item(self, sku, payload):
+        return {'sku': sku}
+
+    def create_offer(self, payload):
+        return {'offerId': 'OFF-' + payload['sku']}
+
+    def publish_offer(self, offer_id):
+        return {'status': 'PUBLISHED', 'offerId': offer_id}
+
+    def bulk_update_price_quantity(self, requests_):
+        return {'responses': [{'sku': r['sku'], 'statusCode': 200} for r in requests_]}
+
+
+def make_worker():
+    worker = gmb.DropshipWorker(copy.deepcopy(gmb.DEFAULTS))
+    worker.ali = FakeAliExpressAPI()
+    worker.ebay = FakeEbayAPI()
+    return worker
+
+
+def seed_products(n):
+    now = datetime.utcnow().isoformat()
+    rows = []
+    for i in range(n):
+        prod = gmb.normalize_ali_item(_ali_item(i))
+        rows.append((str(i), prod['title'], f'OFF-ALI-{i}', prod['price'], prod['qty'], now, json.dumps(prod),
+                     prod['price'], prod['category']))
+    gmb.get_storage().executemany('INSERT OR REPLACE INTO products (ali_product_id, title, ebay_item_id, price, qty, last_sync, raw, '
+                                  'cost, category) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+
+# Each case takes a catalog size, does its setup, and returns the timed callable.
+
+def case_normalize(n):
+    worker = make_worker()
+    raws = [gmb._productdetail_response([_ali_item(i)]) for i in range(FIXTURE_POOL)]
+
+    def run():
+        for i in range(n):
+            worker._normalize_ali_product(raws[i % FIXTURE_POOL])
+    return run
+
+
+def case_create_listing(n):
+    worker = make_worker()
+    prods = [gmb.normalize_ali_item(_ali_item(i)) for i in range(FIXTURE_POOL)]
+
+    def run():
+        for i in range(n):
+            prod = dict(prods[i % FIXTURE_POOL], id=str(i))
+            worker._create_ebay_listing(prod, 30.0)
+    return run
+
+
+def case_sync_diff(n):
+    worker = make_worker()
+    gmb.get_storage().execute('DELETE FROM products')
+    gmb.get_storage().execute('DELETE FROM sku_stats')
+    seed_products(n)
+    return worker.sync_stocks_now
+
+
+def case_reprice_plan(n):
+    gmb.get_storage().execute('DELETE FROM products')
+    seed_products(n)
+    repricer = gmb.Repricer(markup_percent=30.0, tiers=[[0, 60], [20, 40], [40, 25]], fee_percent=12.9,
+                            fee_fixed=0.3, price_ending=0.99)
+    return repricer.plan
+
+
+def case_extract_id(n):
+    inputs = [f'https://www.aliexpress.com/item/{1005000000000 + i}.html?spm=a2g0o' if i % 2 else str(i)
+              for i in range(FIXTURE_POOL)]
+
+    def run():
+        for i in range(n):
+            gmb.extract_id(inputs[i % FIXTURE_POOL])
+    return run
+
+
+def case_config_roundtrip(n):
+    cfg = copy.deepcopy(gmb.DEFAULTS)
+
+    def run():
+        for _ in range(n):
+            gmb.decrypt_config(gmb.encrypt_config(cfg))
+    return run
+
+
+CASES = {
+    'normalize_ali_product': case_normalize,
+    'create_ebay_listing': case_create_listing,
+    'sync_stocks_diff': case_sync_diff,
+    'reprice_plan': case_reprice_plan,
+    'extract_id': case_extract_id,
+    'config_encrypt_decrypt': case_config_roundtrip,
+}
+
+
+def run_suite(sizes, cases=None, repeat=3):
+    results = {}
+    cases = cases or list(CASES)
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(gmb, 'DB_FILE', os.path.join(tmp, 'bench.db')):
+        gmb.init_db()
+        level = gmb.logger.level
+        # Keep per-item INFO logging out of the measurement (and out of dropship.log).
+        gmb.logger.setLevel(logging.WARNING)
+        try:
+            for name in cases:
+                for n in sizes:
+                    best = None
+                    for _ in range(max(1, repeat)):
+                        fn = CASES[name](n)
+                        start = time.perf_counter()
+                        fn()
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+                    key = f'{name}@{n}'
+                    results[key] = {'case': name, 'size': n, 'seconds': best, 'us_per_op': best / n * 1e6}
+                    print(f'{key:<36} {best:10.4f}s {best / n * 1e6:10.2f} us/op', flush=True)
+        finally:
+            gmb.logger.setLevel(level)
+            gmb.get_storage().close_all()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return the list of (key, ratio) whose per-op time regressed past `threshold`."""
+    regressions = []
+    for key, res in sorted(results.items()):
+        base = baseline.get('results', {}).get(key)
+        if not base:
+            print(f'{key:<36} (no baseline)')
+            continue
+        ratio = res['us_per_op'] / base['us_per_op'] if base['us_per_op'] else float('inf')
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        print(f'{key:<36} {base["us_per_op"]:10.2f} -> {res["us_per_op"]:10.2f} us/op  x{ratio:5.2f} {flag}')
+        if flag:
+            regressions.append((key, ratio))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                    help='comma-separated catalog sizes (default: %(default)s)')
+    ap.add_argument('--cases', default='', help='comma-separated subset of: ' + ', '.join(CASES))
+    ap.add_argument('--repeat', type=int, default=3, help='runs per case; the best is kept')
+    ap.add_argument('--save', help='write results as a baseline JSON file')
+    ap.add_argument('--compare', help='baseline JSON file to compare against')
+    ap.add_argument('--threshold', type=float, default=0.2, help='allowed per-op slowdown (fraction)')
+    args = ap.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    cases = [c for c in args.cases.split(',') if c] or None
+    results = run_suite(sizes, cases, args.repeat)
+
+    if args.save:
+        payload = {
+            'meta': {
+                'created': datetime.utcnow().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+            },
+            'results': results,
+        }
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2)
+        print(f'Saved baseline to {args.save}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Encrypted config cache shared by Global_Marketplace_Bridge.py and
+dropship_automator_sandbox_ready.py.
+
+Each app passes its own `encrypt` / `decrypt` callables (both keep a Fernet
+key next to the script) and, if needed, its own merge of the stored config
+over the defaults.
+"""
+
+import copy
+import logging
+import os
+import tempfile
+import threading
+import time
+from types import MappingProxyType
+
+logger = logging.getLogger('dropship.config')
+
+
+def freeze(obj):
+    """Read-only deep copy: dicts become MappingProxyType, lists tuples."""
+    if isinstance(obj, (dict, MappingProxyType)):
+        return MappingProxyType({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj):
+    """Mutable deep copy of a frozen (or plain) config."""
+    if isinstance(obj, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+def merge_flat(defaults, cfg):
+    defaults.update(cfg)
+    return defaults
+
+
+class ConfigService:
+    """In-memory cache of the decrypted config.
+
+    The file is only re-read and decrypted when its mtime or size changes.
+    `snapshot()` hands out a shared read-only view; `load()` returns a private
+    mutable copy for callers that edit and save. Writes go to a temp file that
+    is fsynced and renamed over the original, so a crash mid-write leaves the
+    previous config intact.
+    """
+
+    def __init__(self, path, defaults, encrypt, decrypt, merge=merge_flat):
+        self.path = path
+        self.defaults = defaults
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+        self.merge = merge
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._snapshot = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def snapshot(self):
+        with self._lock:
+            # stat under the lock, so a save in another thread can't land between it and the compare
+            stamp = self._stat()
+            if self._snapshot is not None and stamp == self._stamp:
+                return self._snapshot
+            if stamp is None:
+                self._write(copy.deepcopy(self.defaults))
+                return self._snapshot
+            try:
+                with open(self.path, 'rb') as f:
+                    blob = f.read()
+                cfg = self.merge(copy.deepcopy(self.defaults), self.decrypt(blob))
+            except Exception as e:
+                if self._snapshot is not None:
+                    logger.error('Config file unreadable, keeping last good config: %s', e)
+                    self._stamp = stamp
+                    return self._snapshot
+                # Nothing good in memory: keep the broken file for recovery instead of overwriting it.
+                quarantine = f'{self.path}.corrupt-{int(time.time())}'
+                logger.error('Config file unreadable (%s); moved to %s and starting from defaults', e, quarantine)
+                os.replace(self.path, quarantine)
+                self._write(copy.deepcopy(self.defaults))
+                return self._snapshot
+            self._snapshot = freeze(cfg)
+            self._stamp = stamp
+            return self._snapshot
+
+    def load(self):
+        return thaw(self.snapshot())
+
+    def save(self, cfg):
+        with self._lock:
+            self._write(thaw(cfg))
+
+    def update(self, fn):
+        """Read-modify-write under the service lock; `fn` edits a mutable copy in place."""
+        with self._lock:
+            cfg = self.load()
+            fn(cfg)
+            self._write(cfg)
+            return self._snapshot
+
+    def _write(self, cfg):
+        blob = self.encrypt(cfg)
+        fd, tmp = tempfile.mkstemp(prefix='.config-', dir=os.path.dirname(self.path) or '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self._snapshot = freeze(cfg)
+        self._stamp = self._stat()
+        logger.info('Config saved (encrypted)')
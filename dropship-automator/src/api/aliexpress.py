@@ -1,12 +1,18 @@
+try:
+    from ..utils.http import get_session_pool
+except ImportError:  # run from inside src/ (python main.py)
+    from utils.http import get_session_pool
+
 class AliExpressAPI:
     def __init__(self, cfg):
         self.key = cfg['aliexpress']['app_key']
         self.secret = cfg['aliexpress']['app_secret']
         self.base_url = 'https://api.aliexpress.com'
+        self.http = get_session_pool(cfg)
 
     def fetch_product(self, ali_id: str):
         # Placeholder for fetching product data from AliExpress
-        response = requests.get(f"{self.base_url}/product/{ali_id}", headers=self._get_headers())
+        response = self.http.get(f"{self.base_url}/product/{ali_id}", headers=self._get_headers())
         if response.status_code == 200:
             return response.json()
         else:
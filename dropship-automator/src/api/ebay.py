@@ -1,3 +1,8 @@
+try:
+    from ..utils.http import get_session_pool
+except ImportError:  # run from inside src/ (python main.py)
+    from utils.http import get_session_pool
+
 class EbayAPI:
     def __init__(self, cfg):
         self.client_id = cfg['ebay']['client_id']
@@ -7,12 +12,13 @@ class EbayAPI:
         self.base_url = 'https://api.sandbox.ebay.com' if self.use_sandbox else 'https://api.ebay.com'
         self.token_url = f'{self.base_url}/identity/v1/oauth2/token'
         self.api_version = 'v1'
+        self.http = get_session_pool(cfg)
 
     def _get_access_token(self):
         if self.token and not self._is_token_expired():
             return self.token
         
-        response = requests.post(
+        response = self.http.post(
             self.token_url,
             auth=(self.client_id, self.client_secret),
             data={'grant_type': 'client_credentials'},
@@ -36,7 +42,7 @@ class EbayAPI:
         token = self._get_access_token()
         url = f'{self.base_url}/sell/inventory/v1/inventory_item/{sku}'
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-        response = requests.put(url, headers=headers, json=payload)
+        response = self.http.put(url, headers=headers, json=payload)
         response.raise_for_status()
         return response.json()
 
@@ -44,7 +50,7 @@ class EbayAPI:
         token = self._get_access_token()
         url = f'{self.base_url}/sell/inventory/v1/inventory_item/{payload["sku"]}/offer'
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-        response = requests.post(url, headers=headers, json=payload)
+        response = self.http.post(url, headers=headers, json=payload)
         response.raise_for_status()
         return response.json()
 
@@ -52,7 +58,7 @@ class EbayAPI:
         token = self._get_access_token()
         url = f'{self.base_url}/sell/inventory/v1/inventory_item/{offer_id}/offer'
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-        response = requests.post(url, headers=headers)
+        response = self.http.post(url, headers=headers)
         response.raise_for_status()
         return response.json()
 
@@ -61,7 +67,7 @@ class EbayAPI:
         url = f'{self.base_url}/sell/inventory/v1/inventory_item/{sku}'
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
         payload = {'availability': {'shipToLocationAvailability': {'quantity': qty}}}
-        response = requests.patch(url, headers=headers, json=payload)
+        response = self.http.patch(url, headers=headers, json=payload)
         response.raise_for_status()
         return response.json()
 
@@ -69,6 +75,6 @@ class EbayAPI:
         token = self._get_access_token()
         url = f'{self.base_url}/sell/orders/v1/order'
         headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
-        response = requests.get(url, headers=headers)
+        response = self.http.get(url, headers=headers)
         response.raise_for_status()
         return response.json()
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Dict, Optional
 
 class APIConfig(BaseModel):
     app_key: str = Field(..., description="API key for the application")
@@ -9,9 +9,16 @@ class EnvironmentConfig(BaseModel):
     production: APIConfig
     sandbox: APIConfig
 
+class HTTPConfig(BaseModel):
+    pool_maxsize: int = Field(10, description="Keep-alive connections per host")
+    connect_timeout: float = Field(5, description="Seconds to wait for a connection")
+    read_timeout: float = Field(30, description="Seconds to wait for a response")
+    host_limits: Dict[str, int] = Field(default_factory=dict, description="Per-host overrides of pool_maxsize")
+
 class Config(BaseModel):
     ebay: EnvironmentConfig
     aliexpress: EnvironmentConfig
+    http: HTTPConfig = Field(default_factory=HTTPConfig)
     markup_percent: float = Field(30.0, description="Default markup percentage for products")
     sync_interval_hours: int = Field(6, description="Interval for syncing stocks in hours")
     use_sandbox: bool = Field(True, description="Use sandbox environment for testing")
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""Shared keep-alive HTTP session pool for the marketplace API clients."""
+import threading
+
+import requests
+
+
+class SessionPool:
+    """Process-wide keep-alive HTTP connection pool shared by every API client.
+
+    Each thread gets its own `requests.Session` (sessions are not thread-safe),
+    but all sessions mount the same per-host `HTTPAdapter`s, so TCP/TLS
+    connections to a host are reused across threads and `DropshipWorker`
+    instances. `pool_block=True` makes `maxsize` a hard per-host limit: extra
+    callers wait for a free connection instead of opening throwaway ones.
+    `stats()` reports counters kept by the pool itself. `concurrent_requests`
+    counts callers inside `request()`, including those still waiting for a
+    connection, so a `peak_concurrent_requests` above `maxsize` means callers
+    queued for one.
+    """
+
+    def __init__(self, maxsize=10, connect_timeout=5, read_timeout=30, host_limits=None):
+        self.maxsize = int(maxsize)
+        self.timeout = (float(connect_timeout), float(read_timeout))
+        self._host_limits = dict(host_limits or {})
+        self._adapters = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def set_host_limit(self, host: str, maxsize: int):
+        """Cap concurrent connections to `host` (e.g. 'https://api.ebay.com')."""
+        with self._lock:
+            self._host_limits[host] = int(maxsize)
+            self._adapters.pop(host, None)
+            self._local = threading.local()
+
+    def _adapter(self, host):
+        with self._lock:
+            adapter = self._adapters.get(host)
+            if adapter is None:
+                size = self._host_limits.get(host, self.maxsize)
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size, pool_block=True)
+                self._adapters[host] = adapter
+            return adapter
+
+    def session(self, host: str):
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        sess = sessions.get(host)
+        if sess is None:
+            sess = requests.Session()
+            sess.headers['Connection'] = 'keep-alive'
+            sess.mount(host, self._adapter(host))
+            sessions[host] = sess
+        return sess
+
+    def request(self, method: str, url: str, **kwargs):
+        parts = requests.utils.urlparse(url)
+        host = f'{parts.scheme}://{parts.netloc}'
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            st = self._stats.setdefault(host, {'requests': 0, 'errors': 0, 'concurrent_requests': 0,
+                                               'peak_concurrent_requests': 0})
+            st['requests'] += 1
+            st['concurrent_requests'] += 1
+            st['peak_concurrent_requests'] = max(st['peak_concurrent_requests'], st['concurrent_requests'])
+        try:
+            return self.session(host).request(method, url, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                st['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                st['concurrent_requests'] -= 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def stats(self):
+        """Per-host request, error and concurrency counters plus `maxsize`, for sizing the pool."""
+        with self._lock:
+            return {host: dict(st, maxsize=self._host_limits.get(host, self.maxsize))
+                    for host, st in self._stats.items()}
+
+
+_SESSION_POOL = None
+_SESSION_POOL_LOCK = threading.Lock()
+
+
+def get_session_pool(cfg=None):
+    """Return the process-wide SessionPool, created from the `http` section of `cfg` on first use."""
+    global _SESSION_POOL
+    with _SESSION_POOL_LOCK:
+        if _SESSION_POOL is None:
+            http = (cfg or {}).get('http') or {}
+            _SESSION_POOL = SessionPool(
+                maxsize=http.get('pool_maxsize', 10),
+                connect_timeout=http.get('connect_timeout', 5),
+                read_timeout=http.get('read_timeout', 30),
+                host_limits=http.get('host_limits'),
+            )
+        return _SESSION_POOL
@@ -11,13 +11,14 @@ Replace placeholder scopes and endpoints if eBay changes their API.
 """
 
 import os
+import sys
 import json
 import time
 import logging
 import threading
 import requests
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
 from cryptography.fernet import Fernet
 import tkinter as tk
@@ -30,11 +31,15 @@ from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
 import matplotlib.pyplot as plt
 import base64
+import copy
 import unittest
 from unittest import mock
 
+import config_service
+
 # Paths
 APP_DIR = os.path.dirname(__file__) or '.'
+AUTOMATOR_DIR = os.path.join(APP_DIR, 'dropship-automator')
 KEY_FILE = os.path.join(APP_DIR, 'secret.key')
 CONFIG_FILE = os.path.join(APP_DIR, 'config.enc')
 DB_FILE = os.path.join(APP_DIR, 'dropship.db')
@@ -59,6 +64,11 @@ DEFAULTS = {
     'max_retries': 3,
     'retry_backoff_seconds': 2,
     'use_sandbox': True,
+    'http_pool_maxsize': 10,
+    'http_host_limits': {},  # e.g. {'https://api.ebay.com': 20}; other hosts use http_pool_maxsize
+    'http_connect_timeout': 5,
+    'http_read_timeout': 30,
+    'order_poll_seconds': 120,
 }
 
 # eBay OAuth scopes we'll request for sandbox (adjust as needed)
@@ -91,27 +101,19 @@ def decrypt_config(blob: bytes):
     return json.loads(FERNET.decrypt(blob).decode('utf-8'))
 
 
+CONFIG = config_service.ConfigService(CONFIG_FILE, DEFAULTS, encrypt_config, decrypt_config)
+
+
 def save_config(cfg: dict):
-    with open(CONFIG_FILE, 'wb') as f:
-        f.write(encrypt_config(cfg))
-    logger.info('Config saved (encrypted)')
+    CONFIG.save(cfg)
 
 
 def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        save_config(DEFAULTS.copy())
-        return DEFAULTS.copy()
-    try:
-        with open(CONFIG_FILE, 'rb') as f:
-            blob = f.read()
-        cfg = decrypt_config(blob)
-        merged = DEFAULTS.copy()
-        merged.update(cfg)
-        return merged
-    except Exception as e:
-        logger.exception('Failed to load config: %s', e)
-        save_config(DEFAULTS.copy())
-        return DEFAULTS.copy()
+    return CONFIG.load()
+
+
+def update_config(fn):
+    return CONFIG.update(fn)
 
 # --------------------- DB init ---------------------
 
@@ -120,6 +122,12 @@ def init_db():
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS products (id INTEGER PRIMARY KEY AUTOINCREMENT, ali_product_id TEXT UNIQUE, title TEXT, ebay_item_id TEXT, price REAL, qty INTEGER, last_sync TIMESTAMP, raw TEXT)''')
     c.execute('''CREATE TABLE IF NOT EXISTS prices (sku TEXT PRIMARY KEY, price REAL)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS orders (order_id TEXT PRIMARY KEY, creation_date TEXT, last_modified TEXT, fulfillment_status TEXT, payment_status TEXT, buyer TEXT, total REAL, currency TEXT, raw TEXT)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_orders_last_modified ON orders(last_modified)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS order_line_items (line_item_id TEXT PRIMARY KEY, order_id TEXT REFERENCES orders(order_id), sku TEXT, legacy_item_id TEXT, title TEXT, quantity INTEGER, price REAL, currency TEXT, fulfillment_status TEXT)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_order_line_items_order ON order_line_items(order_id)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_order_line_items_sku ON order_line_items(sku)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)''')
     conn.commit()
     conn.close()
 
@@ -127,7 +135,8 @@ init_db()
 
 # --------------------- retry decorator ---------------------
 
-def retry(max_retries=3, backoff=2):
+def retry(max_retries=3, backoff=2, no_retry=()):
+    """Retry `func` with linear backoff; exceptions in `no_retry` are raised at once."""
     def deco(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -135,6 +144,8 @@ def retry(max_retries=3, backoff=2):
             while True:
                 try:
                     return func(*args, **kwargs)
+                except no_retry:
+                    raise
                 except Exception as e:
                     attempt += 1
                     logger.warning('Attempt %s failed for %s: %s', attempt, func.__name__, e)
@@ -145,6 +156,32 @@ def retry(max_retries=3, backoff=2):
         return wrapper
     return deco
 
+# --------------------- HTTP session pool ---------------------
+
+# SessionPool lives in the dropship-automator package (src/utils/http.py); this
+# script only builds the process-wide instance from its flat config keys.
+if AUTOMATOR_DIR not in sys.path:
+    sys.path.insert(0, AUTOMATOR_DIR)
+from src.utils.http import SessionPool
+
+_SESSION_POOL = None
+_SESSION_POOL_LOCK = threading.Lock()
+
+
+def get_session_pool(cfg=None):
+    """Return the process-wide SessionPool, creating it from `cfg` on first use."""
+    global _SESSION_POOL
+    with _SESSION_POOL_LOCK:
+        if _SESSION_POOL is None:
+            cfg = cfg or DEFAULTS
+            _SESSION_POOL = SessionPool(
+                maxsize=cfg.get('http_pool_maxsize', 10),
+                connect_timeout=cfg.get('http_connect_timeout', 5),
+                read_timeout=cfg.get('http_read_timeout', 30),
+                host_limits=cfg.get('http_host_limits'),
+            )
+        return _SESSION_POOL
+
 # --------------------- AliExpress API (simulated) ---------------------
 
 class AliExpressAPI:
@@ -152,6 +189,7 @@ class AliExpressAPI:
         self.key = cfg.get('ali_app_key')
         self.secret = cfg.get('ali_app_secret')
         self.base = 'http://gw.api.taobao.com/router/rest'
+        self.http = get_session_pool(cfg)
 
     @retry(max_retries=3, backoff=2)
     def fetch_product(self, ali_id: str):
@@ -182,6 +220,10 @@ class AliExpressAPI:
 
 # --------------------- eBay API (sandbox integration) ---------------------
 
+class EbayAuthError(requests.HTTPError):
+    """eBay answered 401: the access token expired early or was revoked."""
+
+
 class EbayAPI:
     def __init__(self, cfg):
         self.client_id = cfg.get('ebay_client_id')
@@ -190,10 +232,16 @@ class EbayAPI:
         self.token_expires = cfg.get('ebay_token_expires', 0)
         self.use_sandbox = cfg.get('use_sandbox', True)
         self.base = 'https://api.sandbox.ebay.com' if self.use_sandbox else 'https://api.ebay.com'
+        self.http = get_session_pool(cfg)
 
     def needs_token(self):
         return not self.token or time.time() > (self.token_expires - 60)
 
+    def ensure_token(self):
+        if self.needs_token():
+            self.obtain_app_token()
+        return self.token
+
     def obtain_app_token(self, scopes=None):
         scopes = scopes or EBAY_SCOPES
         token_url = f'{self.base}/identity/v1/oauth2/token'
@@ -207,17 +255,14 @@ class EbayAPI:
             'scope': ' '.join(scopes)
         }
         logger.info('Requesting eBay app token (sandbox)')
-        resp = requests.post(token_url, headers=headers, data=data, timeout=10)
+        resp = self.http.post(token_url, headers=headers, data=data)
         resp.raise_for_status()
         j = resp.json()
         self.token = j.get('access_token')
         expires_in = j.get('expires_in', 7200)
         self.token_expires = time.time() + int(expires_in)
         # persist token in config
-        cfg = load_config()
-        cfg['ebay_token'] = self.token
-        cfg['ebay_token_expires'] = self.token_expires
-        save_config(cfg)
+        update_config(lambda cfg: cfg.update(ebay_token=self.token, ebay_token_expires=self.token_expires))
         logger.info('Obtained eBay token, expires in %s seconds', expires_in)
         return self.token
 
@@ -225,7 +270,7 @@ class EbayAPI:
     def create_inventory_item(self, sku: str, payload: dict):
         url = f'{self.base}/sell/inventory/v1/inventory_item/{sku}'
         headers = {'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json'}
-        resp = requests.put(url, headers=headers, json=payload, timeout=15)
+        resp = self.http.put(url, headers=headers, json=payload)
         resp.raise_for_status()
         return resp.json()
 
@@ -233,7 +278,7 @@ class EbayAPI:
     def create_offer(self, payload: dict):
         url = f'{self.base}/sell/inventory/v1/offer'
         headers = {'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json'}
-        resp = requests.post(url, headers=headers, json=payload, timeout=15)
+        resp = self.http.post(url, headers=headers, json=payload)
         resp.raise_for_status()
         return resp.json()
 
@@ -241,7 +286,7 @@ class EbayAPI:
     def publish_offer(self, offer_id: str):
         url = f'{self.base}/sell/inventory/v1/offer/{offer_id}/publish'
         headers = {'Authorization': f'Bearer {self.token}'}
-        resp = requests.post(url, headers=headers, timeout=15)
+        resp = self.http.post(url, headers=headers)
         resp.raise_for_status()
         return resp.json()
 
@@ -250,17 +295,176 @@ class EbayAPI:
         url = f'{self.base}/sell/inventory/v1/inventory_item/{sku}'
         headers = {'Authorization': f'Bearer {self.token}', 'Content-Type': 'application/json'}
         payload = {'availability': {'shipToLocationAvailability': {'quantity': qty}}}
-        resp = requests.put(url, headers=headers, json=payload, timeout=15)
+        resp = self.http.put(url, headers=headers, json=payload)
         resp.raise_for_status()
         return resp.json()
 
-    @retry(max_retries=3, backoff=2)
-    def get_orders(self):
+    def get_orders(self, modified_since=None):
+        return list(self.iter_orders(modified_since=modified_since))
+
+    def iter_orders(self, modified_since=None, page_size=200):
+        """Yield orders page by page, following the `next` links.
+
+        `modified_since` is an eBay timestamp (2024-01-31T08:25:43.511Z); only
+        orders modified at or after it are returned.
+        """
         url = f'{self.base}/sell/fulfillment/v1/order'
+        params = {'limit': page_size}
+        if modified_since:
+            params['filter'] = f'lastmodifieddate:[{modified_since}..]'
+        while url:
+            page = self._get_orders_page(url, params)
+            yield from page.get('orders', [])
+            # `next` already carries the filter and offset
+            url, params = page.get('next'), None
+
+    @retry(max_retries=3, backoff=2, no_retry=(EbayAuthError,))
+    def _get_orders_page(self, url, params=None):
         headers = {'Authorization': f'Bearer {self.token}'}
-        resp = requests.get(url, headers=headers, timeout=15)
+        resp = self.http.get(url, headers=headers, params=params)
+        if resp.status_code == 401:
+            # retrying with the same token can't help; the caller mints a new one
+            raise EbayAuthError('eBay rejected the access token (401)', response=resp)
         resp.raise_for_status()
-        return resp.json().get('orders', [])
+        return resp.json()
+
+# --------------------- Order ingestion ---------------------
+
+EBAY_TS_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+
+
+def _ebay_ts(dt: datetime):
+    # eBay wants millisecond precision: 2024-01-31T08:25:43.511Z
+    return dt.strftime(EBAY_TS_FORMAT)[:-4] + 'Z'
+
+
+def _parse_ebay_ts(value: str):
+    for fmt in (EBAY_TS_FORMAT, '%Y-%m-%dT%H:%M:%SZ'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f'Unrecognised eBay timestamp: {value}')
+
+
+class OrderIngestor:
+    """Pulls new/changed eBay orders into the `orders` and `order_line_items` tables.
+
+    Each run asks the Fulfillment API only for orders modified since the
+    stored high-water mark (minus a small overlap for late writes on eBay's
+    side), pages through them and upserts them in batches. Pages are not
+    ordered by modification time, so the mark only advances once a run has
+    seen every page; an interrupted run is simply repeated (the upserts are
+    idempotent). A quiet store costs one empty page per poll.
+    """
+
+    STATE_KEY = 'orders_last_modified'
+
+    def __init__(self, ebay, db_path=None, batch_size=100, overlap_seconds=120, initial_days=90):
+        self.ebay = ebay
+        self.db_path = db_path or DB_FILE
+        self.batch_size = batch_size
+        self.overlap_seconds = overlap_seconds
+        self.initial_days = initial_days
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def high_water_mark(self, conn):
+        row = conn.execute('SELECT value FROM sync_state WHERE key=?', (self.STATE_KEY,)).fetchone()
+        return row[0] if row else None
+
+    def run_once(self):
+        # the poller outlives the 2 h app token, so check it every run like import_single does
+        self.ebay.ensure_token()
+        try:
+            return self._ingest()
+        except EbayAuthError:
+            logger.warning('Order ingestion: eBay token rejected, minting a new one')
+            self.ebay.obtain_app_token()
+            return self._ingest()
+
+    def _ingest(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            hwm = self.high_water_mark(conn)
+            if hwm:
+                since = _parse_ebay_ts(hwm) - timedelta(seconds=self.overlap_seconds)
+            else:
+                since = datetime.utcnow() - timedelta(days=self.initial_days)
+            stats = {'orders': 0, 'line_items': 0}
+            batch = []
+            for order in self.ebay.iter_orders(modified_since=_ebay_ts(since)):
+                batch.append(order)
+                if len(batch) >= self.batch_size:
+                    hwm = self._write_batch(conn, batch, hwm, stats)
+                    batch = []
+            if batch:
+                hwm = self._write_batch(conn, batch, hwm, stats)
+            if hwm:
+                with conn:
+                    conn.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (self.STATE_KEY, hwm))
+            logger.info('Order ingestion: %s', stats)
+            return stats
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, orders, hwm, stats):
+        order_rows, item_rows = [], []
+        for o in orders:
+            total = (o.get('pricingSummary') or {}).get('total') or {}
+            modified = o.get('lastModifiedDate') or o.get('creationDate')
+            order_rows.append((o['orderId'], o.get('creationDate'), modified,
+                               o.get('orderFulfillmentStatus'), o.get('orderPaymentStatus'),
+                               (o.get('buyer') or {}).get('username'),
+                               float(total['value']) if total.get('value') is not None else None,
+                               total.get('currency'), json.dumps(o)))
+            for li in o.get('lineItems') or []:
+                cost = li.get('lineItemCost') or {}
+                item_rows.append((li['lineItemId'], o['orderId'], li.get('sku'), li.get('legacyItemId'),
+                                  li.get('title'), int(li.get('quantity') or 0),
+                                  float(cost['value']) if cost.get('value') is not None else None,
+                                  cost.get('currency'), li.get('lineItemFulfillmentStatus')))
+            if modified and (hwm is None or _parse_ebay_ts(modified) > _parse_ebay_ts(hwm)):
+                hwm = modified
+        with conn:
+            conn.executemany('''
+                INSERT INTO orders (order_id, creation_date, last_modified, fulfillment_status, payment_status,
+                                    buyer, total, currency, raw)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(order_id) DO UPDATE SET
+                    last_modified=excluded.last_modified, fulfillment_status=excluded.fulfillment_status,
+                    payment_status=excluded.payment_status, buyer=excluded.buyer, total=excluded.total,
+                    currency=excluded.currency, raw=excluded.raw
+            ''', order_rows)
+            conn.executemany('''
+                INSERT INTO order_line_items (line_item_id, order_id, sku, legacy_item_id, title, quantity,
+                                              price, currency, fulfillment_status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(line_item_id) DO UPDATE SET
+                    sku=excluded.sku, title=excluded.title, quantity=excluded.quantity, price=excluded.price,
+                    currency=excluded.currency, fulfillment_status=excluded.fulfillment_status
+            ''', item_rows)
+        stats['orders'] += len(order_rows)
+        stats['line_items'] += len(item_rows)
+        return hwm
+
+    def start(self, interval_seconds):
+        logger.info('Starting order ingestion every %s seconds', interval_seconds)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval_seconds,), name='order-ingest', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        logger.info('Stopping order ingestion')
+        self._stop_event.set()
+
+    def _loop(self, interval_seconds):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Order ingestion run failed')
+            self._stop_event.wait(interval_seconds)
 
 # --------------------- Business logic (similar to clean full) ---------------------
 
@@ -275,15 +479,21 @@ class DropshipWorker:
         self.ali = AliExpressAPI(cfg)
         self.ebay = EbayAPI(cfg)
         self.sync_interval = int(cfg.get('sync_interval_hours', 6)) * 3600
+        self.orders = OrderIngestor(self.ebay)
+        self.order_poll_seconds = int(cfg.get('order_poll_seconds', 120))
+
+    def start_order_ingestion(self):
+        self.orders.start(self.order_poll_seconds)
+
+    def stop_order_ingestion(self):
+        self.orders.stop()
 
     def import_single(self, ali_id: str, markup_percent: float = None):
         product_raw = self.ali.fetch_product(ali_id)
         prod = self._normalize_ali_product(product_raw)
         if markup_percent is None:
             markup_percent = self.cfg.get('markup_percent', 30.0)
-        # ensure token
-        if self.ebay.needs_token():
-            self.ebay.obtain_app_token()
+        self.ebay.ensure_token()
         return self._create_ebay_listing(prod, markup_percent)
 
     def _normalize_ali_product(self, raw):
@@ -396,7 +606,7 @@ def run_config_wizard_if_needed(root, cfg):
 def ensure_build_script():
     content = f"""@echo off
 REM Build Dropship Automator into a single executable using PyInstaller
-pyinstaller --noconfirm --onefile --windowed --add-data "{KEY_FILE};." --add-data "{CONFIG_FILE};." dropship_automator_sandbox_ready.py
+pyinstaller --noconfirm --onefile --windowed --paths "{AUTOMATOR_DIR}" --add-data "{KEY_FILE};." --add-data "{CONFIG_FILE};." dropship_automator_sandbox_ready.py
 pause
 """
     try:
@@ -409,7 +619,7 @@ pause
 # -------------------- Unit tests (skeleton) --------------------
 
 class TestEbayOAuth(unittest.TestCase):
-    @mock.patch('requests.post')
+    @mock.patch('requests.Session.request')
     def test_obtain_app_token_success(self, mock_post):
         # simulate token response
         mock_post.return_value = mock.Mock(status_code=200)
@@ -434,6 +644,14 @@ def main():
     # create build script
     ensure_build_script()
 
+    # keep the orders table current while the app is open
+    worker = None
+    if cfg.get('ebay_client_id') and cfg.get('ebay_client_secret'):
+        worker = DropshipWorker(cfg)
+        worker.start_order_ingestion()
+    else:
+        logger.info('eBay credentials missing; order ingestion not started')
+
     # start main GUI app
     from tkinter import Tk
     app_root = Tk()
@@ -445,6 +663,8 @@ def main():
     w = tk.Label(app_root, text='Sandbox-ready utilities installed. Run Dropship Automator (clean full) to continue.', padx=20, pady=20)
     w.pack()
     app_root.mainloop()
+    if worker is not None:
+        worker.stop_order_ingestion()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,39 @@
+import copy
+import os
+import sys
+import time
+
+import pytest
+
+# Make the top-level modules (Global_Marketplace_Bridge.py, apps/) importable
+# when pytest is run from the repo root.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def make_cfg():
+    import Global_Marketplace_Bridge as gmb
+    cfg = copy.deepcopy(gmb.DEFAULTS)
+    cfg['ebay']['sandbox']['token'] = 'TEST'
+    cfg['ebay']['sandbox']['token_expires'] = time.time() + 3600
+    return cfg
+
+
+@pytest.fixture(autouse=True)
+def _unlimited_rate_limiter(monkeypatch):
+    # The simulated API calls still draw from the marketplace quotas; don't let
+    # the default buckets throttle the test run.
+    import Global_Marketplace_Bridge as gmb
+    monkeypatch.setattr(gmb, 'RATE_LIMITER', gmb.RateLimiter({}))
+
+
+@pytest.fixture
+def temp_db(request, monkeypatch, tmp_path):
+    # A fresh app database per test; runs before TestCase.setUp and exposes the directory as `self.tmp_dir`.
+    import Global_Marketplace_Bridge as gmb
+    monkeypatch.setattr(gmb, 'DB_FILE', str(tmp_path / 'test.db'))
+    if request.instance is not None:
+        request.instance.tmp_dir = str(tmp_path)
+    gmb.init_db()
+    gmb.PRODUCT_CACHE.clear()
+    yield
+    gmb.get_storage().close_all()
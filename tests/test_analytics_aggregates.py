@@ -0,0 +1,61 @@
+import sqlite3
+import unittest
+
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestProductAggregates(unittest.TestCase):
+    def setUp(self):
+        self.analytics = gmb.Analytics()
+
+    def full_scan(self):
+        row = gmb.get_storage().query_one('SELECT COUNT(*), SUM(price), SUM(qty) FROM products')
+        return {'count': row[0] or 0, 'total_value': round(row[1] or 0.0, 2), 'total_qty': row[2] or 0}
+
+    def insert(self, ali_id, price, qty, marketplace='EBAY-AU', category='Toys'):
+        gmb.get_storage().execute(
+            'INSERT OR REPLACE INTO products (ali_product_id, price, qty, marketplace, category) VALUES (?, ?, ?, ?, ?)',
+            (ali_id, price, qty, marketplace, category))
+
+    def test_listing_and_sync_keep_summary_current(self):
+        worker = gmb.DropshipWorker(make_cfg())
+        for i in range(5):
+            worker.import_single(str(i))
+        self.assertEqual(self.analytics.dashboard_summary(), self.full_scan())
+        self.assertEqual(self.analytics.dashboard_summary()['count'], 5)
+        gmb.PRODUCT_CACHE.clear()
+        worker.sync_stocks_now()
+        self.assertEqual(self.analytics.dashboard_summary(), self.full_scan())
+
+    def test_replace_update_and_delete(self):
+        self.insert('1', 10.0, 2)
+        self.insert('2', 5.5, 1, category='Garden')
+        self.insert('1', 12.0, 3, marketplace='EBAY-US')  # REPLACE moves it to another marketplace
+        gmb.get_storage().execute("UPDATE products SET qty=9 WHERE ali_product_id='2'")
+        self.assertEqual(self.analytics.dashboard_summary(), {'count': 2, 'total_value': 17.5, 'total_qty': 12})
+        self.assertEqual(self.analytics.breakdown('marketplace'), {
+            'EBAY-AU': {'count': 1, 'total_value': 5.5, 'total_qty': 9},
+            'EBAY-US': {'count': 1, 'total_value': 12.0, 'total_qty': 3},
+        })
+        gmb.get_storage().execute("DELETE FROM products WHERE ali_product_id='1'")
+        self.assertEqual(self.analytics.breakdown('marketplace'), {'EBAY-AU': {'count': 1, 'total_value': 5.5, 'total_qty': 9}})
+        self.assertEqual(list(self.analytics.breakdown('category')), ['Garden'])
+
+    def test_existing_catalog_is_backfilled(self):
+        gmb.get_storage().close_all()
+        conn = sqlite3.connect(gmb.DB_FILE)
+        conn.executescript('DROP TRIGGER products_agg_insert; DROP TABLE product_aggregates;')
+        conn.execute("INSERT INTO products (ali_product_id, price, qty) VALUES ('a', 3.0, 4), ('b', 2.0, 1)")
+        conn.commit()
+        conn.close()
+        gmb.init_db()
+        self.assertEqual(self.analytics.dashboard_summary(), {'count': 2, 'total_value': 5.0, 'total_qty': 5})
+        self.assertEqual(self.analytics.breakdown('category'), {'': {'count': 2, 'total_value': 5.0, 'total_qty': 5}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+import bench_hot_path  # noqa: E402
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_suite_runs_and_compares_against_its_own_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            self.assertEqual(bench_hot_path.main(['--sizes', '50', '--repeat', '1', '--save', path]), 0)
+            with open(path, encoding='utf-8') as f:
+                baseline = json.load(f)
+            self.assertEqual(set(baseline['results']), {f'{c}@50' for c in bench_hot_path.CASES})
+
+            slower = {k: dict(v, us_per_op=v['us_per_op'] * 10) for k, v in baseline['results'].items()}
+            regressions = bench_hot_path.compare(slower, baseline, threshold=0.2)
+            self.assertEqual(len(regressions), len(bench_hot_path.CASES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from unittest import mock
+
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+
+def node(cid, name, children=()):
+    n = {'category': {'categoryId': cid, 'categoryName': name}}
+    if children:
+        n['childCategoryTreeNodes'] = list(children)
+    else:
+        n['leafCategoryTreeNode'] = True
+    return n
+
+
+TREE = {'categoryTreeId': '15', 'rootCategoryNode': node('0', 'Root', [
+    node('15032', 'Mobile Phones & Accessories', [
+        node('20349', 'Cases, Covers & Skins'), node('123417', 'Chargers & Cradles'),
+        node('9355', 'Mobile & Smart Phones')]),
+    node('11450', 'Clothing, Shoes & Accessories', [node('63861', 'Dresses'), node('79720', 'Sunglasses')]),
+    node('11700', 'Home & Garden', [node('20625', 'Kettles'), node('20716', 'Lamps')]),
+    node('293', 'Consumer Electronics', [node('112529', 'Earphones & Headphones')]),
+])}
+
+
+def leaves():
+    return [(cid, path) for cid, _, _, path, leaf in gmb.flatten_category_tree(TREE) if leaf]
+
+
+class TestCategoryIndex(unittest.TestCase):
+    def test_flatten_builds_paths_below_root(self):
+        rows = {r[0]: r for r in gmb.flatten_category_tree(TREE)}
+        self.assertEqual(rows['20349'], ('20349', '15032', 'Cases, Covers & Skins',
+                                         'Mobile Phones & Accessories > Cases, Covers & Skins', 1))
+        self.assertEqual(rows['15032'][4], 0)
+        self.assertNotIn('0', rows)
+
+    def test_matches_ali_paths_titles_and_misspellings(self):
+        index = gmb.CategoryIndex(leaves())
+        cases = {
+            'Phones & Telecommunications > Mobile Phone Accessories > Phone Case & Covers': '20349',
+            "Women's Clothing > Dresses": '63861',
+            'Wireless Earphone Bluetooth Headphones': '112529',
+            'Electric Kettle 1.7L': '20625',
+            'Sunglases': '79720',
+        }
+        for query, expected in cases.items():
+            self.assertEqual(index.match(query)[0], expected, query)
+
+    def test_weak_or_unrelated_queries_do_not_match(self):
+        index = gmb.CategoryIndex(leaves())
+        # a first-level Ali category only shares ancestor words with the leaves
+        self.assertIsNone(index.match('Home & Garden'))
+        self.assertIsNone(index.match('Gizmo'))
+        self.assertIsNone(index.match(''))
+
+    def test_results_are_memoized_per_query(self):
+        index = gmb.CategoryIndex(leaves())
+        with mock.patch.object(index, '_match', wraps=index._match) as inner:
+            index.match('Phone Case')
+            index.match('  phone case ')
+            index.match('Dresses')
+        self.assertEqual(inner.call_count, 2)
+
+    def test_only_shortlisted_leaves_are_compared(self):
+        filler = [(str(100000 + i), f'Filler {i} > Widget {i}') for i in range(2000)]
+        index = gmb.CategoryIndex(filler + leaves())
+        with mock.patch.object(gmb.difflib, 'SequenceMatcher', wraps=gmb.difflib.SequenceMatcher) as sm:
+            self.assertEqual(index.match('Phone Case & Covers')[0], '20349')
+        self.assertLessEqual(sm.call_count, index.shortlist)
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestMapCategory(unittest.TestCase):
+
+    def test_aliases_without_a_stored_tree(self):
+        self.assertIsNone(gmb.get_category_index('EBAY-AU'))
+        self.assertEqual(gmb.map_category('Home & Garden'), '11700')
+        self.assertIsNone(gmb.map_category(''))
+
+    def test_stored_tree_per_marketplace(self):
+        self.assertEqual(gmb.save_category_tree('EBAY_AU', TREE), 8)
+        self.assertEqual(len(gmb.get_category_index('EBAY-AU')), 8)
+        self.assertIsNone(gmb.get_category_index('EBAY-US'))
+        self.assertEqual(gmb.map_category('Mobile Phone Accessories > Phone Case', marketplace='EBAY-AU'), '20349')
+        # no good match for the category path -> title
+        self.assertEqual(gmb.map_category('Kitchen', 'Cordless kettle', 'EBAY-AU'), '20625')
+        self.assertIsNone(gmb.map_category('Kitchen', 'Gizmo', 'EBAY-AU'))
+        self.assertEqual(gmb.map_category('Phones & Telecommunications', marketplace='EBAY-US'), '15032')
+
+    def test_exact_alias_beats_the_stored_tree(self):
+        gmb.save_category_tree('EBAY-AU', TREE)
+        self.assertEqual(gmb.map_category('Home & Garden', 'Cordless kettle', 'EBAY-AU'), '11700')
+        self.assertEqual(gmb.map_category('Phones & Telecommunications', marketplace='EBAY-AU'), '15032')
+
+    def test_refresh_replaces_tree_and_listing_uses_it(self):
+        gmb.save_category_tree('EBAY-AU', TREE)
+        stale = gmb.get_category_index('EBAY-AU')
+        worker = gmb.DropshipWorker(make_cfg())
+        small = {'rootCategoryNode': node('0', 'Root', [node('9355', 'Cell Phones & Smartphones')])}
+        with mock.patch.object(worker.ebay, 'get_category_tree', return_value=small):
+            self.assertEqual(worker.refresh_category_tree(), 1)
+        self.assertIsNot(gmb.get_category_index('EBAY-AU'), stale)
+        # simulated product: 'Phones & Telecommunications', 'Sample Product 42'; drop the alias so the tree decides
+        with mock.patch.object(worker.ebay, 'create_offer', wraps=worker.ebay.create_offer) as create_offer, \
+                mock.patch.dict(gmb.ALI_TO_EBAY, clear=True):
+            worker.import_single('42')
+        self.assertEqual(create_offer.call_args[0][0]['categoryId'], '9355')
+
+
+if __name__ == '__main__':
+    unittest.main()
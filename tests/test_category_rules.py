@@ -0,0 +1,126 @@
+import os
+import tempfile
+import time
+import json
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from apps.core_api import category_rules as cr
+from apps.core_api import main as core_api
+
+
+class AutomatonTests(unittest.TestCase):
+    def test_matches_whole_words_and_overlapping_phrases(self):
+        a = cr.Automaton([('case', 'C', 1.0), ('phone case', 'PC', 2.0), ('phone', 'P', 1.0),
+                          ('a b c', 'ABC', 1.0), ('b c d', 'BCD', 1.0)])
+        found = sorted(a.categories[i] for i in a.find(cr.tokenize('Phone Case for a showcase')))
+        self.assertEqual(found, ['C', 'P', 'PC'])
+        found = sorted(a.categories[i] for i in a.find(cr.tokenize('a b c d')))
+        self.assertEqual(found, ['ABC', 'BCD'])
+
+    def test_scores_each_rule_once_at_best_field(self):
+        a = cr.Automaton([('laptop', '177', 1.0), ('bag', '31510', 1.0)])
+        scores = a.score({'title': 'laptop laptop', 'description': 'laptop bag'})
+        self.assertEqual(scores, {'177': 1.0, '31510': 0.3})
+
+
+class CategoryEngineTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.write('phrase,category_id,weight\nphone,15032,0.85\n')
+
+    def write(self, text):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_hot_reload_and_bad_file_keeps_rules(self):
+        engine = cr.CategoryEngine(self.path, check_interval=0)
+        self.assertEqual(engine.match('Cheap phone')['categoryId'], '15032')
+        self.write('# comment\nphrase,category_id,weight\nphone,9355,1.0\nearbuds,112529\n')
+        self.assertTrue(engine.reload())
+        self.assertEqual(engine.match('Cheap phone')['categoryId'], '9355')
+        self.assertEqual(engine.match('Wireless earbuds')['confidence'], 0.99)
+        self.write('phrase,category_id,weight\nbroken\n')
+        self.assertFalse(engine.reload())
+        self.assertEqual(engine.match('Cheap phone')['categoryId'], '9355')
+
+    def test_missing_file_keeps_rules(self):
+        engine = cr.CategoryEngine(self.path, check_interval=0)
+        os.remove(self.path)
+        with self.assertLogs(cr.logger, 'ERROR'):
+            self.assertFalse(engine.reload())
+        self.assertEqual(engine.match('Cheap phone')['categoryId'], '15032')
+        self.write('phrase,category_id,weight\nphone,9355,1.0\n')
+        self.assertTrue(engine.reload())
+        self.assertEqual(engine.match('Cheap phone')['categoryId'], '9355')
+
+    def test_background_reload_on_file_change(self):
+        engine = cr.CategoryEngine(self.path, check_interval=0)
+        self.write('phrase,category_id,weight\nphone,9355,1.0\nkettle,20625,1.0\n')
+        os.utime(self.path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+        deadline = time.time() + 5
+        while engine.match('electric kettle') is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(engine.match('electric kettle')['categoryId'], '20625')
+
+
+class MapCategoryEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(core_api.app)
+
+    def test_rule_match(self):
+        body = self.client.post('/map-category', json={'title': 'Silicone phone case for Samsung'}).json()
+        self.assertEqual((body['categoryId'], body['source']), ('20349', 'rule'))
+
+    def test_alias_and_fallback(self):
+        body = self.client.post('/map-category', json={'title': 'Gizmo', 'attrs': {'ali_first_level': 'Phones & Telecommunications'}}).json()
+        self.assertEqual((body['categoryId'], body['source']), ('15032', 'alias'))
+        body = self.client.post('/map-category', json={'title': 'Gizmo'}).json()
+        self.assertEqual(body['source'], 'fallback')
+
+    def test_shipped_rule_file_loads(self):
+        self.assertGreater(len(core_api.CATEGORY_ENGINE.automaton), 50)
+
+
+class MapCategoryBatchTests(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(core_api.app)
+
+    def post(self, content):
+        resp = self.client.post('/map-category/batch', content=content)
+        return resp, [json.loads(line) for line in resp.text.splitlines()] if resp.status_code == 200 else None
+
+    def test_ndjson_streams_in_order_and_scores_duplicates_once(self):
+        lines = [json.dumps({'title': 'Silicone Phone Case'}), '{not json', json.dumps({'description': 'x'}),
+                 json.dumps({'title': 'silicone  phone case!'}), json.dumps({'title': 'Gizmo'})]
+        with mock.patch.object(core_api.CATEGORY_ENGINE, 'match', wraps=core_api.CATEGORY_ENGINE.match) as match:
+            resp, rows = self.post('\n'.join(lines) + '\n')
+        self.assertEqual(resp.headers['content-type'], 'application/x-ndjson')
+        self.assertEqual([r['index'] for r in rows], [0, 1, 2, 3, 4])
+        self.assertEqual(rows[0]['categoryId'], '20349')
+        self.assertEqual(rows[3], dict(rows[0], index=3))
+        self.assertIn('error', rows[1])
+        self.assertIn('error', rows[2])
+        self.assertEqual(rows[4]['source'], 'fallback')
+        self.assertEqual(match.call_count, 2)
+
+    def test_json_array_matches_single_endpoint(self):
+        items = [{'title': 'Wireless earbuds'}, {'title': 'Gizmo', 'attrs': {'category': 'Computer & Office'}}]
+        resp, rows = self.post(json.dumps(items))
+        for item, row in zip(items, rows):
+            single = self.client.post('/map-category', json=item).json()
+            self.assertEqual({k: v for k, v in row.items() if k != 'index'}, single)
+
+    def test_rejects_oversized_and_malformed_batches(self):
+        with mock.patch.object(core_api, 'MAP_BATCH_MAX_ITEMS', 2):
+            resp, _ = self.post(json.dumps([{'title': 'a'}] * 3))
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self.post('[{"title": ')[0].status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
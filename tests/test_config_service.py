@@ -0,0 +1,103 @@
+import glob
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import config_service
+import dropship_automator_sandbox_ready as sandbox
+import Global_Marketplace_Bridge as gmb
+
+
+def gmb_service(path):
+    return config_service.ConfigService(path, gmb.DEFAULTS, gmb.encrypt_config, gmb.decrypt_config,
+                                        merge=gmb.deep_merge_dicts)
+
+
+def sandbox_service(path):
+    return config_service.ConfigService(path, sandbox.DEFAULTS, sandbox.encrypt_config, sandbox.decrypt_config)
+
+
+class TestConfigService(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'config.enc')
+        self.svc = gmb_service(self.path)
+
+    def test_missing_file_is_created_from_defaults(self):
+        snap = self.svc.snapshot()
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(snap['app']['markup_percent'], 30.0)
+
+    def test_snapshot_is_cached_until_file_changes(self):
+        self.svc.save(gmb.DEFAULTS)
+        with mock.patch.object(gmb, 'decrypt_config', wraps=gmb.decrypt_config) as dec:
+            fresh = gmb_service(self.path)
+            first = fresh.snapshot()
+            self.assertIs(fresh.snapshot(), first)
+            self.assertEqual(dec.call_count, 1)
+
+            cfg = self.svc.load()
+            cfg['app']['markup_percent'] = 55.0
+            self.svc.save(cfg)
+            self.assertEqual(fresh.snapshot()['app']['markup_percent'], 55.0)
+            self.assertEqual(dec.call_count, 2)
+
+    def test_snapshot_is_read_only_and_load_is_a_copy(self):
+        snap = self.svc.snapshot()
+        with self.assertRaises(TypeError):
+            snap['app']['markup_percent'] = 1.0
+        cfg = self.svc.load()
+        cfg['app']['markup_percent'] = 1.0
+        self.assertEqual(self.svc.snapshot()['app']['markup_percent'], 30.0)
+
+    def test_update_writes_atomically(self):
+        self.svc.update(lambda cfg: cfg['ebay']['user_tokens'].update(shop='R'))
+        self.assertEqual(self.svc.snapshot()['ebay']['user_tokens']['shop'], 'R')
+        self.assertEqual(glob.glob(os.path.join(self.tmp.name, '.config-*')), [])
+
+    def test_corrupt_file_is_quarantined_not_silently_reset(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a fernet token')
+        snap = self.svc.snapshot()
+        self.assertEqual(snap['app']['markup_percent'], 30.0)
+        quarantined = glob.glob(self.path + '.corrupt-*')
+        self.assertEqual(len(quarantined), 1)
+        with open(quarantined[0], 'rb') as f:
+            self.assertEqual(f.read(), b'not a fernet token')
+
+    def test_corrupt_file_keeps_last_good_config(self):
+        self.svc.update(lambda cfg: cfg['app'].update(markup_percent=42.0))
+        self.svc.snapshot()
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        self.assertEqual(self.svc.snapshot()['app']['markup_percent'], 42.0)
+
+    def test_snapshot_stats_under_the_lock(self):
+        self.svc.snapshot()
+        held = []
+        real_stat = self.svc._stat
+
+        def stat():
+            held.append(self.svc._lock._is_owned())
+            return real_stat()
+
+        with mock.patch.object(self.svc, '_stat', stat):
+            self.svc.snapshot()
+        self.assertEqual(held, [True])
+
+
+class TestSandboxConfigService(unittest.TestCase):
+    def test_shares_the_service_with_a_flat_merge(self):
+        self.assertIsInstance(sandbox.CONFIG, config_service.ConfigService)
+        with tempfile.TemporaryDirectory() as tmp:
+            svc = sandbox_service(os.path.join(tmp, 'config.enc'))
+            svc.update(lambda cfg: cfg.update(markup_percent=12.5))
+            fresh = sandbox_service(svc.path)
+            self.assertEqual(fresh.snapshot()['markup_percent'], 12.5)
+            self.assertEqual(fresh.snapshot()['sync_interval_hours'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
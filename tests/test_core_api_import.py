@@ -0,0 +1,254 @@
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from fastapi.testclient import TestClient
+
+from apps.core_api import main as core_api
+from apps.core_api.ebay_client import EbayClient, EbayError
+
+
+class FakeEbay:
+    """Inventory API stand-in for httpx.MockTransport; every call takes `latency` seconds.
+
+    `fail` maps a path fragment to responses (or exceptions to raise) served before the normal answer.
+    """
+
+    def __init__(self, latency=0.0, fail=None):
+        self.latency = latency
+        self.fail = fail or {}
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        self.calls.append((request.method, request.url.path))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        path = request.url.path
+        for key, responses in self.fail.items():
+            if key in path and responses:
+                resp = responses.pop(0)
+                if isinstance(resp, Exception):
+                    raise resp
+                return resp
+        if path.endswith('/oauth2/token'):
+            return httpx.Response(200, json={'access_token': 'tok', 'expires_in': 7200})
+        if request.method == 'PUT':
+            return httpx.Response(204)
+        if path.endswith('/publish'):
+            return httpx.Response(200, json={'listingId': 'L-' + path.split('/')[-2]})
+        if request.method == 'GET':
+            sku = request.url.params['sku']
+            return httpx.Response(200, json={'offers': [{'offerId': 'O-' + sku, 'sku': sku,
+                                                         'marketplaceId': request.url.params['marketplace_id']}]})
+        sku = json.loads(request.content)['sku']
+        return httpx.Response(201, json={'offerId': 'O-' + sku})
+
+    def count(self, suffix):
+        return sum(1 for _, path in self.calls if path.endswith(suffix))
+
+
+def make_client(fake, **kwargs):
+    return EbayClient('id', 'secret', transport=httpx.MockTransport(fake), backoff=0, **kwargs)
+
+
+def list_one(fake):
+    async def run():
+        client = make_client(fake)
+        try:
+            return await client.list_item('ALI-1', {}, {})
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+class TestEbayClient(unittest.TestCase):
+    def test_concurrent_imports_share_token_and_overlap(self):
+        fake = FakeEbay(latency=0.02)
+
+        async def run():
+            client = make_client(fake)
+            try:
+                return await asyncio.gather(*(client.list_item(f'ALI-{i}', {}, {}) for i in range(100)))
+            finally:
+                await client.aclose()
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+        self.assertEqual(results[7], {'offerId': 'O-ALI-7', 'listingId': 'L-O-ALI-7'})
+        self.assertEqual(fake.count('/oauth2/token'), 1)
+        self.assertEqual(len(fake.calls), 1 + 3 * 100)
+        self.assertGreater(fake.max_in_flight, 50)
+        # 301 sequential calls would take >6 s
+        self.assertLess(elapsed, 2.0)
+
+    def test_retries_throttling_then_surfaces_errors(self):
+        throttled = httpx.Response(429, headers={'Retry-After': '0'})
+        rejected = httpx.Response(400, json={'errors': [{'errorId': 25709, 'message': 'Invalid value for price'}]})
+        fake = FakeEbay(fail={'/inventory_item/': [throttled], '/offer': [rejected]})
+
+        async def run():
+            client = make_client(fake)
+            try:
+                await client.list_item('ALI-1', {}, {})
+            finally:
+                await client.aclose()
+
+        with self.assertRaises(EbayError) as ctx:
+            asyncio.run(run())
+        self.assertEqual(ctx.exception.status, 400)
+        self.assertIn('Invalid value for price', str(ctx.exception))
+        self.assertEqual(fake.count('/inventory_item/ALI-1'), 2)
+
+    def test_existing_offer_is_looked_up_and_published(self):
+        exists = httpx.Response(400, json={'errors': [{'errorId': 25002, 'message': 'Offer entity already exists'}]})
+        fake = FakeEbay(fail={'/sell/inventory/v1/offer': [exists]})
+        self.assertEqual(list_one(fake), {'offerId': 'O-ALI-1', 'listingId': 'L-O-ALI-1'})
+        self.assertIn(('GET', '/sell/inventory/v1/offer'), fake.calls)
+        self.assertEqual(fake.count('/publish'), 1)
+
+    def test_posts_retry_only_when_not_applied(self):
+        # 429 and a refused connection mean eBay never saw the POST
+        fake = FakeEbay(fail={'/publish': [httpx.Response(429), httpx.ConnectError('refused')]})
+        self.assertEqual(list_one(fake)['listingId'], 'L-O-ALI-1')
+        self.assertEqual(fake.count('/publish'), 3)
+
+        # after a 5xx or a read timeout the offer may exist already
+        for failure in (httpx.Response(503), httpx.ReadTimeout('slow')):
+            fake = FakeEbay(fail={'/sell/inventory/v1/offer': [failure]})
+            with self.assertRaises(EbayError):
+                list_one(fake)
+            self.assertEqual(fake.count('/sell/inventory/v1/offer'), 1)
+
+    def test_unauthorized_refreshes_token_once(self):
+        fake = FakeEbay(fail={'/publish': [httpx.Response(401)]})
+
+        async def run():
+            client = make_client(fake)
+            try:
+                first = await client.list_item('ALI-1', {}, {})
+                second = await client.list_item('ALI-2', {}, {})
+                return first, second
+            finally:
+                await client.aclose()
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first['listingId'], 'L-O-ALI-1')
+        self.assertEqual(second['listingId'], 'L-O-ALI-2')
+        self.assertEqual(fake.count('/oauth2/token'), 2)
+        self.assertEqual(fake.count('/publish'), 3)
+
+        fake = FakeEbay(fail={'/inventory_item/': [httpx.Response(401), httpx.Response(401)]})
+        with self.assertRaises(EbayError) as ctx:
+            list_one(fake)
+        self.assertEqual(ctx.exception.status, 401)
+        self.assertEqual(fake.count('/oauth2/token'), 2)
+
+    def test_missing_credentials(self):
+        async def run():
+            client = EbayClient('', '', transport=httpx.MockTransport(FakeEbay()))
+            try:
+                await client.token()
+            finally:
+                await client.aclose()
+
+        with self.assertRaises(EbayError):
+            asyncio.run(run())
+
+
+class TestLiveImportEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeEbay()
+        for patcher in (mock.patch.object(core_api, 'SIMULATION', False),
+                        mock.patch.object(core_api, 'EBAY_CLIENT', make_client(self.fake))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_lists_with_markup_and_mapped_category(self):
+        with TestClient(core_api.app) as client:
+            resp = client.post('/import', json={'ali_id': '55', 'title': 'Silicone phone case',
+                                                'attrs': {'price': 10, 'quantity': 4}})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['offerId'], 'O-ALI-55')
+        self.assertEqual(resp.json()['listingId'], 'L-O-ALI-55')
+        self.assertEqual([p for _, p in self.fake.calls][1:], [
+            '/sell/inventory/v1/inventory_item/ALI-55', '/sell/inventory/v1/offer',
+            '/sell/inventory/v1/offer/O-ALI-55/publish'])
+
+    def test_rejects_missing_price_and_reports_ebay_errors(self):
+        self.fake.fail['/publish'] = [httpx.Response(400, json={'errors': [{'message': 'No policy'}]})]
+        with TestClient(core_api.app) as client:
+            self.assertEqual(client.post('/import', json={'ali_id': '1', 'title': 'x'}).status_code, 422)
+            resp = client.post('/import', json={'ali_id': '1', 'title': 'x', 'attrs': {'price': 1}})
+        self.assertEqual(resp.status_code, 502)
+        self.assertIn('No policy', resp.json()['detail'])
+
+
+class TestImportDeduplication(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeEbay(latency=0.05)
+        for patcher in (mock.patch.object(core_api, 'SIMULATION', False),
+                        mock.patch.object(core_api, 'EBAY_CLIENT', make_client(self.fake)),
+                        mock.patch.dict(core_api._IMPORT_RESULTS, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post_all(self, requests_):
+        async def run():
+            transport = httpx.ASGITransport(app=core_api.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://api') as client:
+                return await asyncio.gather(*(client.post('/import', json=body, headers=headers)
+                                              for body, headers in requests_))
+        return asyncio.run(run())
+
+    def test_concurrent_duplicates_share_one_listing(self):
+        body = {'ali_id': '9', 'title': 'Phone case', 'attrs': {'price': 5}}
+        other = dict(body, ali_id='10')
+        responses = self.post_all([(body, {})] * 20 + [(other, {})])
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        self.assertEqual({r.json()['offerId'] for r in responses[:20]}, {'O-ALI-9'})
+        self.assertEqual(self.fake.count('/publish'), 2)
+        self.assertEqual(core_api._IMPORT_FLIGHTS, {})
+
+    def test_idempotency_key_replays_success_only(self):
+        body = {'ali_id': '9', 'title': 'Phone case', 'attrs': {'price': 5}}
+        key = {'Idempotency-Key': 'abc'}
+        self.fake.fail['/publish'] = [httpx.Response(400, json={'errors': [{'message': 'No policy'}]})]
+        with TestClient(core_api.app) as client:
+            self.assertEqual(client.post('/import', json=body, headers=key).status_code, 502)
+            first = client.post('/import', json=body, headers=key)
+            again = client.post('/import', json=body, headers=key)
+            reused = client.post('/import', json=dict(body, ali_id='10'), headers=key)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.json(), first.json())
+        self.assertEqual(self.fake.count('/publish'), 2)
+        self.assertEqual(reused.status_code, 422)
+
+    def test_concurrent_reuse_of_a_key_is_refused(self):
+        body = {'ali_id': '9', 'title': 'Phone case', 'attrs': {'price': 5}}
+        key = {'Idempotency-Key': 'abc'}
+        first, same, reused = self.post_all([(body, key), (body, key), (dict(body, ali_id='10'), key)])
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(same.json(), first.json())
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(self.fake.count('/publish'), 1)
+
+    def test_idempotency_results_expire(self):
+        body = {'ali_id': '9', 'title': 'Phone case', 'attrs': {'price': 5}}
+        with mock.patch.object(core_api, 'IMPORT_IDEMPOTENCY_TTL', 0), TestClient(core_api.app) as client:
+            client.post('/import', json=body, headers={'Idempotency-Key': 'abc'})
+            client.post('/import', json=body, headers={'Idempotency-Key': 'abc'})
+        self.assertEqual(self.fake.count('/publish'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
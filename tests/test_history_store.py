@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+DAY = 86400
+T0 = 1_700_000_000 - 1_700_000_000 % DAY
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.store = gmb.get_history_store()
+
+    def test_writes_only_changes(self):
+        self.assertEqual(self.store.record([('1', 13.0, 10.0, 5, 'Toys'), ('2', 6.5, 5.0, 3, 'Garden')], ts=T0), 2)
+        self.assertEqual(self.store.record([('1', 13.0, 10.0, 5, 'Toys'), ('2', 6.5, 5.0, 2, 'Garden')], ts=T0 + 60), 1)
+        rows = gmb.get_storage().query('SELECT sku_id, qty, sold FROM price_history ORDER BY ts, sku_id')
+        self.assertEqual([r[1:] for r in rows], [(5, 0), (3, 0), (2, 1)])
+
+    def test_resample_forward_fills(self):
+        self.store.record([('1', 10.0, 8.0, 5, 'Toys'), ('2', 20.0, 15.0, 1, 'Garden')], ts=T0)
+        self.store.record([('1', 10.0, 8.0, 3, 'Toys')], ts=T0 + 2 * DAY + 5)
+        edges, total = self.store.resample('qty', step=DAY, start=T0, end=T0 + 4 * DAY)
+        self.assertEqual(list(edges), [T0 + i * DAY for i in range(4)])
+        self.assertEqual(list(total), [6, 6, 4, 4])
+        _, per_sku = self.store.resample('price', step=DAY, start=T0 - DAY, end=T0 + DAY, skus=['1', 'missing'])
+        self.assertTrue(np.isnan(per_sku[0][0]))  # bucket ends before the first row
+        self.assertEqual(per_sku[0][1], 10.0)
+        self.assertTrue(np.isnan(per_sku[1]).all())
+        _, by_cat, categories = self.store.resample('qty', step=DAY, start=T0, end=T0 + 3 * DAY, by='category')
+        self.assertEqual(by_cat[categories.index('Toys')].tolist(), [5, 5, 3])
+
+    def test_sales_and_sell_through(self):
+        self.store.record([('1', 10.0, 8.0, 10, 'Toys')], ts=T0)
+        self.store.record([('1', 10.0, 8.0, 8, 'Toys')], ts=T0 + DAY)
+        self.store.record([('1', 10.0, 8.0, 5, 'Toys')], ts=T0 + 2 * DAY)
+        _, sold = self.store.sales(step=DAY, start=T0, end=T0 + 3 * DAY)
+        self.assertEqual(sold.tolist(), [0, 2, 3])
+        _, rate = self.store.sell_through(window=2, step=DAY, start=T0, end=T0 + 3 * DAY)
+        # day 2: 5 sold over the last two days, 5 still on hand
+        np.testing.assert_allclose(rate, [0.0, 2 / 10, 5 / 10])
+
+    def test_margin_by_category_uses_latest_row(self):
+        self.store.record([('1', 10.0, 8.0, 1, 'Toys'), ('2', 30.0, 20.0, 1, 'Toys'), ('3', 5.0, 4.0, 1, 'Garden')], ts=T0)
+        self.store.record([('1', 12.0, 8.0, 1, 'Toys')], ts=T0 + DAY)
+        self.assertEqual(self.store.margin_by_category(at=T0)['Toys']['margin'], 12.0)
+        toys = self.store.margin_by_category(at=T0 + DAY)['Toys']
+        self.assertEqual(toys, {'skus': 2, 'margin': 14.0, 'avg_margin': 7.0, 'margin_pct': 33.33})
+
+    def test_reload_from_database(self):
+        self.store.record([('1', 10.0, 8.0, 4, 'Toys')], ts=T0)
+        fresh = gmb.HistoryStore(gmb.DB_FILE)
+        self.assertEqual(fresh.record([('1', 10.0, 8.0, 4, 'Toys')], ts=T0 + 1), 0)
+        self.assertEqual(fresh.margin_by_category(at=T0)['Toys']['skus'], 1)
+
+    def test_writes_do_not_load_history(self):
+        self.store.record([('1', 10.0, 8.0, 4, 'Toys'), ('2', 5.0, 4.0, 2, 'Garden')], ts=T0)
+        fresh = gmb.HistoryStore(gmb.DB_FILE)
+        self.assertEqual(fresh.record([('1', 10.0, 8.0, 3, 'Toys'), ('2', 5.0, 4.0, 2, 'Garden')], ts=T0 + 60), 1)
+        self.assertIsNone(fresh._cols)
+        self.assertEqual(fresh._pending, [])
+        row = gmb.get_storage().query_one('SELECT sold FROM price_history WHERE ts=?', (T0 + 60,))
+        self.assertEqual(row[0], 1)
+
+    def test_pending_overflow_reloads(self):
+        self.store.record([('1', 10.0, 8.0, 5, 'Toys')], ts=T0)
+        self.store.sales(step=DAY, start=T0, end=T0 + DAY)
+        with mock.patch.object(gmb.HistoryStore, 'PENDING_MAX', 1):
+            self.store.record([('1', 10.0, 8.0, 4, 'Toys')], ts=T0 + DAY)
+            self.assertEqual(len(self.store._pending), 1)
+            self.store.record([('1', 10.0, 8.0, 2, 'Toys')], ts=T0 + 2 * DAY)
+            self.assertIsNone(self.store._cols)
+        _, sold = self.store.sales(step=DAY, start=T0, end=T0 + 3 * DAY)
+        self.assertEqual(sold.tolist(), [0, 1, 2])
+
+    def test_listing_and_sync_append_history(self):
+        worker = gmb.DropshipWorker(make_cfg())
+        for i in range(3):
+            worker.import_single(str(i))
+        self.assertEqual(gmb.get_storage().query_one('SELECT COUNT(*) FROM price_history')[0], 3)
+        gmb.PRODUCT_CACHE.clear()
+        stats = worker.sync_stocks_now()
+        count = gmb.get_storage().query_one('SELECT COUNT(*) FROM price_history')[0]
+        self.assertEqual(count, 3 + stats['updated'])
+
+
+if __name__ == '__main__':
+    unittest.main()
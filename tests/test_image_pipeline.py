@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+
+import Global_Marketplace_Bridge as gmb
+
+
+def make_jpeg(size=(800, 600), color=(200, 30, 30)):
+    out = BytesIO()
+    Image.new('RGB', size, color).save(out, 'JPEG')
+    return out.getvalue()
+
+
+class ImagePipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = gmb.ImageCache(tempfile.mkdtemp(), max_bytes=10 * 1024 * 1024)
+        self.sources = {
+            'http://img/a.jpg': make_jpeg(),
+            'http://img/b.jpg': make_jpeg(color=(0, 0, 255)),
+            'http://img/broken.jpg': b'not an image',
+        }
+
+    def _pipeline(self, **kw):
+        kw.setdefault('process_workers', 0)
+        pipeline = gmb.ImagePipeline(self.cache, download_workers=4, max_side=400, **kw)
+        self.addCleanup(pipeline.close)
+
+        def download(url):
+            if url not in self.sources:
+                raise gmb.requests.HTTPError('404')
+            return self.sources[url]
+
+        pipeline._download = download
+        return pipeline
+
+    def test_outputs_resized_jpeg_in_input_order(self):
+        results = self._pipeline().process(['http://img/b.jpg', 'http://img/a.jpg'])
+        self.assertEqual([r.source_url for r in results], ['http://img/b.jpg', 'http://img/a.jpg'])
+        img = Image.open(BytesIO(results[1].data))
+        self.assertEqual((img.format, img.size), ('JPEG', (400, 300)))
+
+    def test_second_run_is_served_from_cache(self):
+        pipeline = self._pipeline()
+        first, = pipeline.process(['http://img/a.jpg'])
+        with mock.patch.object(gmb, 'render_watermark', side_effect=AssertionError('re-rendered')):
+            again, = pipeline.process(['http://img/a.jpg'])
+        self.assertTrue(again.cached)
+        self.assertEqual(again.data, first.data)
+
+    def test_cache_key_includes_watermark_parameters(self):
+        data = self.sources['http://img/a.jpg']
+        self.assertNotEqual(self._pipeline().cache_key(data), self._pipeline(text='other').cache_key(data))
+
+    def test_failures_fall_back_to_source(self):
+        missing, broken, good = self._pipeline().process(
+            ['http://img/missing.jpg', 'http://img/broken.jpg', 'http://img/a.jpg'])
+        self.assertFalse(missing.ok)
+        self.assertFalse(broken.ok)
+        self.assertEqual(broken.source_url, 'http://img/broken.jpg')
+        self.assertTrue(good.ok)
+
+    def test_process_pool(self):
+        results = self._pipeline(process_workers=1).process(['http://img/a.jpg', 'http://img/broken.jpg'])
+        self.assertEqual([r.ok for r in results], [True, False])
+
+    def test_watermark_image_unique_returns_stable_path(self):
+        pipeline = self._pipeline()
+        with mock.patch.object(gmb, '_IMAGE_PIPELINE', pipeline):
+            first = gmb.watermark_image_unique('http://img/a.jpg', 'ALI-1')
+            second = gmb.watermark_image_unique('http://img/a.jpg', 'ALI-1')
+            fallback = gmb.watermark_image_unique('http://img/missing.jpg', 'ALI-2')
+        self.assertEqual(first, second)
+        self.assertTrue(os.path.exists(first))
+        self.assertEqual(fallback, 'http://img/missing.jpg')
+
+    def test_broken_process_pool_is_replaced(self):
+        pipeline = self._pipeline(process_workers=1)
+        broken = mock.Mock()
+        broken.submit.side_effect = gmb.BrokenProcessPool('worker died')
+        pipeline._processes = broken
+        results = pipeline.process(['http://img/a.jpg', 'http://img/b.jpg'])
+        self.assertEqual([r.ok for r in results], [True, True])
+        broken.shutdown.assert_called_once()
+        self.assertIsNot(pipeline._pool(), broken)
+
+    def test_worker_dying_mid_render_falls_back_in_thread(self):
+        pipeline = self._pipeline(process_workers=1)
+        dead = mock.Mock()
+        dead.submit.return_value.result.side_effect = gmb.BrokenProcessPool('worker died')
+        pipeline._processes = dead
+        first, = pipeline.process(['http://img/a.jpg'])
+        self.assertTrue(first.ok)
+        self.assertIsNone(pipeline._processes)
+
+    def test_shared_pipeline_reads_settings(self):
+        with mock.patch.object(gmb, '_IMAGE_PIPELINE', None):
+            pipeline = gmb.get_image_pipeline({'image_download_workers': 3, 'image_cache_max_mb': 2})
+            self.addCleanup(pipeline.close)
+            self.assertEqual((pipeline.download_workers, pipeline.process_workers), (3, 0))
+            self.assertEqual(pipeline.cache.max_bytes, 2 * 1024 * 1024)
+        with mock.patch.object(gmb, '_IMAGE_PIPELINE', None), \
+                mock.patch.object(gmb, 'config_snapshot', return_value={'app': {'image_process_workers': 2}}):
+            pipeline = gmb.get_image_pipeline()
+            self.addCleanup(pipeline.close)
+            self.assertEqual(pipeline.process_workers, 2)
+
+
+class ImageCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = gmb.ImageCache(tempfile.mkdtemp(), max_bytes=350)
+        for i, key in enumerate(('aa1', 'bb2', 'cc3')):
+            cache.put(key, b'x' * 100)
+            os.utime(cache.path(key), (i, i))
+        os.utime(cache.path('aa1'), (10, 10))  # recently read
+        cache.put('dd4', b'x' * 100)
+        self.assertIsNotNone(cache.get('aa1'))
+        self.assertIsNone(cache.get('bb2'))
+        self.assertIsNotNone(cache.get('dd4'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_run(self):
+        flights = gmb.SingleFlight()
+        calls = []
+        gate = threading.Event()
+
+        def work():
+            calls.append(1)
+            gate.wait(5)
+            return {'offer': 'O-1'}
+
+        with ThreadPoolExecutor(8) as pool:
+            futures = [pool.submit(flights.do, 'k', work) for _ in range(8)]
+            while flights.shared < 7:
+                time.sleep(0.001)
+            gate.set()
+            results = [f.result() for f in futures]
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        # finished flights are forgotten: the next call runs again
+        self.assertEqual(flights.do('k', lambda: 'again'), 'again')
+
+    def test_errors_reach_every_waiter(self):
+        flights = gmb.SingleFlight()
+        gate = threading.Event()
+
+        def fail():
+            gate.wait(5)
+            raise RuntimeError('supplier down')
+
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(flights.do, 'k', fail) for _ in range(4)]
+            while flights.shared < 3:
+                time.sleep(0.001)
+            gate.set()
+            for f in futures:
+                self.assertRaises(RuntimeError, f.result)
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestImportDeduplication(unittest.TestCase):
+    def setUp(self):
+        gmb.IMPORT_RESULTS.clear()
+        self.addCleanup(gmb.IMPORT_RESULTS.clear)
+        self.worker = gmb.DropshipWorker(make_cfg())
+        real_offer = self.worker.ebay.create_offer
+        self.offers = []
+
+        def slow_offer(payload):
+            time.sleep(0.05)
+            self.offers.append(payload['sku'])
+            return real_offer(payload)
+
+        self.worker.ebay.create_offer = slow_offer
+
+    def test_concurrent_imports_of_one_product_publish_once(self):
+        workers = [gmb.DropshipWorker(make_cfg()) for _ in range(6)]
+        for w in workers:
+            w.ebay.create_offer = self.worker.ebay.create_offer
+        with ThreadPoolExecutor(6) as pool:
+            results = list(pool.map(lambda w: w.import_single('7'), workers))
+        self.assertEqual(self.offers, ['ALI-7'])
+        self.assertEqual(len(set(results)), 1)
+
+    def test_idempotency_key_replays_result(self):
+        first = self.worker.import_single('7', idempotency_key='req-1')
+        with mock.patch.object(self.worker.ali, 'fetch_product') as fetch:
+            self.assertEqual(self.worker.import_single('7', idempotency_key='req-1'), first)
+            fetch.assert_not_called()
+        with self.assertRaises(ValueError):
+            self.worker.import_single('8', idempotency_key='req-1')
+        # without a key a finished import is not remembered
+        self.worker.import_single('7')
+        self.assertEqual(self.offers, ['ALI-7', 'ALI-7'])
+
+    def test_concurrent_reuse_of_a_key_is_refused(self):
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(self.worker.import_single, '7', idempotency_key='req-3')
+            time.sleep(0.01)
+            reused = pool.submit(self.worker.import_single, '8', idempotency_key='req-3')
+            self.assertRaises(ValueError, reused.result)
+            first.result()
+        self.assertEqual(self.offers, ['ALI-7'])
+
+    def test_failed_import_releases_its_key(self):
+        with mock.patch.object(self.worker.ali, 'fetch_product', side_effect=RuntimeError('down')):
+            self.assertRaises(RuntimeError, self.worker.import_single, '7', idempotency_key='req-4')
+        self.worker.import_single('7', idempotency_key='req-4')
+        self.assertEqual(self.offers, ['ALI-7'])
+
+    def test_different_markups_do_not_share_a_run(self):
+        with ThreadPoolExecutor(2) as pool:
+            list(pool.map(lambda m: self.worker.import_single('7', markup_percent=m), [None, 80]))
+        self.assertEqual(self.offers, ['ALI-7', 'ALI-7'])
+
+    def test_idempotency_key_expires(self):
+        self.worker.cfg['app']['import_idempotency_ttl'] = 0
+        self.worker.import_single('7', idempotency_key='req-2')
+        self.worker.import_single('7', idempotency_key='req-2')
+        self.assertEqual(self.offers, ['ALI-7', 'ALI-7'])
+
+    def test_pipeline_publishes_duplicate_rows_once(self):
+        results = list(gmb.ImportPipeline(self.worker, list_workers=4).run(['5', '5', '5', '6']))
+        self.assertEqual([r[0] for r in results], ['5', '5', '5', '6'])
+        self.assertEqual(sorted(self.offers), ['ALI-5', 'ALI-6'])
+        self.assertEqual(len({r[1] for r in results[:3]}), 1)
+
+    def test_pipeline_publishes_distant_duplicates_once(self):
+        # the first '5' is long published before its repeat is read
+        ids = ['5'] + [str(i) for i in range(100, 110)] + ['5']
+        results = list(gmb.ImportPipeline(self.worker, list_workers=1, queue_size=2).run(ids))
+        self.assertEqual([r[0] for r in results], ids)
+        self.assertEqual(self.offers.count('ALI-5'), 1)
+        self.assertEqual(results[-1], results[0])
+
+
+class TestTTLCacheAdd(unittest.TestCase):
+    def test_only_one_concurrent_add_wins(self):
+        cache = gmb.TTLCache()
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda i: cache.add('k', {'by': i}), range(8)))
+        self.assertEqual(results.count(None), 1)
+        winner = cache.get('k')
+        self.assertTrue(all(r == winner for r in results if r is not None))
+
+    def test_expired_entry_is_replaced(self):
+        cache = gmb.TTLCache()
+        cache.put('k', 'old', ttl=0)
+        self.assertIsNone(cache.add('k', 'new'))
+        self.assertEqual(cache.get('k'), 'new')
+
+
+if __name__ == '__main__':
+    unittest.main()
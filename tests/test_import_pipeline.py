@@ -0,0 +1,78 @@
+import os
+import random
+import threading
+import time
+import unittest
+from unittest import mock
+
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestImportPipeline(unittest.TestCase):
+    def setUp(self):
+        self.worker = gmb.DropshipWorker(make_cfg())
+
+    def test_results_in_input_order(self):
+        real_fetch = self.worker.ali._fetch_product_batch
+
+        def slow_fetch(ali_ids):
+            time.sleep(random.uniform(0, 0.01))
+            return real_fetch(ali_ids)
+
+        self.worker.ali._fetch_product_batch = slow_fetch
+        ids = [str(i) for i in range(50)]
+        pipeline = gmb.ImportPipeline(self.worker, fetch_workers=8, list_workers=4, queue_size=10)
+        results = list(pipeline.run(iter(ids)))
+        self.assertEqual([r[0] for r in results], ids)
+        self.assertTrue(all(r[2] == 'ok' for r in results))
+
+    def test_row_errors_do_not_stop_the_stream(self):
+        real_normalize = self.worker._normalize_ali_product
+
+        def flaky_normalize(raw):
+            prod = real_normalize(raw)
+            if prod['id'] == '3':
+                raise ValueError('boom')
+            return prod
+
+        self.worker._normalize_ali_product = flaky_normalize
+        results = list(gmb.ImportPipeline(self.worker).run(['1', '2', '3', '4']))
+        self.assertEqual([r[0] for r in results], ['1', '2', '3', '4'])
+        self.assertEqual(results[2], ('3', None, 'boom'))
+        self.assertEqual(results[3][2], 'ok')
+
+    def test_fetch_stage_batches_supplier_calls(self):
+        ids = [str(i) for i in range(120)]
+        with mock.patch.object(self.worker.ali, '_fetch_product_batch',
+                               wraps=self.worker.ali._fetch_product_batch) as batch:
+            results = list(gmb.ImportPipeline(self.worker, fetch_workers=1, queue_size=120).run(ids))
+        self.assertEqual(len(results), 120)
+        self.assertLess(batch.call_count, 120)
+        self.assertTrue(all(len(c.args[0]) <= gmb.ALI_PRODUCT_BATCH_MAX for c in batch.call_args_list))
+
+    def test_import_bulk_csv_skips_blank_rows(self):
+        path = os.path.join(self.tmp_dir, 'bulk.csv')
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write('ali_id,product_id\n11,\n,\n,22\n')
+        results = self.worker.import_bulk_csv(path)
+        self.assertEqual([r[0] for r in results], ['11', '22'])
+
+    def test_closing_csv_stream_early_stops_the_feed_first(self):
+        path = os.path.join(self.tmp_dir, 'bulk.csv')
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write('ali_id\n' + ''.join(f'{i}\n' for i in range(2000)))
+        self.worker.cfg['app']['import_queue_size'] = 4
+        with mock.patch.object(gmb.logger, 'exception') as log_exception:
+            rows = self.worker.iter_bulk_csv(path)
+            self.assertEqual(next(rows)[0], '0')
+            rows.close()
+        self.assertFalse([t for t in threading.enumerate() if t.name == 'import-feed'])
+        log_exception.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+import Global_Marketplace_Bridge as gmb
+
+
+class LogIndexTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.log_path = os.path.join(tmp, 'dropship.log')
+        self.index = gmb.LogIndex(os.path.join(tmp, 'logs.db'), self.log_path)
+        self.addCleanup(lambda: gmb.get_storage(self.index.db_path).close_all())
+
+    def _append(self, *lines):
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+
+    def _lines(self, rows):
+        return [row[3] for row in rows]
+
+    def test_refresh_is_incremental(self):
+        self._append('2026-01-01 10:00:00,000 INFO Created eBay listing SIM-OFFER-1 for Ali 1005001')
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(self.index.refresh(), 0)
+        self._append('2026-01-01 10:05:00,000 ERROR Failed sync for 1005002: boom')
+        self.assertEqual(self.index.refresh(), 1)
+
+    def test_partial_line_waits_for_newline(self):
+        with open(self.log_path, 'w', encoding='utf-8') as f:
+            f.write('2026-01-01 10:00:00,000 INFO half')
+        self.assertEqual(self.index.refresh(), 0)
+        self._append(' done')
+        self.index.refresh()
+        rows, _ = self.index.search('half done')
+        self.assertEqual(len(rows), 1)
+
+    def test_substring_search_is_case_insensitive(self):
+        self._append('2026-01-01 10:00:00,000 INFO Stock updated for 3 SKUs',
+                     '2026-01-01 10:00:01,000 INFO Starting auto-sync every 600 seconds')
+        self.index.refresh()
+        rows, _ = self.index.search('STOCK UPD')
+        self.assertEqual(self._lines(rows), ['2026-01-01 10:00:00,000 INFO Stock updated for 3 SKUs'])
+
+    def test_sku_lookup_matches_bare_id_and_sku(self):
+        self._append('2026-01-01 10:00:00,000 WARNING Stock update rejected for ALI-1005001234: nope',
+                     '2026-01-01 10:00:01,000 INFO Fetching AliExpress products 1005001234,1005009999')
+        self.index.refresh()
+        self.assertEqual(len(self.index.search('1005001234')[0]), 2)
+        self.assertEqual(len(self.index.search('ali-1005001234')[0]), 1)
+        self.assertEqual(len(self.index.search('1005009999')[0]), 1)
+
+    def test_level_and_time_filters(self):
+        self._append('2026-01-01 09:00:00,000 ERROR early failure',
+                     '2026-01-01 11:00:00,000 ERROR late failure',
+                     'Traceback (most recent call last):',
+                     '2026-01-01 11:00:01,000 INFO late info failure')
+        self.index.refresh()
+        rows, _ = self.index.search('failure', levels=['error'], since='2026-01-01 10:00')
+        self.assertEqual(self._lines(rows), ['2026-01-01 11:00:00,000 ERROR late failure'])
+        # traceback lines inherit the header before them
+        rows, _ = self.index.search('Traceback', levels='ERROR', until='2026-01-01 11:00:01')
+        self.assertEqual(len(rows), 1)
+
+    def test_paging_newest_first(self):
+        self._append(*[f'2026-01-01 10:00:{i:02d},000 INFO row {i}' for i in range(5)])
+        self.index.refresh()
+        rows, cursor = self.index.search('row', limit=2)
+        self.assertEqual(self._lines(rows), ['2026-01-01 10:00:04,000 INFO row 4', '2026-01-01 10:00:03,000 INFO row 3'])
+        rows, cursor = self.index.search('row', limit=2, before=cursor)
+        self.assertEqual(self._lines(rows)[-1], '2026-01-01 10:00:01,000 INFO row 1')
+        rows, cursor = self.index.search('row', limit=2, before=cursor)
+        self.assertEqual(len(rows), 1)
+        self.assertIsNone(cursor)
+
+    def test_rotated_log_is_indexed_from_top(self):
+        self._append('2026-01-01 10:00:00,000 INFO before rotation')
+        self.index.refresh()
+        os.replace(self.log_path, self.log_path + '.1')
+        self._append('2026-01-01 10:00:01,000 INFO after rotation')
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(len(self.index.search('rotation')[0]), 2)
+
+    def test_entries_of_deleted_backups_are_pruned(self):
+        self._append('2026-01-01 10:00:00,000 INFO first rotation', 'Traceback (most recent call last):',
+                     '2026-01-01 10:00:01,000 INFO ALI-1005001234 first rotation')
+        self.index.refresh()
+        # first rollover: the old file is kept as .1.gz, nothing is pruned
+        with open(self.log_path, 'rb') as src, gzip.open(self.log_path + '.1.gz', 'wb') as dst:
+            dst.write(src.read())
+        os.remove(self.log_path)
+        self._append('2026-01-02 10:00:00,000 INFO second rotation')
+        self.index.refresh()
+        self.assertEqual(len(self.index.search('rotation')[0]), 3)
+        # second rollover with backup_count=1: the first file is gone
+        os.replace(self.log_path, self.log_path + '.1')
+        os.remove(self.log_path + '.1.gz')
+        self._append('2026-01-03 10:00:00,000 INFO third rotation')
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(self._lines(self.index.search('rotation')[0]),
+                         ['2026-01-03 10:00:00,000 INFO third rotation', '2026-01-02 10:00:00,000 INFO second rotation'])
+        self.assertEqual(self.index.search('1005001234')[0], [])
+        db = gmb.get_storage(self.index.db_path)
+        self.assertEqual(db.query_one('SELECT COUNT(*) FROM log_entries')[0], 2)
+        self.assertEqual(db.query_one('SELECT COUNT(*) FROM log_ids')[0], 0)
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO log_fts (log_fts) VALUES ('integrity-check')")
+        self.assertEqual(self.index.prune(), 0)
+
+    def test_json_records_are_indexed(self):
+        self._append(json.dumps({'ts': '2026-01-01 10:00:00,000', 'level': 'ERROR', 'msg': 'Failed sync',
+                                 'sku': 'ALI-1005001234', 'stage': 'sync'}))
+        self.index.refresh()
+        rows, _ = self.index.search('1005001234', levels='ERROR')
+        self.assertEqual(self._lines(rows), ['2026-01-01 10:00:00,000 ERROR Failed sync sku=ALI-1005001234 stage=sync'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+import Global_Marketplace_Bridge as gmb
+
+
+class LogTailerTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.log')
+        os.close(fd)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.remove(self.path))
+
+    def _append(self, text):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_returns_only_appended_lines(self):
+        tailer = gmb.LogTailer(self.path)
+        self._append('one\ntwo\n')
+        self.assertEqual(tailer.poll(), ['one\n', 'two\n'])
+        self.assertEqual(tailer.poll(), [])
+        self._append('three\n')
+        self.assertEqual(tailer.poll(), ['three\n'])
+
+    def test_partial_line_is_held_until_complete(self):
+        tailer = gmb.LogTailer(self.path)
+        self._append('hal')
+        self.assertEqual(tailer.poll(), [])
+        self._append('f\nnext')
+        self.assertEqual(tailer.poll(), ['half\n'])
+
+    def test_truncation_restarts_from_top(self):
+        tailer = gmb.LogTailer(self.path)
+        self._append('a long first line\nsecond\n')
+        tailer.poll()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('fresh\n')
+        self.assertEqual(tailer.poll(), ['fresh\n'])
+
+    def test_rotation_follows_new_file(self):
+        tailer = gmb.LogTailer(self.path)
+        self._append('old\n')
+        tailer.poll()
+        os.replace(self.path, self.path + '.1')
+        self.addCleanup(os.remove, self.path + '.1')
+        # keep the old file alive so the new one cannot reuse its inode
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('rotated entry\n')
+        self.assertEqual(tailer.poll(), ['rotated entry\n'])
+
+    def test_large_backlog_skips_to_tail(self):
+        tailer = gmb.LogTailer(self.path, max_backlog=64)
+        self._append(''.join(f'line {i:04d}\n' for i in range(100)))
+        lines = tailer.poll()
+        self.assertEqual(lines[-1], 'line 0099\n')
+        self.assertLessEqual(sum(len(ln) for ln in lines), 64)
+        self.assertTrue(all(ln.startswith('line ') for ln in lines))
+
+    def test_ring_buffer_is_bounded(self):
+        tailer = gmb.LogTailer(self.path, max_lines=3)
+        for i in range(5):
+            self._append(f'{i}\n')
+            tailer.poll()
+        self.assertEqual(list(tailer.lines), ['2\n', '3\n', '4\n'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+import Global_Marketplace_Bridge as gmb
+
+
+class QueuedLoggingTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp, 'dropship.log')
+        self.addCleanup(gmb.configure_logging)
+
+    def _read(self):
+        gmb.shutdown_logging()  # drains the queue
+        with open(self.log_path, encoding='utf-8') as f:
+            return f.read().splitlines()
+
+    def test_json_records_carry_context_fields(self):
+        gmb.configure_logging({'log_format': 'json'}, log_file=self.log_path)
+        with gmb.log_context(sku='ALI-1', stage='fetch'):
+            gmb.logger.info('fetched %s', 1)
+        gmb.logger.warning('explicit', extra={'sku': 'ALI-2'})
+        first, second = [json.loads(line) for line in self._read()]
+        self.assertEqual((first['msg'], first['sku'], first['stage'], first['level']),
+                         ('fetched 1', 'ALI-1', 'fetch', 'INFO'))
+        self.assertEqual(second['sku'], 'ALI-2')
+        self.assertNotIn('stage', second)
+
+    def test_text_format_is_unchanged(self):
+        gmb.configure_logging({'log_queue': False}, log_file=self.log_path)
+        gmb.logger.info('plain')
+        line, = self._read()
+        self.assertRegex(line, r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d,\d{3} INFO plain$')
+
+    def test_size_rotation_compresses_backups(self):
+        gmb.configure_logging({'log_max_bytes': 200, 'log_backup_count': 2}, log_file=self.log_path)
+        for i in range(20):
+            gmb.logger.info('line %s %s', i, 'x' * 40)
+        self._read()
+        names = sorted(os.listdir(self.tmp))
+        self.assertEqual(names, ['dropship.log', 'dropship.log.1.gz', 'dropship.log.2.gz'])
+        with gzip.open(os.path.join(self.tmp, 'dropship.log.1.gz'), 'rt') as f:
+            self.assertIn('INFO line', f.read())
+
+    def test_time_rotation(self):
+        handler = gmb.CompressingRotatingFileHandler(self.log_path, interval=3600)
+        self.addCleanup(handler.close)
+        record = logging.LogRecord('dropship', logging.INFO, __file__, 1, 'msg', None, None)
+        self.assertFalse(handler.shouldRollover(record))
+        handler.rollover_at = 0
+        self.assertTrue(handler.shouldRollover(record))
+
+
+class DebugSamplingTests(unittest.TestCase):
+    def _record(self, level, msg='tick %s'):
+        return logging.LogRecord('dropship', level, __file__, 1, msg, (1,), None)
+
+    def test_keeps_one_in_n_per_template(self):
+        f = gmb.DebugSamplingFilter(0.25)
+        kept = [f.filter(self._record(logging.DEBUG)) for _ in range(8)]
+        self.assertEqual(kept, [True, False, False, False, True, False, False, False])
+        # each template is sampled independently
+        self.assertTrue(f.filter(self._record(logging.DEBUG, 'other')))
+
+    def test_info_and_above_always_pass(self):
+        f = gmb.DebugSamplingFilter(0)
+        self.assertFalse(f.filter(self._record(logging.DEBUG)))
+        self.assertTrue(f.filter(self._record(logging.INFO)))
+
+
+if __name__ == '__main__':
+    unittest.main()
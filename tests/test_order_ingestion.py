@@ -0,0 +1,152 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import dropship_automator_sandbox_ready as sandbox
+
+
+def make_order(n, modified):
+    return {
+        'orderId': f'ORDER-{n}',
+        'creationDate': '2026-01-01T00:00:00.000Z',
+        'lastModifiedDate': modified,
+        'orderFulfillmentStatus': 'NOT_STARTED',
+        'orderPaymentStatus': 'PAID',
+        'buyer': {'username': f'buyer{n}'},
+        'pricingSummary': {'total': {'value': '19.99', 'currency': 'AUD'}},
+        'lineItems': [{'lineItemId': f'LI-{n}', 'sku': f'ALI-{n}', 'legacyItemId': str(n), 'title': 'Thing',
+                       'quantity': 2, 'lineItemCost': {'value': '9.99', 'currency': 'AUD'},
+                       'lineItemFulfillmentStatus': 'NOT_STARTED'}],
+    }
+
+
+class _FakeFulfillment(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    orders = []
+    requests_seen = []
+    unauthorized = 0  # answer this many GETs with 401
+    tokens_minted = 0
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        type(self).tokens_minted += 1
+        self._send_json(200, {'access_token': f'T{self.tokens_minted}', 'expires_in': 7200})
+
+    def do_GET(self):
+        if self.unauthorized:
+            type(self).unauthorized -= 1
+            self.requests_seen.append(None)
+            return self._send_json(401, {'errors': [{'message': 'Invalid access token'}]})
+        parsed = urlparse(self.path)
+        qs = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        self.requests_seen.append(qs)
+        since = qs.get('filter', 'lastmodifieddate:[..]')[len('lastmodifieddate:['):-len('..]')]
+        matching = [o for o in self.orders if o['lastModifiedDate'] >= since]
+        offset, limit = int(qs.get('offset', 0)), int(qs['limit'])
+        page = {'orders': matching[offset:offset + limit], 'total': len(matching)}
+        if offset + limit < len(matching):
+            page['next'] = (f'http://{self.headers["Host"]}{parsed.path}?limit={limit}&offset={offset + limit}'
+                            f'&filter={qs["filter"]}')
+        self._send_json(200, page)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOrderIngestion(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.db = os.path.join(tmp, 'orders.db')
+        with mock.patch.object(sandbox, 'DB_FILE', self.db):
+            sandbox.init_db()
+        _FakeFulfillment.orders = []
+        _FakeFulfillment.requests_seen = []
+        _FakeFulfillment.unauthorized = 0
+        _FakeFulfillment.tokens_minted = 0
+        patcher = mock.patch.object(sandbox, 'update_config')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeFulfillment)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.ebay = sandbox.EbayAPI(dict(sandbox.DEFAULTS, ebay_token='T', ebay_token_expires=time.time() + 3600))
+        self.ebay.base = f'http://127.0.0.1:{server.server_address[1]}'
+        self.ingestor = sandbox.OrderIngestor(self.ebay, db_path=self.db, batch_size=2, overlap_seconds=0,
+                                                  initial_days=3650)
+
+    def _count(self, table):
+        with sqlite3.connect(self.db) as conn:
+            return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def test_iter_orders_follows_pages(self):
+        _FakeFulfillment.orders = [make_order(n, '2026-01-01T00:00:00.000Z') for n in range(5)]
+        orders = list(self.ebay.iter_orders(modified_since='2025-01-01T00:00:00.000Z', page_size=2))
+        self.assertEqual([o['orderId'] for o in orders], [f'ORDER-{n}' for n in range(5)])
+        self.assertEqual(len(_FakeFulfillment.requests_seen), 3)
+
+    def test_run_once_upserts_and_advances_high_water_mark(self):
+        _FakeFulfillment.orders = [make_order(n, f'2026-01-0{n + 1}T00:00:00.000Z') for n in range(3)]
+        self.assertEqual(self.ingestor.run_once(), {'orders': 3, 'line_items': 3})
+        self.assertEqual(self._count('orders'), 3)
+        self.assertEqual(self._count('order_line_items'), 3)
+
+        # next poll only asks for (and gets) orders modified since the mark
+        _FakeFulfillment.orders[0]['lastModifiedDate'] = '2026-01-05T00:00:00.000Z'
+        _FakeFulfillment.orders[0]['orderFulfillmentStatus'] = 'FULFILLED'
+        stats = self.ingestor.run_once()
+        self.assertIn('lastmodifieddate:[2026-01-03T00:00:00.000Z..]', _FakeFulfillment.requests_seen[-1]['filter'])
+        self.assertEqual(stats['orders'], 2)  # order 2 sits exactly on the mark
+        self.assertEqual(self._count('orders'), 3)
+        with sqlite3.connect(self.db) as conn:
+            status = conn.execute("SELECT fulfillment_status FROM orders WHERE order_id='ORDER-0'").fetchone()[0]
+            hwm = conn.execute('SELECT value FROM sync_state').fetchone()[0]
+        self.assertEqual(status, 'FULFILLED')
+        self.assertEqual(hwm, '2026-01-05T00:00:00.000Z')
+
+    def test_failed_run_does_not_move_mark(self):
+        _FakeFulfillment.orders = [make_order(n, '2026-01-01T00:00:00.000Z') for n in range(3)]
+        with mock.patch.object(self.ebay, '_get_orders_page', side_effect=RuntimeError('down')):
+            with self.assertRaises(RuntimeError):
+                self.ingestor.run_once()
+        with sqlite3.connect(self.db) as conn:
+            self.assertIsNone(self.ingestor.high_water_mark(conn))
+
+    def test_expired_token_is_refreshed_before_polling(self):
+        self.ebay.token_expires = time.time() - 1
+        self.ingestor.run_once()
+        self.assertEqual(_FakeFulfillment.tokens_minted, 1)
+        self.assertEqual(self.ebay.token, 'T1')
+
+    def test_rejected_token_is_reminted_once_not_retried(self):
+        _FakeFulfillment.orders = [make_order(1, '2026-01-01T00:00:00.000Z')]
+        _FakeFulfillment.unauthorized = 1
+        with mock.patch.object(sandbox.time, 'sleep') as sleep:
+            self.assertEqual(self.ingestor.run_once()['orders'], 1)
+        sleep.assert_not_called()
+        self.assertEqual(_FakeFulfillment.tokens_minted, 1)
+        self.assertEqual(len(_FakeFulfillment.requests_seen), 2)
+
+        _FakeFulfillment.unauthorized = 2
+        with self.assertRaises(sandbox.EbayAuthError):
+            self.ingestor.run_once()
+        self.assertEqual(_FakeFulfillment.tokens_minted, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import time
+import unittest
+from unittest import mock
+
+import Global_Marketplace_Bridge as gmb
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_hit_returns_a_private_copy(self):
+        cache = gmb.TTLCache()
+        cache.put('a', {'qty': 1})
+        got = cache.get('a')
+        got['qty'] = 99
+        self.assertEqual(cache.get('a'), {'qty': 1})
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_ttl_and_max_age(self):
+        cache = gmb.TTLCache(ttl=60)
+        cache.put('a', 1)
+        cache.put('b', 2, ttl=-1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+        with mock.patch.object(gmb.time, 'time', return_value=time.time() + 30):
+            self.assertEqual(cache.get('a'), 1)
+            self.assertIsNone(cache.get('a', max_age=10))
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        cache = gmb.TTLCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+        cache = gmb.TTLCache(max_bytes=20)
+        cache.put('a', 'x' * 10)
+        cache.put('b', 'y' * 10)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.stats()['bytes'], 20)
+
+
+class TestCachedFetch(unittest.TestCase):
+    def setUp(self):
+        gmb.PRODUCT_CACHE.clear()
+        self.ali = gmb.AliExpressAPI(gmb.DEFAULTS)
+
+    def test_repeat_fetches_hit_the_cache(self):
+        with mock.patch.object(self.ali, '_fetch_product_batch', wraps=self.ali._fetch_product_batch) as upstream:
+            first = self.ali.fetch_product('1')
+            self.assertEqual(self.ali.fetch_product('1'), first)
+            self.assertEqual(upstream.call_count, 1)
+            self.ali.fetch_product('1', max_age=0)
+            self.assertEqual(upstream.call_count, 2)
+
+
+class TestBatchedFetch(unittest.TestCase):
+    def setUp(self):
+        gmb.PRODUCT_CACHE.clear()
+        self.ali = gmb.AliExpressAPI(gmb.DEFAULTS)
+
+    def test_chunks_and_reports_per_id_errors(self):
+        ids = [str(i) for i in range(120)]
+        real = self.ali._fetch_product_batch
+
+        def drop_seven(chunk):
+            resp = real(chunk)
+            products = resp['aliexpress_affiliate_productdetail_get_response']['resp_result']['result']['products']
+            products[:] = [p for p in products if p['product_id'] != '7']
+            return resp
+
+        with mock.patch.object(self.ali, '_fetch_product_batch', side_effect=drop_seven) as upstream:
+            results = self.ali.fetch_products(ids + ['1'])
+        self.assertEqual(sorted(len(c.args[0]) for c in upstream.call_args_list), [20, 50, 50])
+        self.assertEqual(set(results), set(ids))
+        prod, err = results['1']
+        self.assertIsNone(err)
+        self.assertEqual((prod['id'], prod['qty']), ('1', 120))
+        self.assertIsNone(results['7'][0])
+        self.assertIsInstance(results['7'][1], LookupError)
+
+    def test_batch_results_fill_the_single_product_cache(self):
+        self.ali.fetch_products(['1', '2'])
+        with mock.patch.object(self.ali, '_fetch_product_batch') as upstream:
+            raw = self.ali.fetch_product('2')
+        upstream.assert_not_called()
+        self.assertEqual(gmb.DropshipWorker(gmb.DEFAULTS)._normalize_ali_product(raw)['id'], '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
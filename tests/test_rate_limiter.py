@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+import unittest
+import uuid
+from unittest import mock
+
+import httpx
+
+import Global_Marketplace_Bridge as gmb
+from apps.core_api import main as core_api
+from apps.core_api import rate_limit
+from apps.core_api.ebay_client import EbayClient
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_paced(self):
+        limiter = gmb.RateLimiter({'ebay:inventory': (10.0, 3)})
+        with mock.patch.object(gmb.time, 'sleep') as sleep:
+            waits = [limiter.acquire('ebay:inventory') for _ in range(5)]
+        self.assertEqual(waits[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(waits[3], 0.1, delta=0.02)
+        self.assertAlmostEqual(waits[4], 0.2, delta=0.02)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_timeout_does_not_reserve(self):
+        limiter = gmb.RateLimiter({'ali:product': (1.0, 1)})
+        limiter.acquire('ali:product')
+        with self.assertRaises(gmb.RateLimitTimeout):
+            limiter.acquire('ali:product', timeout=0.1)
+        with mock.patch.object(gmb.time, 'sleep'):
+            self.assertLessEqual(limiter.acquire('ali:product'), 1.0)
+
+    def test_unconfigured_family_is_unlimited(self):
+        self.assertEqual(gmb.RateLimiter({}).acquire('ebay:anything'), 0.0)
+
+    def test_falls_back_to_local_buckets_without_redis(self):
+        limiter = gmb.RateLimiter({'ebay:inventory': (5.0, 2)}, redis_url='redis://127.0.0.1:1/0')
+        self.assertEqual(limiter.acquire('ebay:inventory'), 0.0)
+        self.assertGreater(limiter._redis_down_until, time.monotonic())
+
+    @unittest.skipUnless(os.getenv('REDIS_URL'), 'needs a Redis server (set REDIS_URL)')
+    def test_redis_bucket_is_shared_between_limiters(self):
+        limits = {'ebay:inventory': (10.0, 2)}
+        prefix = f'test:{uuid.uuid4().hex}:'
+        a = gmb.RateLimiter(limits, os.getenv('REDIS_URL'), prefix=prefix)
+        b = gmb.RateLimiter(limits, os.getenv('REDIS_URL'), prefix=prefix)
+        a.acquire('ebay:inventory')
+        a.acquire('ebay:inventory')
+        with self.assertRaises(gmb.RateLimitTimeout):
+            b.acquire('ebay:inventory', timeout=0.01)
+
+
+class TestAsyncRateLimiter(unittest.TestCase):
+    def test_shares_buckets_with_desktop_limiter(self):
+        self.assertEqual(rate_limit.BUCKET_LUA, gmb._BUCKET_LUA)
+        self.assertEqual(rate_limit.DEFAULT_RATE_LIMITS, gmb.DEFAULT_RATE_LIMITS)
+        self.assertEqual(rate_limit.AsyncRateLimiter().prefix, gmb.RateLimiter({}).prefix)
+
+    def test_burst_then_paced(self):
+        limiter = rate_limit.AsyncRateLimiter({'ebay:inventory': (10.0, 3)})
+
+        async def run():
+            with mock.patch.object(rate_limit.asyncio, 'sleep') as sleep:
+                waits = [await limiter.acquire('ebay:inventory') for _ in range(5)]
+            return waits, sleep.call_count
+
+        waits, sleeps = asyncio.run(run())
+        self.assertEqual(waits[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(waits[3], 0.1, delta=0.02)
+        self.assertAlmostEqual(waits[4], 0.2, delta=0.02)
+        self.assertEqual(sleeps, 2)
+
+    def test_falls_back_to_local_buckets_without_redis(self):
+        limiter = rate_limit.AsyncRateLimiter({'ebay:inventory': (5.0, 2)}, redis_url='redis://127.0.0.1:1/0')
+        self.assertEqual(asyncio.run(limiter.acquire('ebay:inventory')), 0.0)
+        self.assertGreater(limiter._redis_down_until, time.monotonic())
+
+    def test_ebay_client_takes_a_token_per_call(self):
+        limiter = rate_limit.AsyncRateLimiter()
+        families = []
+
+        async def acquire(family, n=1):
+            families.append(family)
+            return 0.0
+
+        async def handler(request):
+            if request.url.path.endswith('/oauth2/token'):
+                return httpx.Response(200, json={'access_token': 'tok', 'expires_in': 7200})
+            if request.url.path.endswith('/publish'):
+                return httpx.Response(200, json={'listingId': 'L-1'})
+            if request.method == 'PUT':
+                return httpx.Response(204)
+            return httpx.Response(201, json={'offerId': 'O-1'})
+
+        async def run():
+            client = EbayClient('id', 'secret', transport=httpx.MockTransport(handler), limiter=limiter)
+            try:
+                await client.list_item('ALI-1', {}, {})
+            finally:
+                await client.aclose()
+
+        with mock.patch.object(limiter, 'acquire', acquire):
+            asyncio.run(run())
+        self.assertEqual(families, ['ebay:identity'] + ['ebay:inventory'] * 3)
+
+    def test_core_api_uses_the_shared_limiter(self):
+        self.assertEqual(core_api.RATE_LIMITER.limits['ebay:inventory'], (23.0, 500.0))
+        with mock.patch.object(core_api, 'EBAY_CLIENT', None):
+            client = core_api.get_ebay_client()
+            try:
+                self.assertIs(client.limiter, core_api.RATE_LIMITER)
+            finally:
+                asyncio.run(client.aclose())
+
+
+if __name__ == '__main__':
+    unittest.main()
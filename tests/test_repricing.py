@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+
+class TestRepricerRules(unittest.TestCase):
+    def test_defaults_match_flat_markup(self):
+        costs = np.array([0.99, 5.0, 12.34, 199.99])
+        prices = gmb.Repricer(markup_percent=30.0).evaluate(costs)
+        self.assertEqual(prices.tolist(), [round(c * 1.3, 2) for c in costs])
+
+    def test_tiers_fees_and_charm_rounding(self):
+        r = gmb.Repricer(tiers=[[0, 100], [10, 50], [50, 20]], fee_percent=10.0, fee_fixed=0.3, shipping=1.0,
+                         price_ending=0.99)
+        # landed 5 -> 100%: (10 + 0.3) / 0.9 = 11.44 -> 11.99
+        # landed 21 -> 50%: (31.5 + 0.3) / 0.9 = 35.33 -> 35.99
+        # landed 99 -> 20%: (118.8 + 0.3) / 0.9 = 132.33 -> 132.99
+        self.assertEqual(r.evaluate([4.0, 20.0, 98.0]).tolist(), [11.99, 35.99, 132.99])
+
+    def test_price_on_ending_is_kept(self):
+        r = gmb.Repricer(markup_percent=0.0, price_ending=0.99)
+        self.assertEqual(r.evaluate([12.99, 13.0]).tolist(), [12.99, 13.99])
+
+    def test_category_override_and_min_profit(self):
+        r = gmb.Repricer(markup_percent=30.0, category_markup={'Toys': 5.0}, min_profit=2.0)
+        prices = r.price_for([10.0, 10.0], ['Toys', 'Garden'])
+        self.assertEqual(prices.tolist(), [12.0, 13.0])
+
+    def test_from_cfg_reads_gui_markup_and_rules(self):
+        cfg = make_cfg()
+        cfg['markup_percent'] = 50.0
+        cfg['app']['repricing'] = {'price_ending': 0.95}
+        self.assertEqual(gmb.Repricer.from_cfg(cfg).evaluate([10.0]).tolist(), [15.95])
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestRepriceCatalog(unittest.TestCase):
+    def setUp(self):
+        worker = gmb.DropshipWorker(make_cfg())
+        for i in range(30):
+            worker.import_single(str(i))
+
+    def worker(self, markup):
+        cfg = make_cfg()
+        cfg['markup_percent'] = markup
+        return gmb.DropshipWorker(cfg)
+
+    def test_unchanged_rules_emit_nothing(self):
+        stats = self.worker(30.0).reprice_catalog()
+        self.assertEqual((stats['checked'], stats['changed'], stats['updated']), (30, 0, 0))
+
+    def test_new_markup_pushes_only_changed_skus(self):
+        worker = self.worker(50.0)
+        with mock.patch.object(worker.ebay, 'bulk_update_price_quantity',
+                               wraps=worker.ebay.bulk_update_price_quantity) as push:
+            stats = worker.reprice_catalog()
+        self.assertEqual(stats, {'checked': 30, 'changed': 30, 'updated': 30, 'failed': 0})
+        self.assertEqual(push.call_count, 2)  # 25 + 5
+        cost, price = gmb.get_storage().query_one("SELECT cost, price FROM products WHERE ali_product_id='3'")
+        self.assertEqual(price, round(cost * 1.5, 2))
+        self.assertEqual(gmb.get_storage().query_one("SELECT price FROM prices WHERE sku='ALI-3'")[0], price)
+        self.assertEqual(self.worker(50.0).reprice_catalog()['changed'], 0)
+
+    def test_rejected_skus_keep_old_price(self):
+        worker = self.worker(50.0)
+        old = gmb.get_storage().query_one("SELECT price FROM products WHERE ali_product_id='0'")[0]
+
+        def reject_first(requests_):
+            return {'responses': [{'sku': r['sku'], 'statusCode': 400 if r['sku'] == 'ALI-0' else 200}
+                                  for r in requests_]}
+
+        with mock.patch.object(worker.ebay, 'bulk_update_price_quantity', side_effect=reject_first):
+            stats = worker.reprice_catalog()
+        self.assertEqual((stats['updated'], stats['failed']), (29, 1))
+        self.assertEqual(gmb.get_storage().query_one("SELECT price FROM products WHERE ali_product_id='0'")[0], old)
+
+    def test_dry_run_lists_changes(self):
+        stats = self.worker(40.0).reprice_catalog(dry_run=True)
+        self.assertEqual(len(stats['changes']), 30)
+        self.assertEqual(stats['updated'], 0)
+
+    def test_import_and_sync_agree_on_tiered_price(self):
+        cfg = make_cfg()
+        cfg['app']['repricing'] = {'tiers': [[0, 80], [5, 40]], 'fee_percent': 10.0, 'price_ending': 0.99}
+        worker = gmb.DropshipWorker(cfg)
+        worker.import_single('77')
+        cost, listed = gmb.get_storage().query_one("SELECT cost, price FROM products WHERE ali_product_id='77'")
+        self.assertEqual(listed, float(worker.repricer.price_for([cost], [None])[0]))
+        self.assertTrue(str(listed).endswith('.99'))
+        self.assertNotIn('77', [c[0] for c in worker.reprice_catalog(dry_run=True)['changes']])
+        real_fetch = worker.ali._fetch_product_batch
+
+        def restocked(ali_ids):
+            # same supplier price, new stock: sync pushes the SKU and reprices it
+            raw = real_fetch(ali_ids)
+            for p in raw['aliexpress_affiliate_productdetail_get_response']['resp_result']['result']['products']:
+                p['total_avaliable_stock'] = '7'
+            return raw
+
+        worker.ali._fetch_product_batch = restocked
+        gmb.PRODUCT_CACHE.clear()
+        with mock.patch.object(worker.ebay, 'bulk_update_price_quantity',
+                               wraps=worker.ebay.bulk_update_price_quantity) as push:
+            worker.sync_stocks_now()
+        pushed = [o['price']['value'] for call in push.call_args_list for r in call[0][0]
+                  if r['sku'] == 'ALI-77' for o in r['offers']]
+        self.assertTrue(pushed)
+        self.assertTrue(all(float(v) == listed for v in pushed))
+
+
+if __name__ == '__main__':
+    unittest.main()
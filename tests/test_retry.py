@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import requests
+
+import Global_Marketplace_Bridge as gmb
+
+
+def http_error(status, body=None, headers=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = (body or '{}').encode()
+    resp.headers.update(headers or {})
+    return requests.HTTPError(response=resp)
+
+
+class RetryTestCase(unittest.TestCase):
+    def setUp(self):
+        for patcher in (mock.patch.object(gmb, '_BREAKERS', {}),
+                        mock.patch.object(gmb, 'RETRY_BUDGET', gmb.RetryBudget())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        sleeper = mock.patch.object(gmb.time, 'sleep')
+        self.sleep = sleeper.start()
+        self.addCleanup(sleeper.stop)
+
+
+class TestClassification(unittest.TestCase):
+    def test_status_and_error_ids(self):
+        self.assertEqual(gmb.classify_error(http_error(400)), (False, None))
+        self.assertEqual(gmb.classify_error(http_error(503)), (True, None))
+        self.assertEqual(gmb.classify_error(http_error(429, headers={'Retry-After': '7'})), (True, 7.0))
+        body = '{"errors": [{"errorId": 25001, "message": "System error"}]}'
+        self.assertTrue(gmb.classify_error(http_error(400, body))[0])
+        self.assertTrue(gmb.classify_error(requests.ConnectionError())[0])
+        self.assertFalse(gmb.classify_error(ValueError('bad payload'))[0])
+
+
+class TestRetry(RetryTestCase):
+    def test_validation_errors_are_not_retried(self):
+        fn = mock.Mock(side_effect=http_error(400), __qualname__='f')
+        with self.assertRaises(requests.HTTPError):
+            gmb.retry(max_retries=3)(fn)()
+        self.assertEqual(fn.call_count, 1)
+        self.sleep.assert_not_called()
+
+    def test_transient_errors_back_off_with_jitter(self):
+        fn = mock.Mock(side_effect=[http_error(503), http_error(503), 'ok'], __qualname__='f')
+        self.assertEqual(gmb.retry(max_retries=3, backoff=1, max_delay=10)(fn)(), 'ok')
+        delays = [c.args[0] for c in self.sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertTrue(0 <= delays[0] <= 1 and 0 <= delays[1] <= 2)
+
+    def test_retry_after_is_honoured(self):
+        fn = mock.Mock(side_effect=[http_error(429, headers={'Retry-After': '5'}), 'ok'], __qualname__='f')
+        gmb.retry(backoff=0.01)(fn)()
+        self.assertGreaterEqual(self.sleep.call_args.args[0], 5)
+
+    def test_budget_caps_retries(self):
+        gmb.RETRY_BUDGET = gmb.RetryBudget(ratio=0, min_per_second=0, capacity=1)
+        fn = mock.Mock(side_effect=http_error(503), __qualname__='f')
+        with self.assertRaises(requests.HTTPError):
+            gmb.retry(max_retries=10)(fn)()
+        self.assertEqual(fn.call_count, 2)
+
+    def test_breaker_fails_fast_then_recovers(self):
+        breaker = gmb.get_breaker('ep')
+        breaker.failure_threshold = 2
+        fn = mock.Mock(side_effect=http_error(503), __qualname__='f')
+        call = gmb.retry(max_retries=1, endpoint='ep')(fn)
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                call()
+        with self.assertRaises(gmb.CircuitOpenError):
+            call()
+        self.assertEqual(fn.call_count, 2)
+
+        breaker._opened_at -= breaker.reset_timeout
+        fn.side_effect = None
+        fn.return_value = 'ok'
+        self.assertEqual(call(), 'ok')
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_async_variant(self):
+        attempts = []
+
+        @gmb.retry(max_retries=3, backoff=0.001)
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise requests.Timeout()
+            return 'ok'
+
+        self.assertEqual(asyncio.run(flaky()), 'ok')
+        self.assertEqual(len(attempts), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import dropship_automator_sandbox_ready as sandbox
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSessionPool(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.host = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def test_connections_are_reused_across_threads(self):
+        pool = sandbox.SessionPool(maxsize=2)
+        errors = []
+
+        def hit():
+            try:
+                for _ in range(5):
+                    pool.get(self.host + '/x').raise_for_status()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=hit) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        st = pool.stats()[self.host]
+        self.assertEqual(st['requests'], 20)
+        self.assertEqual(st['concurrent_requests'], 0)
+        self.assertGreaterEqual(st['peak_concurrent_requests'], 1)
+        self.assertEqual(st['maxsize'], 2)
+
+    def test_host_limit_and_default_timeout(self):
+        pool = sandbox.SessionPool(connect_timeout=1, read_timeout=7)
+        pool.set_host_limit(self.host, 3)
+        self.assertEqual(pool.timeout, (1.0, 7.0))
+        pool.get(self.host + '/')
+        self.assertEqual(pool.stats()[self.host]['maxsize'], 3)
+
+    def test_host_limits_come_from_config(self):
+        cfg = dict(sandbox.DEFAULTS, http_host_limits={self.host: 4})
+        with mock.patch.object(sandbox, '_SESSION_POOL', None):
+            pool = sandbox.get_session_pool(cfg)
+            pool.get(self.host + '/')
+        self.assertEqual(pool.stats()[self.host]['maxsize'], 4)
+
+    def test_script_uses_the_package_pool(self):
+        from src.utils import http
+        self.assertIs(sandbox.SessionPool, http.SessionPool)
+
+    def test_api_clients_share_the_process_pool(self):
+        cfg = dict(sandbox.DEFAULTS)
+        self.assertIs(sandbox.EbayAPI(cfg).http, sandbox.EbayAPI(cfg).http)
+        self.assertIs(sandbox.EbayAPI(cfg).http, sandbox.AliExpressAPI(cfg).http)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import sqlite3
+import unittest
+from unittest import mock
+
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestBatchedStockSync(unittest.TestCase):
+    def setUp(self):
+        self.worker = gmb.DropshipWorker(make_cfg())
+        for i in range(30):
+            self.worker.import_single(str(i))
+        real_fetch = self.worker.ali._fetch_product_batch
+
+        def restocked(ali_ids):
+            raw = real_fetch(ali_ids)
+            for p in raw['aliexpress_affiliate_productdetail_get_response']['resp_result']['result']['products']:
+                p['total_avaliable_stock'] = '7'
+            return raw
+
+        self.worker.ali._fetch_product_batch = restocked
+        gmb.PRODUCT_CACHE.clear()
+
+    def qty(self, ali_id):
+        conn = sqlite3.connect(gmb.DB_FILE)
+        try:
+            return conn.execute('SELECT qty FROM products WHERE ali_product_id=?', (ali_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_changed_skus_are_pushed_in_batches_of_25(self):
+        with mock.patch.object(self.worker.ebay, 'bulk_update_price_quantity',
+                               wraps=self.worker.ebay.bulk_update_price_quantity) as bulk:
+            stats = self.worker.sync_stocks_now()
+        self.assertEqual([len(c.args[0]) for c in bulk.call_args_list], [25, 5])
+        self.assertEqual(stats, {'checked': 30, 'changed': 30, 'updated': 30, 'failed': 0})
+        self.assertEqual(self.qty('0'), 7)
+
+    def test_partial_failures_map_back_to_skus(self):
+        def partial(requests_):
+            return {'responses': [
+                {'sku': r['sku'], 'offerId': r['offers'][0]['offerId'],
+                 'statusCode': 400 if r['sku'] == 'ALI-3' else 200}
+                for r in reversed(requests_)
+            ]}
+
+        with mock.patch.object(self.worker.ebay, 'bulk_update_price_quantity', side_effect=partial):
+            stats = self.worker.sync_stocks_now()
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['updated'], 29)
+        self.assertEqual(self.qty('3'), 120)
+        self.assertEqual(self.qty('4'), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import Global_Marketplace_Bridge as gmb
+
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db = gmb.Storage(os.path.join(self.tmp.name, 'test.db'))
+        self.addCleanup(self.db.close_all)
+        self.db.execute('CREATE TABLE t (k TEXT PRIMARY KEY, v INTEGER)')
+
+    def test_wal_mode(self):
+        self.assertEqual(self.db.query_one('PRAGMA journal_mode')[0].lower(), 'wal')
+
+    def test_connection_is_reused_per_thread(self):
+        self.assertIs(self.db.connection(), self.db.connection())
+        other = []
+        t = threading.Thread(target=lambda: other.append(self.db.connection()))
+        t.start()
+        t.join()
+        self.assertIsNot(other[0], self.db.connection())
+
+    def test_executemany_commits_batch(self):
+        self.db.executemany('INSERT INTO t (k, v) VALUES (?, ?)', [(str(i), i) for i in range(100)])
+        self.assertEqual(self.db.query_one('SELECT COUNT(*), SUM(v) FROM t'), (100, 4950))
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction() as conn:
+                conn.execute("INSERT INTO t (k, v) VALUES ('a', 1)")
+                with self.db.transaction() as inner:
+                    inner.execute("INSERT INTO t (k, v) VALUES ('b', 2)")
+                raise RuntimeError('abort')
+        self.assertEqual(self.db.query('SELECT * FROM t'), [])
+
+    def test_connections_close_when_threads_exit(self):
+        self.db.query('SELECT 1')
+        opened = []
+
+        def work():
+            opened.append(self.db.connection())
+            self.db.query('SELECT COUNT(*) FROM t')
+
+        for _ in range(50):
+            t = threading.Thread(target=work)
+            t.start()
+            t.join()
+        self.assertEqual(len(self.db._conns), 1)
+        with self.assertRaises(gmb.sqlite3.ProgrammingError):
+            opened[0].execute('SELECT 1')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import time
+import unittest
+from unittest import mock
+
+import pytest
+
+import Global_Marketplace_Bridge as gmb
+from conftest import make_cfg
+
+
+def stats_row(ali_id, change_weight=0.0, hours_weight=0.0, last_checked=None, last_sold=None, qty_vol=0.0):
+    return {'ali_product_id': ali_id, 'raw': '{}', 'ebay_item_id': None, 'last_sync': None, 'checks': 1, 'changes': 0,
+            'change_weight': change_weight, 'hours_weight': hours_weight, 'qty_volatility': qty_vol,
+            'price_volatility': 0.0, 'last_checked': last_checked, 'last_changed': None, 'last_sold': last_sold}
+
+
+class TestSyncPrioritizer(unittest.TestCase):
+    def test_volatile_and_recently_sold_skus_rank_first(self):
+        now = time.time()
+        pr = gmb.SyncPrioritizer()
+        stable = stats_row('stable', change_weight=0, hours_weight=1000, last_checked=now - 6 * 3600)
+        volatile = stats_row('volatile', change_weight=20, hours_weight=100, last_checked=now - 6 * 3600)
+        selling = stats_row('selling', change_weight=0, hours_weight=1000, last_checked=now - 6 * 3600,
+                            last_sold=now - 3600, qty_vol=0.5)
+        ranked = [r['ali_product_id'] for r in pr.select([stable, volatile, selling], 3, now)]
+        self.assertEqual(ranked[-1], 'stable')
+        self.assertEqual(set(ranked[:2]), {'volatile', 'selling'})
+
+    def test_unchecked_skus_age_into_the_sweep(self):
+        now = time.time()
+        pr = gmb.SyncPrioritizer()
+        fresh = stats_row('fresh', change_weight=5, hours_weight=50, last_checked=now - 60)
+        never = stats_row('never')
+        self.assertEqual(pr.select([fresh, never], 1, now)[0]['ali_product_id'], 'never')
+
+    def test_observe_tracks_changes_and_sales(self):
+        now = time.time()
+        row = stats_row('a', change_weight=1.0, hours_weight=10.0, last_checked=now - 3600)
+        out = gmb.SyncPrioritizer().observe(row, {'qty': 10, 'price': 5.0}, {'qty': 7, 'price': 5.0}, now)
+        ali_id, checks, changes, change_weight, hours_weight, qty_vol, _, last_checked, last_changed, last_sold = out
+        self.assertEqual((ali_id, checks, changes), ('a', 2, 1))
+        self.assertGreater(change_weight, 1.9)
+        self.assertAlmostEqual(hours_weight, 11.0, places=1)
+        self.assertGreater(qty_vol, 0)
+        self.assertEqual((last_checked, last_changed, last_sold), (now, now, now))
+
+
+@pytest.mark.usefixtures('temp_db')
+class TestBudgetedSync(unittest.TestCase):
+    def setUp(self):
+        self.worker = gmb.DropshipWorker(make_cfg())
+        for i in range(10):
+            self.worker.import_single(str(i))
+
+    def test_budget_limits_supplier_calls_and_records_stats(self):
+        gmb.PRODUCT_CACHE.clear()
+        with mock.patch.object(self.worker.ali, '_fetch_product_batch',
+                               wraps=self.worker.ali._fetch_product_batch) as fetch:
+            stats = self.worker.sync_stocks_now(budget=4)
+        self.assertEqual(sum(len(c.args[0]) for c in fetch.call_args_list), 4)
+        self.assertEqual(stats['checked'], 4)
+        rows = gmb.get_storage().query('SELECT checks FROM sku_stats')
+        self.assertEqual(rows, [(1,)] * 4)
+
+        # The SKUs just checked drop behind the ones that were not.
+        checked = {r[0] for r in gmb.get_storage().query('SELECT ali_product_id FROM sku_stats')}
+        gmb.PRODUCT_CACHE.clear()
+        with mock.patch.object(self.worker.ali, '_fetch_product_batch',
+                               wraps=self.worker.ali._fetch_product_batch) as fetch:
+            self.worker.sync_stocks_now(budget=6)
+        self.assertTrue(checked.isdisjoint({i for c in fetch.call_args_list for i in c.args[0]}))
+
+    def test_call_budget_is_converted_to_skus(self):
+        self.worker.cfg['app']['sync_call_budget'] = 2
+        with mock.patch.object(self.worker, 'sync_stocks_now', side_effect=lambda budget: self.worker._stop_event.set()) \
+                as sync:
+            self.worker._auto_sync_loop()
+        sync.assert_called_once_with(budget=2 * gmb.ALI_PRODUCT_BATCH_MAX)
+
+
+if __name__ == '__main__':
+    unittest.main()
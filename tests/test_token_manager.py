@@ -0,0 +1,93 @@
+import copy
+import threading
+import time
+import unittest
+from unittest import mock
+
+import Global_Marketplace_Bridge as gmb
+
+
+class TestTokenManager(unittest.TestCase):
+    def test_concurrent_callers_share_one_fetch(self):
+        tokens = gmb.TokenManager()
+        calls = []
+        gate = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            gate.wait(1)
+            return 'TOK', time.time() + 3600
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(tokens.get('k', fetch))) for _ in range(10)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        gate.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({r[0] for r in results}, {'TOK'})
+
+    def test_refresh_ahead_serves_current_token(self):
+        tokens = gmb.TokenManager(refresh_margin=300)
+        tokens.seed('k', 'OLD', time.time() + 60)
+        refreshed = threading.Event()
+
+        def fetch():
+            refreshed.set()
+            return 'NEW', time.time() + 3600
+
+        self.assertEqual(tokens.get('k', fetch)[0], 'OLD')
+        self.assertTrue(refreshed.wait(1))
+        for _ in range(50):
+            if tokens.get('k', fetch)[0] == 'NEW':
+                break
+            time.sleep(0.01)
+        self.assertEqual(tokens.get('k', fetch)[0], 'NEW')
+
+    def test_fetch_error_reaches_caller_and_is_not_cached(self):
+        tokens = gmb.TokenManager()
+        with self.assertRaises(RuntimeError):
+            tokens.get('k', mock.Mock(side_effect=RuntimeError('down')))
+        self.assertEqual(tokens.get('k', lambda: ('TOK', time.time() + 3600))[0], 'TOK')
+
+    def test_ebay_instances_persist_token_once(self):
+        cfg = copy.deepcopy(gmb.DEFAULTS)
+        cfg['ebay']['sandbox'].update(client_id='id', client_secret='secret')
+        resp = mock.Mock(status_code=200)
+        resp.json.return_value = {'access_token': 'APP', 'expires_in': 7200}
+        with mock.patch.object(gmb, 'TOKENS', gmb.TokenManager()), \
+                mock.patch.object(gmb.requests, 'post', return_value=resp) as post, \
+                mock.patch.object(gmb, 'update_config') as save:
+            apis = [gmb.EbayAPI(cfg) for _ in range(5)]
+            self.assertEqual({api.obtain_app_token() for api in apis}, {'APP'})
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(save.call_count, 1)
+
+    def test_fallback_token_is_keyed_by_granted_scope(self):
+        cfg = copy.deepcopy(gmb.DEFAULTS)
+        cfg['ebay']['sandbox'].update(client_id='id', client_secret='secret')
+        denied = mock.Mock(status_code=400, text='invalid_scope')
+        denied.json.return_value = {'error': 'invalid_scope'}
+        granted = mock.Mock(status_code=200)
+        granted.json.return_value = {'access_token': 'BASE', 'expires_in': 7200}
+        tokens = gmb.TokenManager()
+        with mock.patch.object(gmb, 'TOKENS', tokens), \
+                mock.patch.object(gmb.requests, 'post', side_effect=[denied, granted]) as post, \
+                mock.patch.object(gmb, 'update_config') as save:
+            api = gmb.EbayAPI(cfg)
+            self.assertEqual(api.obtain_app_token(), 'BASE')
+            self.assertEqual(gmb.EbayAPI(cfg).obtain_app_token(), 'BASE')
+        base, inventory = gmb.EBAY_APP_SCOPES[1], gmb.EBAY_APP_SCOPES[0]
+        self.assertEqual(api.token_scope, base)
+        self.assertIsNone(tokens.cached(api.token_key(inventory)))
+        self.assertEqual(tokens.cached(api.token_key(base))[0], 'BASE')
+        self.assertEqual(post.call_count, 2)
+        saved = copy.deepcopy(gmb.DEFAULTS)
+        save.call_args[0][0](saved)
+        self.assertEqual(saved['ebay']['sandbox']['token_scope'], base)
+
+
+if __name__ == '__main__':
+    unittest.main()